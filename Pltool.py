@@ -1,509 +1,464 @@
-import configparser
-import datetime
-import subprocess
-import threading
-import time
-import tkinter as tk
-import tkinter.scrolledtext as tkst
-import traceback
-from tkinter import filedialog, messagebox
-
-
-class GameServer:
-    def __init__(self):
-        self.process = None
-        self.start_command = None  # 用于存储启动命令
-        self.is_running = False  # 添加用于跟踪服务器是否运行的标志
-        self.was_stopped = False  # 服务器启动时重置标志
-
-    def start_server(self):
-        """启动服务器，使用类中存储的启动命令"""
-        if self.is_process_running():
-            raise Exception("服务器已经在运行。")
-        try:
-            self.process = subprocess.Popen(self.start_command, shell=True)
-            self.is_running = True
-            self.was_stopped = False  # 服务器启动时重置标志
-        except Exception as e:
-            raise Exception(f"无法启动服务器: {e}")
-
-    def stop_server(self):
-        if self.process is None:
-            print("服务器没有在运行.")
-            return
-        self.process.terminate()
-        self.process = None
-        self.is_running = False
-        self.was_stopped = True  # 服务器停止时设置标志
-        print("服务器停止.")
-
-    def restart_server(self):
-        """重启服务器"""
-        if self.process is not None:
-            self.was_stopped = False  # 服务器重启时重置标志
-            self.stop_server()
-            time.sleep(1)  # 稍等一会儿以确保服务器已完全停止
-        if self.start_command is not None:
-            self.start_server()
-
-    def is_process_running(self):
-        """检查进程是否仍在运行。"""
-        if self.process is not None:
-            running = self.process.poll() is None
-            if running != self.is_running:
-                self.is_running = running
-                if not running:
-                    self.was_stopped = True  # 如果服务器停止运行，设置标志
-            return running
-        return False
-
-
-class ServerApp:
-    def __init__(self, root, server):
-        self.config = None
-        self.log_frame = None
-        self.clear_button = None
-        self.filepath_entry = None
-        self.status_label = None
-        self.stop_button = None
-        self.restart_button = None
-        self.choose_exe_button = None
-        self.start_parameters_entry = None
-        self.choose_config_button = None
-        self.config_file_entry = None
-        self.start_button = None
-        self.server_status = "停止"
-        self.log_text = None
-        self.restart_interval_entry = None  # 用于输入重启间隔的Entry
-        self.config = configparser.ConfigParser()  # 初始化配置解析器
-        self.complex_value_param = 3  # 可以根据需要设置一个合适的默认值
-        self.search_index = '1.0'  # 初始化搜索索引
-        self.auto_restart_var = tk.IntVar()
-        self.dynamic_widgets = {}
-        #     self.by_label = tk.Label(root, text="by lgnoer", fg="gray")  #
-        #     self.by_label.pack(side=tk.BOTTOM, fill=tk.X)  #
-        self.server = server
-        self.root = root
-
-        # 创建顶部的菜单按钮
-        self.menu_frame = tk.Frame(root)
-        self.menu_frame.pack(side=tk.TOP, fill=tk.X)
-
-        self.page1_button = tk.Button(self.menu_frame, text="服务器控制",
-                                      command=lambda: self.show_frame(self.page1))
-        self.page1_button.pack(side=tk.LEFT)
-
-        self.page2_button = tk.Button(self.menu_frame, text="配置文件设置", command=lambda: self.show_frame(self.page2))
-        self.page2_button.pack(side=tk.LEFT)
-
-        # 创建页面1 (Server Control)
-        self.page1 = tk.Frame(root)
-        self.init_page1(self.page1)
-
-        # 创建页面2 (Settings)
-        self.page2 = tk.Frame(root)
-        self.init_page2(self.page2)
-
-        self.frames = [self.page1, self.page2]
-        self.show_frame(self.page1)
-
-    def show_frame(self, frame):
-        for f in self.frames:
-            f.pack_forget()
-        frame.pack()
-
-    def load_config(self, config_path):
-        """从给定路径加载配置文件"""
-        self.config = configparser.ConfigParser()
-        self.config.read(config_path)
-        return self.config
-
-    def save_config(self, config_path):
-        """保存配置到给定路径"""
-        with open(config_path, 'w') as configfile:
-            self.config.write(configfile)
-
-    def init_page1(self, frame):
-        self.status_label = tk.Label(frame, text=f"服务器状态: {self.server_status}")
-        self.status_label.grid(row=2, column=0, columnspan=3, sticky='w', pady=2)
-
-        tk.Label(frame, text="服务器启动文件:").grid(row=3, column=0, sticky='w', pady=2)
-        self.filepath_entry = tk.Entry(frame, width=50, state='readonly')
-        self.filepath_entry.grid(row=3, column=1, sticky='we', pady=2)
-        self.choose_exe_button = tk.Button(frame, text="...", command=self.choose_exe)
-        self.choose_exe_button.grid(row=3, column=2, padx=5)
-        self.clear_button = tk.Button(frame, text="清除", command=self.clear_filepath)
-        self.clear_button.grid(row=3, column=3, padx=5)
-
-        tk.Label(frame, text="服务器参数(可以为空):").grid(row=4, column=0, sticky='w', pady=2)
-        self.start_parameters_entry = tk.Entry(frame, width=50)
-        self.start_parameters_entry.grid(row=4, column=1, sticky='we', columnspan=2, pady=2)
-
-        self.start_button = tk.Button(frame, text="启动服务器", command=self.start_server, state=tk.DISABLED)
-        self.start_button.grid(row=6, column=0, pady=5)
-        self.stop_button = tk.Button(frame, text="停止服务器", command=self.stop_server, state=tk.DISABLED)
-        self.stop_button.grid(row=6, column=1, pady=5)
-        self.restart_button = tk.Button(frame, text="重启服务器", command=self.restart_server, state=tk.DISABLED)
-        self.restart_button.grid(row=6, column=2, pady=5)
-
-        # 确保列1和列2能够扩展填充额外空间
-        frame.grid_columnconfigure(1, weight=1)
-
-        self.log_frame = tk.Frame(frame)  # 创建一个容纳日志框和滚动条的框架
-        self.log_frame.grid(row=5, column=0, columnspan=4, sticky='we', padx=5, pady=5)
-
-        self.log_text = tkst.ScrolledText(self.log_frame, state='disabled', height=10, wrap='word')
-        self.log_text.pack(expand=True, fill='both')
-
-        # 确保列能够扩展填充额外空间
-        frame.grid_columnconfigure(1, weight=1)
-        self.log_frame.grid_columnconfigure(0, weight=1)
-
-        # 日志框初始化
-        self.log_frame = tk.Frame(frame)
-        self.log_frame.grid(row=5, column=0, columnspan=4, sticky='we', padx=5, pady=5)
-        self.log_text = tkst.ScrolledText(self.log_frame, state='disabled', height=10, wrap='word')
-        self.log_text.pack(expand=True, fill='both')
-        frame.grid_columnconfigure(1, weight=1)
-        self.log_frame.grid_columnconfigure(0, weight=1)
-
-        tk.Label(frame, text="重启间隔（秒）:").grid(row=7, column=0, sticky='w')
-        self.restart_interval_entry = tk.Entry(frame, width=50)
-
-        self.restart_interval_entry.grid(row=7, column=1, sticky='w')
-
-        schedule_restart_button = tk.Button(frame, text="定时重启服务器", command=self.schedule_restart)
-        schedule_restart_button.grid(row=7, column=2, padx=5, pady=5)
-
-        self.auto_restart_checkbox = tk.Checkbutton(self.page1, text="崩溃时自动重启服务器",
-                                                    variable=self.auto_restart_var)
-        self.auto_restart_checkbox.grid(row=8, column=0, columnspan=3, pady=5)
-
-        self.monitor_server_process()  # 启动服务器进程监控
-
-    def init_page2(self, frame):
-        tk.Label(frame, text="服务器配置文件:").grid(row=0, column=0, sticky='w', pady=5)
-        self.config_file_entry = tk.Entry(frame, width=50, state='readonly')
-        self.config_file_entry.grid(row=0, column=1, sticky='we', pady=5)
-        self.choose_config_button = tk.Button(frame, text="...", command=self.choose_config)
-        self.choose_config_button.grid(row=0, column=2, padx=5, pady=5)
-
-        self.read_config_button = tk.Button(frame, text="读取文件", command=self.read_config)
-        self.read_config_button.grid(row=0, column=3, padx=5, pady=5)
-
-        tk.Label(frame, text="参数长度>=(默认3):").grid(row=1, column=0, sticky='w', pady=2)
-
-        self.complex_value_param_entry = tk.Entry(frame, width=20)
-        self.complex_value_param_entry.grid(row=1, column=1, padx=5, pady=8)
-
-        self.set_complex_param_button = tk.Button(frame, text="确定", command=self.set_complex_value_param)
-        self.set_complex_param_button.grid(row=1, column=2, padx=5, pady=8)
-
-        self.clear_layout_button = tk.Button(frame, text="清除布局", command=self.clear_dynamic_widgets)
-        self.clear_layout_button.grid(row=1, column=3, padx=5, pady=8)
-
-        self.save_config_button = tk.Button(frame, text="保存配置", command=self.save_config_to_file)
-        self.save_config_button.grid(row=3, column=3, padx=5, pady=5)
-
-        # 确保列1和列2能够扩展填充额外空间
-        frame.grid_columnconfigure(0, weight=0)  # 第0列不自动缩放
-        frame.grid_columnconfigure(1, weight=1)  # 第1列不自动缩放
-
-    def save_config_to_file(self):
-        config_path = self.config_file_entry.get()
-        if not config_path:
-            messagebox.showerror("错误", "未指定配置文件路径")
-            return
-
-        # 更新配置对象
-        for section in self.config.sections():
-            for option in self.config.options(section):
-                widget_name = f"{section}_{option}"
-                if widget_name in self.dynamic_widgets:
-                    widget = self.dynamic_widgets[widget_name]
-                    self.config.set(section, option, widget.get())
+"""简易服务器工具入口
+
+图形界面:   python Pltool.py
+无界面模式: python Pltool.py --headless --exe PalServer.sh --args "-port=8211" [--config pltool.ini]
+列出实例:   python Pltool.py --list --config pltool.ini
+校验配置:   python Pltool.py --check-config PalWorldSettings.ini
+
+无界面模式不会导入 tkinter，可以在没有桌面环境的 Linux 主机上作为守护进程运行。
+配置文件中 [server] 是名为 default 的实例，每个 [server:名称] 小节再定义一个实例，
+例如同一台机器上的多个分片。实例小节中还可以配置健康检查（见 pltool_health.HealthPolicy）:
+
+    max_rss_gb = 12          内存连续 rss_samples 次采样超过 12 GB 时重启
+    output_timeout = 600     600 秒没有 stdout 输出时重启
+    probe_port = 25575       端口连续 probe_timeout 秒无响应时重启（probe_protocol = tcp/udp）
+    probe_timeout = 300
+    warning_period = 60      触发后先预警 60 秒，仍异常才重启
+
+停止服务器时的流程（见 pltool_core.StopPolicy）:
+
+    stop_commands = Broadcast Server_restarting;Save   停服前发送的命令，分号分隔
+    stop_command_mode = rcon  通过 rcon（rcon_host/rcon_port/rcon_password）或 stdin 发送
+    stop_command_wait = 5     发送命令后等待的秒数
+    stop_timeout = 30         SIGTERM 后等待整个进程组退出的秒数，超时发送 SIGKILL
+
+崩溃自动重启（auto_restart = true）时按退避和熔断策略执行（见 pltool_core.RestartPolicy）:
+
+    crash_backoff = 2         第 1 次崩溃后等待 2 秒，之后每次翻倍，最多 crash_backoff_max 秒
+    crash_jitter = 0.2        等待时间随机增减 20%
+    crash_max_restarts = 5    crash_window 秒内自动重启 5 次后熔断，需手动启动
+    crash_stable_uptime = 300 稳定运行 300 秒后再崩溃时重新计数
+
+定时任务保存在 [schedule] path 指定的 JSON 文件中，重启程序后继续生效（见 pltool_scheduler）:
+
+    python Pltool.py --add-job default daily 04:00-05:00   每天 4 点到 5 点之间重启一次
+    python Pltool.py --add-job shard2 cron "30 */6 * * *"  cron 表达式
+    python Pltool.py --add-job default interval 21600      每 6 小时重启
+    python Pltool.py --jobs                                 列出任务
+    python Pltool.py --cancel-job 1a2b3c4d                  取消任务
+
+程序运行时也可以用这些命令修改任务，正在运行的无界面或图形界面进程会自动合并文件中的修改。
+
+实例小节中的 log_file 指定服务器自己写的日志文件，新增的行会以 [log] 前缀显示在该实例的日志中；
+config_file 指定服务器配置文件（如 PalWorldSettings.ini），控制接口通过它读写配置。
+
+[api] enabled = true 时启动本地控制接口（见 pltool_api），可以用脚本控制服务器:
+
+    curl http://127.0.0.1:8765/instances
+    curl -X POST http://127.0.0.1:8765/instances/default/restart
+    curl -N "http://127.0.0.1:8765/instances/default/logs?lines=50&follow=1"
+    curl -X POST -H "Content-Type: application/json" -d '{"instance": "default", "trigger": "daily", "spec": "04:00"}' \
+        http://127.0.0.1:8765/jobs
+
+设置 unix_socket 时改为监听该 Unix socket（curl --unix-socket），设置 token 时请求需要带
+"Authorization: Bearer <token>" 头。接口只应监听本机地址；浏览器发来的请求（带 Origin 头）和
+Host 头不是监听地址的请求都会被拒绝。
+
+启动、停止、崩溃、重启和就绪事件按 JSON Lines 写入 [events] path 指定的文件（为空时不写），
+运行时间、崩溃次数、重启耗时、就绪时间和日志行数等指标由控制接口的 /metrics 以 Prometheus
+格式导出。实例小节中的 ready_pattern 是表示服务器已就绪的输出行正则，未设置时以第一行 stdout 为准。
 
-        # 将配置写入文件
+实例小节中设置 save_dir（存档目录）后启用备份（见 pltool_backup），备份保存在 [backup] path 中:
+
+    backup_on_stop = true    停止、重启和崩溃后先暂存存档再继续，快照在后台生成
+    backup_keep_last = 10    保留最近 10 个，以及最近 backup_keep_daily 天、backup_keep_weekly 周各一个
+    python Pltool.py --add-job default daily 03:00 --job-action backup   每天 3 点备份
+    python Pltool.py --backup default        立即备份
+    python Pltool.py --backups               列出备份
+    python Pltool.py --restore 20240101-030000-1a2b   恢复（服务器需已停止），原存档改名保留
+
+实例正由运行中的无界面或图形界面进程管理时，命令行 --restore 会拒绝恢复，需要在那个进程中停止服务器后恢复。
+"""
+import argparse
+import configparser
+import queue
+import re
+import signal
+import sys
+
+from pltool_backup import BackupManager, BackupPolicy, BackupStore
+from pltool_core import RestartPolicy, ServerManager, StopPolicy
+from pltool_health import HealthMonitor, HealthPolicy
+from pltool_logs import LogSink, format_log_line
+from pltool_metrics import EventJournal, Telemetry
+from pltool_resources import ResourceMonitor
+from pltool_ini import IniDocument
+from pltool_schema import Schema
+from pltool_scheduler import ACTIONS, TRIGGERS, Scheduler, format_time
+from pltool_watch import FileWatcher, LogTailer
+
+OUTPUT_POLL_INTERVAL = 0.2  # 秒，无界面模式下输出打印到终端的间隔
+DEFAULT_INSTANCE = "default"
+
+SERVER_DEFAULTS = {
+    "exe": "",
+    "args": "",
+    "auto_restart": "false",
+    "restart_interval": "0",  # 大于 0 时在启动后按此秒数定时重启
+    "output_capacity": "10000",
+}
+
+DEFAULT_SETTINGS = {
+    "log": {
+        "path": "pltool.log",
+        "max_bytes": str(10 * 1024 * 1024),
+        "rotate_interval": "0",  # 秒，0 表示只按大小轮转
+        "backup_count": "5",
+        "compress": "true",
+        "capacity": "20000",
+        "view_lines": "1000",
+    },
+    "monitor": {
+        "interval": "5",  # 资源采样间隔（秒）
+        "capacity": "720",  # 每个实例保留的采样数，默认 5 秒 x 720 = 1 小时
+    },
+    "schedule": {
+        "path": "pltool_jobs.json",  # 定时任务文件
+    },
+    "schema": {
+        "path": "",  # 补充或覆盖内置 Palworld 配置模式的 JSON 文件，为空时只用内置模式
+    },
+    "events": {
+        "path": "pltool_events.jsonl",  # 事件日志，为空时只统计指标
+        "max_bytes": str(10 * 1024 * 1024),
+        "backup_count": "5",
+    },
+    "backup": {
+        "path": "backups",  # 备份仓库目录，各实例共用以便去重
+        "workers": "2",  # 计算哈希和压缩的线程数
+    },
+    "api": {
+        "enabled": "false",
+        "host": "127.0.0.1",
+        "port": "8765",
+        "unix_socket": "",  # 设置后监听 Unix socket 而不是 TCP 端口
+        "token": "",
+    },
+}
+
+
+def load_settings(path=None):
+    """读取工具自身的配置文件，缺失的项使用默认值"""
+    settings = configparser.ConfigParser()
+    settings.read_dict(DEFAULT_SETTINGS)
+    if path:
+        if not settings.read(path, encoding="utf-8"):
+            raise SystemExit(f"无法读取配置文件: {path}")
+    return settings
+
+
+def instance_sections(settings):
+    """返回 [(实例名, 小节)]，[server] 对应 default 实例"""
+    instances = []
+    for section in settings.sections():
+        if section == "server":
+            instances.append((DEFAULT_INSTANCE, settings[section]))
+        elif section.startswith("server:"):
+            instances.append((section[len("server:"):].strip(), settings[section]))
+    return instances
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="简易服务器工具")
+    parser.add_argument("--headless", action="store_true", help="不启动图形界面，以守护进程方式运行")
+    parser.add_argument("--list", action="store_true", help="列出配置的服务器实例后退出")
+    parser.add_argument("--config", help="工具配置文件 (INI)")
+    parser.add_argument("--exe", help="服务器启动文件，覆盖配置文件中 default 实例的 exe")
+    parser.add_argument("--args", help="服务器启动参数，覆盖配置文件中 default 实例的 args")
+    parser.add_argument("--auto-restart", action="store_true", default=None, help="崩溃时自动重启服务器")
+    parser.add_argument("--restart-interval", type=int, help="定时重启间隔（秒）")
+    parser.add_argument("--jobs", action="store_true", help="列出定时任务后退出")
+    parser.add_argument("--add-job", nargs=3, metavar=("INSTANCE", "TRIGGER", "SPEC"),
+                        help=f"添加定时重启任务后退出，TRIGGER 为 {'/'.join(TRIGGERS[:3])}")
+    parser.add_argument("--job-action", choices=ACTIONS, default="restart", help="--add-job 添加的任务类型")
+    parser.add_argument("--cancel-job", metavar="ID", help="取消定时任务后退出")
+    parser.add_argument("--backups", action="store_true", help="列出存档备份后退出")
+    parser.add_argument("--backup", metavar="INSTANCE", help="立即备份实例的存档后退出")
+    parser.add_argument("--restore", metavar="SNAPSHOT", help="把存档恢复到指定备份后退出（服务器需已停止）")
+    parser.add_argument("--check-config", metavar="INI", help="按配置模式校验服务器配置文件后退出，有错误时返回 1")
+    return parser.parse_args(argv)
+
+
+def apply_args(settings, args):
+    """命令行参数优先于配置文件，作用于 default 实例"""
+    overrides = {"exe": args.exe, "args": args.args, "restart_interval": args.restart_interval}
+    if args.auto_restart:
+        overrides["auto_restart"] = "true"
+    overrides = {key: str(value) for key, value in overrides.items() if value is not None}
+    if overrides and not settings.has_section("server"):
+        settings.add_section("server")
+    for key, value in overrides.items():
+        settings["server"][key] = value
+
+
+def create_log_sink(settings):
+    log = settings["log"]
+    return LogSink(log["path"], max_bytes=log.getint("max_bytes"),
+                   rotate_interval=log.getint("rotate_interval") or None,
+                   backup_count=log.getint("backup_count"), compress=log.getboolean("compress"))
+
+
+def create_manager(settings):
+    """创建实例和各个组件，但不启动任何后台任务；持续运行的模式再调用 start_services"""
+    manager = ServerManager()
+    for name, section in instance_sections(settings):
+        options = dict(SERVER_DEFAULTS, **section)
+        manager.add(name, options["exe"], options["args"],
+                    auto_restart=section.getboolean("auto_restart", fallback=False),
+                    output_capacity=int(options["output_capacity"]),
+                    stop_policy=StopPolicy.from_section(section),
+                    restart_policy=RestartPolicy.from_section(section))
+    monitor = settings["monitor"]
+    manager.monitor = ResourceMonitor(manager, monitor.getfloat("interval"), monitor.getint("capacity"))
+    manager.health = HealthMonitor(manager)
+    for name, section in instance_sections(settings):
+        manager.health.set_policy(name, HealthPolicy.from_section(section))
+    telemetry = Telemetry(manager)
+    for name, section in instance_sections(settings):
         try:
-            with open(config_path, 'w') as file:
-                self.config.write(file)
-            self.log_message(f"配置已保存到: {config_path}")
-        except Exception as e:
-            messagebox.showerror("保存错误", f"无法保存配置: {str(e)}")
-            self.log_message(f"保存配置错误: {str(e)}")
-
-    def find_widget_by_name(self, name):
-        """根据名称找到相应的输入框"""
-        for widget in self.page2.winfo_children():
-            if hasattr(widget, 'config_name') and widget.config_name == name:
-                return widget
+            telemetry.set_ready_pattern(name, section.get("ready_pattern"))
+        except re.error as e:
+            raise SystemExit(f"实例 {name} 的 ready_pattern 无效: {e}")
+    telemetry.attach()
+    backup = settings["backup"]
+    manager.backups = BackupManager(manager, BackupStore(backup["path"], backup.getint("workers")))
+    for name, section in instance_sections(settings):
+        manager.backups.set_policy(name, BackupPolicy.from_section(section))
+    manager.scheduler = Scheduler(manager, settings["schedule"]["path"])
+    manager.scheduler.load(arm=False)
+    manager.watcher = FileWatcher(manager.loop)
+    for name, section in instance_sections(settings):
+        if section.get("log_file"):
+            manager.get(name).log_tailer = LogTailer(manager.get(name).server, section["log_file"], manager.watcher)
+        manager.get(name).config_file = section.get("config_file") or None
+    return manager
+
+
+def start_services(settings, manager):
+    """启动资源采样、健康检查、事件日志和定时任务（只用于无界面和图形界面模式）"""
+    manager.backups.claim()  # 命令行 --restore 据此知道这些实例由本进程管理
+    manager.monitor.start()
+    manager.health.start()
+    events = settings["events"]
+    if events["path"]:
+        manager.telemetry.journal = EventJournal(events["path"], max_bytes=events.getint("max_bytes"),
+                                                 backup_count=events.getint("backup_count"))
+    manager.scheduler.watch(manager.watcher)
+    manager.scheduler.arm()
+
+
+def restart_intervals(settings):
+    return {name: section.getint("restart_interval", fallback=0) for name, section in instance_sections(settings)}
+
+
+def list_instances(settings):
+    manager = create_manager(settings)
+    print(manager.status_table())
+
+
+def load_schema(settings):
+    try:
+        return Schema.load(settings["schema"]["path"] or None)
+    except (OSError, ValueError) as e:
+        raise SystemExit(f"无法读取配置模式: {e}")
+
+
+def check_config(settings, path):
+    """校验服务器配置文件，返回进程退出码"""
+    try:
+        document = IniDocument.load(path)
+    except OSError as e:
+        raise SystemExit(f"无法读取配置文件: {e}")
+    issues = load_schema(settings).validate_document(document)
+    for issue in issues:
+        print(f"{'错误' if issue.severity == 'error' else '警告'}  {issue}")
+    errors = sum(1 for issue in issues if issue.severity == "error")
+    print(f"{errors} 个错误，{len(issues) - errors} 个警告")
+    return 1 if errors else 0
+
+
+def start_api(settings, manager, schema=None):
+    """按 [api] 设置启动控制接口，没有启用时返回 None"""
+    api = settings["api"]
+    if not api.getboolean("enabled"):
         return None
-
-    def log_message(self, message):
-        """ 在日志框中显示带时间戳的消息 """
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        formatted_message = f"[{timestamp}] {message}\n"
-        self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, formatted_message)
-        self.log_text.config(state='disabled')
-        self.log_text.yview(tk.END)
-
-    def choose_exe(self):
-        """打开文件选择对话框以选择可执行文件"""
-        filepath = filedialog.askopenfilename(filetypes=[("Executable files", "*.exe")])
-        if filepath:
-            self.filepath_entry.config(state='normal')
-            self.filepath_entry.delete(0, tk.END)
-            self.filepath_entry.insert(0, filepath)
-            self.filepath_entry.config(state='readonly')
-            self.server.start_command = filepath  # 更新服务器的启动命令
-            self.start_button.config(state=tk.NORMAL)  # 启动按钮现在可用
-
-    def choose_config(self):
-        """打开文件选择对话框以选择配置文件"""
-        config_path = filedialog.askopenfilename(filetypes=[("Config Files", "*.ini")])
-        if config_path:
-            self.config_file_entry.config(state='normal')  # 设置为可编辑状态
-            self.config_file_entry.delete(0, tk.END)  # 清除当前内容
-            self.config_file_entry.insert(0, config_path)  # 插入新选择的路径
-            self.config_file_entry.config(state='readonly')  # 设置回只读状态
-
-    def search_in_text(self):
-        """在文本框中搜索用户输入的字符串，并跳转到第一个匹配项"""
-        self.text.tag_remove('found', '1.0', tk.END)
-        search_query = self.search_entry.get()
-
-        if search_query:
-            idx = '1.0'
-            self.search_index, lastidx = self.find_next(search_query, idx)
-            if self.search_index:
-                self.text.tag_add('found', self.search_index, lastidx)
-                self.text.tag_config('found', foreground='blue')
-                self.text.see(self.search_index)  # 跳转到第一个匹配项
-            else:
-                messagebox.showinfo("搜索", "找不到匹配项")
-
-    def find_next(self, search_query, start_idx):
-        """在文本框中查找下一个匹配项，并返回其索引"""
-        idx = self.text.search(search_query, start_idx, nocase=1, stopindex=tk.END)
-        if idx:
-            lastidx = f"{idx}+{len(search_query)}c"
-            return idx, lastidx
-        return None, None
-
-    def goto_next_search_result(self):
-        """跳转到下一个搜索结果"""
-        search_query = self.search_entry.get()
-        if search_query and self.search_index:
-            self.search_index, lastidx = self.find_next(search_query, self.search_index)
-            if self.search_index:
-                self.text.tag_remove('found', '1.0', tk.END)
-                self.text.tag_add('found', self.search_index, lastidx)
-                self.text.see(self.search_index)
-            else:
-                messagebox.showinfo("搜索", "没有更多匹配项")
-
-    def read_config(self):
-        """读取并显示配置文件的参数"""
-        global entry
-        config_path = self.config_file_entry.get()
-        if not config_path:
-            messagebox.showerror("错误", "没有选择配置文件")
-            return
-
-        # 读取配置文件
-        self.config.read(config_path)
-
-        # 清除之前的布局
-        self.clear_dynamic_widgets()
-
-        # 在页面2上创建新的控件以显示配置参数
-        row = 4
-        for section in self.config.sections():
-            for key, value in self.config.items(section):
-                label = tk.Label(self.page2, text=f"{section}.{key}:")
-                label.grid(row=row, column=0, sticky='w')
-                label._is_dynamic = True  # 标记为动态生成
-                entry.config_name = f"{section}_{key}"
-
-                if self.is_complex_value(value):
-                    # 为复杂的值创建一个大的滚动文本框
-                    if self.is_complex_value(value):
-                        # 为复杂的值创建一个大的滚动文本框
-                        text_frame = tk.Frame(self.page2)
-                        text_frame.grid(row=row, column=1, sticky='we')
-                        text_frame._is_dynamic = True
-
-                        self.text = tk.Text(text_frame, height=5, width=50, wrap=tk.WORD)
-                        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-                        self.text.insert('1.0', value)
-
-                        # 使用 self.text 来创建滚动条
-                        scrollbar = tk.Scrollbar(text_frame, command=self.text.yview)
-                        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-                        # 设置滚动条与文本框的关联
-                        self.text.config(yscrollcommand=scrollbar.set)
-
-                        row += 1
-
-                    # 添加搜索框和按钮
-                    self.search_entry = tk.Entry(self.page2)
-                    self.search_entry.grid(row=3, column=1, pady=5)
-                    self.search_entry._is_dynamic = True
-                    search_button = tk.Button(self.page2, text="搜索", command=self.search_in_text)
-                    search_button.grid(row=3, column=2, padx=5)
-                    search_button._is_dynamic = True
-                    row += 2  # 增加行号以放置下一个控件
-
-
-                else:
-                    # 为简单的值创建一个单行文本框
-                    entry = tk.Entry(self.page2, width=50)
-                    entry.grid(row=row, column=1, sticky='we')
-                    entry.insert(0, value)
-                    entry._is_dynamic = True
-                    entry.config_name = f"{section}_{key}"
-
-                row += 1
-
-        # 更新日志
-        self.log_message(f"读取配置文件: {config_path}")
-
-    def set_complex_value_param(self):
-        """设置用于判断复杂值的参数"""
+    from pltool_api import ControlServer
+
+    server = ControlServer(manager, api["host"], api.getint("port"), unix_socket=api["unix_socket"] or None,
+                           token=api["token"] or None, schema=schema)
+    try:
+        server.start()
+    except OSError as e:
+        raise SystemExit(f"无法启动控制接口: {e}")
+    print(f"控制接口: {server.address}", flush=True)
+    return server
+
+
+def manage_jobs(settings, args):
+    """命令行中添加、取消和列出定时任务"""
+    manager = create_manager(settings)
+    scheduler = manager.scheduler
+    scheduler.stop()  # 只修改任务文件，添加和取消任务时也不挂定时器
+    if args.add_job:
+        name, trigger, spec = args.add_job
+        if name not in manager.instances and name != DEFAULT_INSTANCE:  # 图形界面总会有 default 实例
+            raise SystemExit(f"没有名为 {name} 的实例")
         try:
-            param = int(self.complex_value_param_entry.get())
-            # 定义参数的下限和上限
-            MIN_PARAM = 1
-            MAX_PARAM = 99
-            if MIN_PARAM <= param <= MAX_PARAM:
-                # 在此处更新 is_complex_value 方法使用的参数
-                self.complex_value_param = param
-                self.log_message(f"设置复杂值参数为: {param}")
-            else:
-                raise ValueError(f"参数必须在 {MIN_PARAM} 和 {MAX_PARAM} 之间")
+            job = scheduler.add(name, trigger, spec, args.job_action)
         except ValueError as e:
-            messagebox.showerror("错误", str(e))
-
-    def is_complex_value(self, value):
-        """判断配置值是否复杂，无法直接识别分割"""
-        # 使用 self.complex_value_param 作为判断条件
-        return len(value.split()) >= self.complex_value_param
-
-    def clear_dynamic_widgets(self):
-        """清除页面上动态创建的控件"""
-        for widget in self.page2.winfo_children():
-            if hasattr(widget, '_is_dynamic'):
-                widget.destroy()
-
-    def clear_filepath(self):
-        self.filepath_entry.config(state='normal')  # 设置文本框为可编辑状态
-        self.filepath_entry.delete(0, tk.END)
-        self.filepath_entry.config(state='readonly')
-        self.server.start_command = None  # 清除服务器启动命令
-        self.start_button.config(state=tk.DISABLED)  # 禁用启动服务器按钮
-
-    def start_server(self):
-        try:
-            start_params = self.start_parameters_entry.get()
-            full_command = f"{self.server.start_command} {start_params}"
-            self.server.start_server(full_command)
-            self.server_status = "运行中"
-            self.status_label.config(text=f"服务器状态: {self.server_status}")
-            self.stop_button.config(state=tk.NORMAL)
-            self.restart_button.config(state=tk.NORMAL)
-            self.log_message("服务器启动命令: " + full_command)
-        except Exception as e:
-            error_message = f"启动服务器时出错: {e}"
-            self.log_message(error_message)
-            self.log_error(error_message)
-
-    def update_ui_on_server_start(self):
-        """更新 UI 以反映服务器启动状态"""
-        self.status_label.config(text=f"服务器状态: {self.server_status}")
-        self.stop_button.config(state=tk.NORMAL)
-        self.restart_button.config(state=tk.NORMAL)
-
-    def update_ui_on_server_stop(self):
-        """更新 UI 以反映服务器停止状态"""
-        self.status_label.config(text=f"服务器状态: {self.server_status}")
-        self.stop_button.config(state=tk.DISABLED)
-        self.restart_button.config(state=tk.DISABLED)
-
-    def stop_server(self):
-        try:
-            if self.server_status == "运行中":
-                self.server.stop_server()
-                self.server_status = "停止"
-                self.status_label.config(text=f"服务器状态: {self.server_status}")
-                self.stop_button.config(state=tk.DISABLED)
-                self.restart_button.config(state=tk.DISABLED)
-                self.log_message("服务器停止。")
-            else:
-                self.log_message("服务器现在没有运行。")
-        except Exception as e:
-            error_message = f"停止服务器时出错: {e}"
-            self.log_message(error_message)
-            self.log_error(error_message)
-
-    def restart_server(self):
-        try:
-            if self.server_status == "运行中":
-                self.stop_server()  # 首先停止服务器
-                time.sleep(10)  # 确保服务器完全停止
-            self.start_server()  # 然后启动服务器
-        except Exception as e:
-            error_message = f"重启服务器时出错: {e}"
-            self.log_message(error_message)
-            self.log_error(error_message)
-
-    def schedule_restart(self):
-        """定时重启服务器"""
-        try:
-            interval = int(self.restart_interval_entry.get())
-            threading.Timer(interval, self.server.restart_server).start()
-            self.log_message(f"已计划在{interval}秒后重启服务器。")
-        except ValueError:
-            self.log_message("错误: 请输入有效的秒数。")
-
-    def monitor_server_process(self):
-        """监控服务器进程并更新日志，如果需要则重启服务器"""
-        if self.server.is_process_running():
-            self.server.was_stopped = False  # 如果服务器正在运行，重置标志
-        elif not self.server.was_stopped:
-            self.log_message("服务器进程已停止。")
-            self.server.was_stopped = True  # 设置标志，避免重复记录
-            if self.auto_restart_var.get() == 1:
-                # 重启逻辑
-                self.log_message("正在尝试重启服务器...")
-                try:
-                    self.start_server()
-                except Exception as e:
-                    self.log_message(f"重启服务器失败: {e}")
-                    self.log_message(f"每60秒将尝试一次")
-
-        # 每60秒钟检查一次
-        self.root.after(1000, self.monitor_server_process)
-
-    def log_error(self, error):
-        """记录错误信息到日志文件"""
-        with open("error_log.txt", "a") as log_file:  # 打开日志文件
-            log_file.write(f"[{datetime.datetime.now()}] Error: {error}\n")
-            log_file.write(traceback.format_exc())  # 记录错误的堆栈跟踪
+            raise SystemExit(f"无法添加定时任务: {e}")
+        print(f"已添加定时任务 {job.id}，下次执行 {format_time(job.next_run)}")
+    elif args.cancel_job:
+        if not scheduler.cancel(args.cancel_job):
+            raise SystemExit(f"没有编号为 {args.cancel_job} 的定时任务")
+        print(f"已取消定时任务 {args.cancel_job}")
+    else:
+        for job in scheduler.list_jobs():
+            print(f"{job.id}  {job.instance:<12} {job.describe():<24} 下次 {format_time(job.next_run)}"
+                  f"  上次 {format_time(job.last_run)}")
+
+
+def manage_backups(settings, args):
+    """命令行中立即备份、恢复和列出备份（不启动服务器）"""
+    manager = create_manager(settings)
+    backups = manager.backups
+    try:
+        if args.backup:
+            if args.backup not in backups.policies:
+                raise SystemExit(f"实例 {args.backup} 没有设置存档目录 save_dir")
             try:
-                self.root.after()
+                snapshot = backups.backup(args.backup, "manual").result()
             except Exception as e:
-                self.log_error(e)  # 记录错误
-                # ... 其他错误处理代码 ...
-
-
-if __name__ == "__main__":
-    server = GameServer()
+                raise SystemExit(f"备份失败: {e}")
+            print(f"已备份 {snapshot.id}: {snapshot.stats}")
+        elif args.restore:
+            try:
+                snapshot = backups.store.get(args.restore)
+                kept = backups.restore(snapshot.instance, snapshot.id)
+            except Exception as e:
+                raise SystemExit(f"恢复失败: {e}")
+            print(f"已恢复 {snapshot.instance} 的存档到 {snapshot.id}" + (f"，原存档保留在 {kept}" if kept else ""))
+        else:
+            for snapshot in backups.store.list():
+                print(f"{snapshot.id}  {snapshot.instance:<12} {format_time(snapshot.created)}  {snapshot.reason:<8}"
+                      f" {len(snapshot.files)} 个文件  {snapshot.size / 1024 / 1024:.1f} MB")
+    finally:
+        backups.close()
+
+
+def run_headless(settings):
+    """无界面模式：启动所有配置的服务器并持续监控，直到收到 Ctrl+C 或 SIGTERM"""
+    manager = create_manager(settings)
+    if not any(s.server.full_command() for s in manager.supervisors()):
+        raise SystemExit("无界面模式需要通过 --exe 或配置文件指定服务器启动文件")
+    sink = create_log_sink(settings)
+    start_services(settings, manager)
+    api = start_api(settings, manager, load_schema(settings))
+    many = len(manager.names()) > 1
+
+    def emit(name, lines):
+        manager.publish_output(name, lines)
+        if many:
+            lines = [f"[{name}] {line}" for line in lines]
+        for line in lines:
+            print(line, flush=True)
+        sink.write_lines(lines)
+
+    def drain_output():
+        for supervisor in manager.supervisors():
+            output = supervisor.server.output
+            lines, dropped = output.drain(output.lines.maxlen)
+            if dropped:
+                lines.insert(0, f"... 输出过多，已丢弃 {dropped} 行 ...")
+            if lines:
+                emit(supervisor.name, lines)
+
+    def handle_event(name, kind, data):
+        if kind == "log":
+            emit(name, [format_log_line(data)])
+        elif kind == "error":
+            message, trace = data
+            emit(name, [format_log_line(message)])
+            sink.write_lines(trace.rstrip("\n").splitlines())
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    def print_status(signum, frame):
+        print(manager.status_table(), flush=True)
+
+    signal.signal(signal.SIGTERM, stop)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, print_status)  # kill -USR1 <pid> 打印所有实例状态
+    manager.start_all()
+    for name, interval in restart_intervals(settings).items():
+        if interval > 0:
+            manager.get(name).schedule_restart(interval)
+    try:
+        while True:
+            drain_output()
+            try:
+                handle_event(*manager.events.get(timeout=OUTPUT_POLL_INTERVAL))
+            except queue.Empty:
+                pass
+    except KeyboardInterrupt:
+        manager.scheduler.stop()
+        manager.stop_all(wait=True)
+    finally:
+        if api is not None:
+            api.stop()
+        drain_output()
+        while not manager.events.empty():
+            handle_event(*manager.events.get_nowait())
+        sink.close()
+        manager.backups.close()  # 等待后台的快照写完
+        manager.telemetry.close()
+
+
+def run_gui(settings):
+    import tkinter as tk
+
+    from pltool_gui import ServerApp
+
+    manager = create_manager(settings)
+    if not manager.names():
+        manager.add(DEFAULT_INSTANCE)
     root = tk.Tk()
-    frame = tk.Frame(root)
     root.title("简易服务器工具")
     root.geometry("700x550")
-    app = ServerApp(root, server)
-    app.monitor_server_process()  # 启动服务器进程监控
-    root.mainloop()
+    schema = load_schema(settings)
+    start_services(settings, manager)
+    api = start_api(settings, manager, schema)
+    app = ServerApp(root, manager, log_capacity=settings["log"].getint("capacity"),
+                    log_view_lines=settings["log"].getint("view_lines"),
+                    log_sink=create_log_sink(settings), schema=schema)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
+    try:
+        root.mainloop()
+    finally:
+        if api is not None:
+            api.stop()
+        manager.backups.close()
+        manager.telemetry.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = load_settings(args.config)
+    apply_args(settings, args)
+    if args.check_config:
+        return check_config(settings, args.check_config)
+    if args.list:
+        list_instances(settings)
+    elif args.jobs or args.add_job or args.cancel_job:
+        manage_jobs(settings, args)
+    elif args.backups or args.backup or args.restore:
+        manage_backups(settings, args)
+    elif args.headless:
+        run_headless(settings)
+    else:
+        run_gui(settings)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,455 @@
+"""本地控制接口：在 localhost 端口或 Unix socket 上提供一个简单的 HTTP/JSON 接口，供脚本控制服务器
+
+    GET    /instances                         所有实例的状态
+    GET    /instances/NAME                    一个实例的状态
+    POST   /instances/NAME/start|stop|restart stop 可加 ?wait=1 等到进程组退出
+    GET    /instances/NAME/logs?lines=100&follow=1   最近的日志，follow 时持续推送新行
+    GET    /instances/NAME/config[?section=S&key=K]  读取实例 config_file 中的值
+    PUT    /instances/NAME/config             {"section", "key", "value"} 或再加 "field" 修改元组中的字段
+    GET    /jobs  POST /jobs {"instance", "trigger", "spec"}  DELETE /jobs/ID
+    GET    /metrics                           Prometheus 文本格式的运行指标（见 pltool_metrics）
+
+接口运行在单独线程中的 asyncio 事件循环里，对监控器的操作都转交给共用的事件循环执行，
+文件读写放在共用的工作线程池中，所以慢客户端和大量并发连接都不会阻塞服务器监控。
+配置了 token 时，请求需要带 "Authorization: Bearer <token>" 头。
+为防止网页借浏览器访问接口，带 Origin 头的请求一律拒绝，TCP 端口上的 Host 头必须是监听的地址，
+有请求体的请求必须是 Content-Type: application/json。
+"""
+import asyncio
+import ipaddress
+import json
+import os
+import re
+import threading
+import urllib.parse
+
+from pltool_core import get_worker_pool
+from pltool_ini import IniDocument
+from pltool_tuple import TupleValue
+
+MAX_HEADER_BYTES = 65536
+MAX_BODY_BYTES = 1024 * 1024
+HEADER_TIMEOUT = 10  # 秒
+FOLLOW_QUEUE_SIZE = 1000  # 每个跟随日志的客户端最多积压的批次，超过后丢弃
+LOOPBACK_NAMES = ("localhost", "127.0.0.1", "::1")
+CONTROL_CHARS = re.compile(r"[\x00-\x1f\x7f]")
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+           404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+           415: "Unsupported Media Type", 422: "Unprocessable Entity", 500: "Internal Server Error"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method, path, query, headers, body, reader=None):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.reader = reader
+
+    def json(self):
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError as e:
+            raise ApiError(400, f"请求体不是有效的 JSON: {e}")
+        if not isinstance(data, dict):
+            raise ApiError(400, "请求体需要是 JSON 对象")
+        return data
+
+    def param(self, name, fallback=None):
+        values = self.query.get(name)
+        return values[0] if values else fallback
+
+
+class ControlServer:
+    """控制接口服务器；start() 启动后台线程，stop() 关闭所有连接并结束线程"""
+
+    def __init__(self, manager, host="127.0.0.1", port=8765, unix_socket=None, token=None, schema=None):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.token = token or None
+        self.schema = schema
+        self.aloop = None
+        self.server = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+        self.routes = [
+            ("GET", r"/instances", self.list_instances),
+            ("GET", r"/instances/(?P<name>[^/]+)", self.get_instance),
+            ("POST", r"/instances/(?P<name>[^/]+)/(?P<action>start|stop|restart)", self.control_instance),
+            ("GET", r"/instances/(?P<name>[^/]+)/logs", self.tail_logs),
+            ("GET", r"/instances/(?P<name>[^/]+)/config", self.get_config),
+            ("PUT", r"/instances/(?P<name>[^/]+)/config", self.set_config),
+            ("GET", r"/jobs", self.list_jobs),
+            ("POST", r"/jobs", self.add_job),
+            ("DELETE", r"/jobs/(?P<job_id>[^/]+)", self.cancel_job),
+            ("GET", r"/metrics", self.get_metrics),
+        ]
+        self.routes = [(method, re.compile(pattern + r"\Z"), handler) for method, pattern, handler in self.routes]
+
+    @property
+    def address(self):
+        if self.unix_socket:
+            return self.unix_socket
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="ControlServer", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        if self.aloop is not None and self.thread is not None:
+            self.aloop.call_soon_threadsafe(self.aloop.stop)
+            self.thread.join(timeout=5)
+
+    def run(self):
+        self.aloop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.aloop)
+        try:
+            if self.unix_socket:
+                if os.path.exists(self.unix_socket):
+                    os.unlink(self.unix_socket)  # 上次异常退出留下的文件
+                self.server = self.aloop.run_until_complete(
+                    asyncio.start_unix_server(self.handle_client, self.unix_socket, limit=MAX_HEADER_BYTES))
+                os.chmod(self.unix_socket, 0o600)  # 只允许当前用户连接
+            else:
+                self.server = self.aloop.run_until_complete(
+                    asyncio.start_server(self.handle_client, self.host, self.port, limit=MAX_HEADER_BYTES))
+                self.port = self.server.sockets[0].getsockname()[1]  # port 为 0 时使用系统分配的端口
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.ready.set()
+        try:
+            self.aloop.run_forever()
+        finally:
+            self.server.close()
+            tasks = asyncio.all_tasks(self.aloop)
+            for task in tasks:
+                task.cancel()
+            self.aloop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.aloop.close()
+            if self.unix_socket and os.path.exists(self.unix_socket):
+                os.unlink(self.unix_socket)
+
+    async def on_manager_loop(self, callback, *args):
+        """在监控器的事件循环线程中执行 callback，等待它的返回值"""
+        future = self.aloop.create_future()
+
+        def run():
+            try:
+                result = callback(*args)
+            except Exception as e:
+                self.aloop.call_soon_threadsafe(lambda: future.done() or future.set_exception(e))
+            else:
+                self.aloop.call_soon_threadsafe(lambda: future.done() or future.set_result(result))
+
+        self.manager.loop.call_soon(run)
+        return await future
+
+    async def in_worker(self, callback, *args):
+        return await self.aloop.run_in_executor(get_worker_pool(), callback, *args)
+
+    async def handle_client(self, reader, writer):
+        try:
+            request = await asyncio.wait_for(self.read_request(reader), HEADER_TIMEOUT)
+            await self.dispatch(request, writer)
+        except ApiError as e:
+            await self.send_json(writer, e.status, {"error": str(e)})
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # 超时、客户端断开或接口正在关闭
+        except asyncio.LimitOverrunError:
+            await self.send_json(writer, 413, {"error": "请求头过大"})
+        except Exception as e:
+            await self.send_json(writer, 500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise ApiError(400, "无效的请求行")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        length = headers.get("content-length") or "0"
+        if not length.isdigit() or not length.isascii():
+            raise ApiError(400, "无效的 Content-Length")
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            raise ApiError(413, "请求体过大")
+        body = await reader.readexactly(length) if length else b""
+        url = urllib.parse.urlsplit(target)
+        return Request(method.upper(), urllib.parse.unquote(url.path).rstrip("/") or "/",
+                       urllib.parse.parse_qs(url.query), headers, body, reader)
+
+    def check_origin(self, request):
+        """拒绝浏览器发来的跨站请求和 DNS 重绑定（用别的域名解析到本机）"""
+        if "origin" in request.headers:
+            raise ApiError(403, "不接受浏览器的跨站请求")
+        if request.body:
+            content_type = request.headers.get("content-type", "").split(";", 1)[0].strip().lower()
+            if content_type != "application/json":
+                raise ApiError(415, "请求体需要是 Content-Type: application/json")
+        if not self.unix_socket and not self.host_allowed(request.headers.get("host", "")):
+            raise ApiError(403, "Host 头与监听地址不符")
+
+    def host_allowed(self, value):
+        match = re.fullmatch(r"\[(?P<ipv6>[^\]]+)\](?::(?P<port6>\d+))?|(?P<host>[^:]+)(?::(?P<port>\d+))?", value)
+        if match is None:
+            return False
+        host = (match.group("ipv6") or match.group("host")).lower()
+        port = int(match.group("port6") or match.group("port") or 80)
+        if port != self.port:
+            return False
+        bound = (self.host or "").lower()
+        if host == bound or (bound in LOOPBACK_NAMES and host in LOOPBACK_NAMES):
+            return True
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            return False  # 其他域名可能是重绑定到本机的
+        return bound in ("", "0.0.0.0", "::")  # 监听所有地址时接受任何 IP 形式的 Host
+
+    async def dispatch(self, request, writer):
+        self.check_origin(request)
+        if self.token is not None and request.headers.get("authorization") != f"Bearer {self.token}":
+            raise ApiError(401, "需要有效的 token")
+        allowed = False
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+            allowed = True
+            if method == request.method:
+                result = await handler(request, writer, **match.groupdict())
+                if result is not None:
+                    status, payload = result
+                    await self.send_json(writer, status, payload)
+                return
+        raise ApiError(405 if allowed else 404, "不支持的方法" if allowed else "没有这个接口")
+
+    async def send_json(self, writer, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                     f"Content-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def send_text(self, writer, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        writer.write(f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    def supervisor(self, name):
+        if name not in self.manager.instances:
+            raise ApiError(404, f"没有名为 {name} 的实例")
+        return self.manager.get(name)
+
+    def instance_info(self, supervisor):
+        info = {"name": supervisor.name, "status": supervisor.status, "pid": supervisor.server.pid,
+                "command": supervisor.server.last_command or supervisor.server.full_command(),
+                "auto_restart": supervisor.auto_restart, "breaker": supervisor.guard.state,
+                "crash_restarts": supervisor.guard.attempts}
+        sample = self.manager.monitor.latest(supervisor.name) if self.manager.monitor is not None else None
+        if sample is not None and supervisor.server.pid:
+            info["resources"] = sample._asdict()
+        return info
+
+    async def list_instances(self, request, writer):
+        return 200, {"instances": [self.instance_info(s) for s in self.manager.supervisors()]}
+
+    async def get_instance(self, request, writer, name):
+        return 200, self.instance_info(self.supervisor(name))
+
+    async def control_instance(self, request, writer, name, action):
+        supervisor = self.supervisor(name)
+        if action == "start":
+            if not supervisor.server.full_command():
+                raise ApiError(409, "没有设置服务器启动文件")
+            started = await self.on_manager_loop(supervisor.start)
+            if not started:
+                raise ApiError(409, "启动服务器失败")
+        elif action == "restart":
+            await self.on_manager_loop(supervisor.restart, "api")
+        elif request.param("wait") in ("1", "true"):
+            stopped = self.aloop.create_future()
+            supervisor.stop(on_stopped=lambda: self.aloop.call_soon_threadsafe(
+                lambda: stopped.done() or stopped.set_result(None)))
+            await stopped
+        else:
+            await self.on_manager_loop(supervisor.stop)
+        return 200, self.instance_info(supervisor)
+
+    async def tail_logs(self, request, writer, name):
+        """先返回最近的行；follow 时改用分块传输持续推送，直到客户端断开"""
+        self.supervisor(name)
+        try:
+            count = int(request.param("lines", "100"))
+        except ValueError:
+            raise ApiError(400, "lines 需要是整数")
+        follow = request.param("follow") in ("1", "true")
+        queue = asyncio.Queue(FOLLOW_QUEUE_SIZE)
+
+        def listener(instance, lines):  # 在界面或无界面模式的线程中调用
+            if instance == name:
+                self.aloop.call_soon_threadsafe(self.offer, queue, lines)
+
+        if follow:
+            with self.manager.output_lock:
+                self.manager.output_listeners.append(listener)
+        try:
+            lines = self.manager.tail_output(name, count)
+            if not follow:
+                await self.send_text(writer, "".join(line + "\n" for line in lines))
+                return None
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\n"
+                         b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+            closed = asyncio.ensure_future(request.reader.read())  # 客户端断开时读到 EOF
+            while True:
+                if lines:
+                    chunk = "".join(line + "\n" for line in lines).encode("utf-8")
+                    writer.write(b"%x\r\n" % len(chunk) + chunk + b"\r\n")
+                    await writer.drain()
+                pending = asyncio.ensure_future(queue.get())
+                await asyncio.wait((pending, closed), return_when=asyncio.FIRST_COMPLETED)
+                if closed.done():
+                    pending.cancel()
+                    return None
+                lines = pending.result()
+        finally:
+            if follow:
+                with self.manager.output_lock:
+                    self.manager.output_listeners.remove(listener)
+
+    @staticmethod
+    def offer(queue, lines):
+        if not queue.full():
+            queue.put_nowait(lines)  # 客户端读得太慢时丢弃，不拖慢其他客户端
+
+    def config_path(self, name):
+        path = getattr(self.supervisor(name), "config_file", None)
+        if not path:
+            raise ApiError(404, f"实例 {name} 没有设置 config_file")
+        return path
+
+    async def get_config(self, request, writer, name):
+        path = self.config_path(name)
+        try:
+            document = await self.in_worker(IniDocument.load, path)
+        except OSError as e:
+            raise ApiError(404, f"无法读取配置文件: {e}")
+        section = request.param("section")
+        key = request.param("key")
+        if key is not None:
+            value = document.get(section or "", key)
+            if value is None:
+                raise ApiError(404, f"没有 {section}.{key}")
+            result = {"section": section, "key": key, "value": value}
+            try:
+                result["fields"] = {f.key: f.display for f in TupleValue(value).fields if f.key is not None}
+            except ValueError:
+                pass
+            return 200, result
+        items = [{"section": s, "key": k, "value": v} for s, k, v in document.items()
+                 if section is None or s == section]
+        return 200, {"path": path, "items": items}
+
+    async def set_config(self, request, writer, name):
+        path = self.config_path(name)
+        data = request.json()
+        section, key, value = data.get("section"), data.get("key"), data.get("value")
+        if section is None or not key or not isinstance(value, str):
+            raise ApiError(400, "需要 section、key 和字符串 value")
+        field = data.get("field")
+        for label, text in (("section", section), ("key", key), ("field", field), ("value", value)):
+            if text is None:
+                continue
+            if not isinstance(text, str) or CONTROL_CHARS.search(text):
+                raise ApiError(422, f"{label} 需要是不含换行和控制字符的字符串")  # 否则可以借换行写入新的键
+        if "]" in section or "=" in key:
+            raise ApiError(422, "section 不能包含 ]，key 不能包含 =")
+        return await self.in_worker(self.write_config, path, section, key, field, value)
+
+    def write_config(self, path, section, key, field, value):
+        """在工作线程中读取、修改、校验并只写回改动的值"""
+        try:
+            document = IniDocument.load(path)
+        except OSError as e:
+            raise ApiError(404, f"无法读取配置文件: {e}")
+        if field is not None:
+            current = document.get(section, key)
+            if current is None:
+                raise ApiError(404, f"没有 {section}.{key}")
+            try:
+                tuple_value = TupleValue(current)
+                tuple_value.set(field, value)
+            except KeyError:
+                raise ApiError(404, f"{section}.{key} 中没有字段 {field}")
+            except ValueError as e:
+                raise ApiError(422, str(e))
+            value = tuple_value.serialize()
+        if self.schema is not None:
+            errors = [str(issue) for issue in self.schema.validate(section, key, value) if issue.severity == "error"]
+            if errors:
+                raise ApiError(422, "; ".join(errors))
+        document.set(section, key, value)
+        written = document.save()
+        return 200, {"section": section, "key": key, "value": value, "written": bool(written)}
+
+    def require_scheduler(self):
+        if self.manager.scheduler is None:
+            raise ApiError(404, "没有启用定时任务")
+        return self.manager.scheduler
+
+    @staticmethod
+    def job_info(job):
+        return dict(job.to_dict(), description=job.describe())
+
+    async def list_jobs(self, request, writer):
+        return 200, {"jobs": [self.job_info(job) for job in self.require_scheduler().list_jobs()]}
+
+    async def add_job(self, request, writer):
+        scheduler = self.require_scheduler()
+        data = request.json()
+        instance = data.get("instance")
+        self.supervisor(instance)
+        try:
+            job = await self.in_worker(scheduler.add, instance, data.get("trigger"), str(data.get("spec", "")))
+        except ValueError as e:
+            raise ApiError(422, str(e))
+        return 201, self.job_info(job)
+
+    async def cancel_job(self, request, writer, job_id):
+        if not await self.in_worker(self.require_scheduler().cancel, job_id):
+            raise ApiError(404, f"没有编号为 {job_id} 的定时任务")
+        return 200, {"cancelled": job_id}
+
+    async def get_metrics(self, request, writer):
+        if self.manager.telemetry is None:
+            raise ApiError(404, "没有启用指标")
+        await self.send_text(writer, self.manager.telemetry.registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+        return None
@@ -0,0 +1,496 @@
+"""存档备份：增量、去重的快照，支持保留策略和一键恢复
+
+备份目录结构:
+    objects/ab/abcdef...    按内容 SHA-256 命名、zlib 压缩的数据块，所有实例和快照共用
+    snapshots/ID.json       快照清单：每个文件的大小、修改时间、权限和数据块列表
+    staging/实例名/          存档目录的暂存副本
+    locks/                  进程间的文件锁，命令行和正在运行的无界面或图形界面进程可以共用同一个仓库
+    frozen/随机名/           生成快照期间暂存副本的硬链接，暂存目录因此可以马上开始下一次同步
+
+一次备份分两步。暂存只把大小或修改时间变化过的文件复制到暂存目录（文件系统支持时用
+reflink，几乎不耗时），服务器停止后只需等这一步完成就可以重新启动；随后在后台从暂存目录
+生成快照，与上一个快照相比没有变化的文件直接沿用它的数据块，变化的文件切块、计算哈希并压缩，
+这些工作分给备份自己的工作线程池，不占用监控器共用的线程池。
+"""
+import concurrent.futures
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，暂存时直接复制
+    fcntl = None
+
+from pltool_ini import FileLock, write_atomic
+
+CHUNK_SIZE = 4 * 1024 * 1024
+FICLONE = 0x40049409  # Linux ioctl，btrfs/xfs 等文件系统上创建共享数据块的副本
+
+
+def clone_file(src, dst):
+    """复制文件内容和修改时间，优先使用 reflink"""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        cloned = False
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                cloned = True
+            except OSError:
+                pass
+        if not cloned:
+            shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+    shutil.copystat(src, dst)
+
+
+def scan_tree(root):
+    """返回 {相对路径: os.stat_result}，相对路径统一使用 / 分隔"""
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue  # 扫描过程中被删除
+            files[os.path.relpath(path, root).replace(os.sep, "/")] = st
+    return files
+
+
+class BackupPolicy:
+    """实例小节中的备份设置"""
+
+    def __init__(self, save_dir="", on_stop=True, keep_last=10, keep_daily=7, keep_weekly=4):
+        self.save_dir = save_dir
+        self.on_stop = on_stop  # 停止、重启和崩溃后先暂存存档
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self.keep_weekly = keep_weekly
+
+    @classmethod
+    def from_section(cls, section):
+        if not section.get("save_dir"):
+            return None
+        return cls(section["save_dir"], section.getboolean("backup_on_stop", fallback=True),
+                   section.getint("backup_keep_last", fallback=10), section.getint("backup_keep_daily", fallback=7),
+                   section.getint("backup_keep_weekly", fallback=4))
+
+
+class Snapshot:
+    def __init__(self, snapshot_id, instance, created, reason, files, stats=None):
+        self.id = snapshot_id
+        self.instance = instance
+        self.created = created
+        self.reason = reason
+        self.files = files  # 相对路径 -> {"size", "mtime_ns", "mode", "chunks"}
+        self.stats = stats or {}
+
+    @property
+    def size(self):
+        return sum(entry["size"] for entry in self.files.values())
+
+    def to_dict(self):
+        return {"id": self.id, "instance": self.instance, "created": self.created, "reason": self.reason,
+                "stats": self.stats, "files": self.files}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["id"], data["instance"], data["created"], data.get("reason", ""), data["files"],
+                   data.get("stats"))
+
+
+class BackupStore:
+    """内容寻址的数据块仓库和快照清单，所有方法都会阻塞，应在工作线程中调用"""
+
+    def __init__(self, root="backups", workers=2, chunk_size=CHUNK_SIZE, level=3):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.level = level
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="Backup")
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()  # 创建快照和清理数据块不能同时进行，进程间还要再加 locks/write
+        self.snapshots = {}  # ID -> Snapshot，清单文件写入后不再修改，每次只读取新出现的
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def object_path(self, digest):
+        return self.path("objects", digest[:2], digest)
+
+    def file_lock(self, name, blocking=True):
+        return FileLock(self.path("locks", name), blocking)
+
+    @contextlib.contextmanager
+    def writing(self):
+        """创建快照和清理时持有：进程内的 write_lock 加上进程间的文件锁"""
+        with self.write_lock, self.file_lock("write"):
+            yield
+
+    def load_snapshots(self):
+        """与清单目录同步：其他进程（例如命令行 --backup）创建或删除的快照也会反映出来"""
+        with self.lock:
+            directory = self.path("snapshots")
+            snapshots = {}
+            for name in os.listdir(directory) if os.path.isdir(directory) else ():
+                if not name.endswith(".json"):
+                    continue
+                snapshot = self.snapshots.get(name[:-len(".json")])
+                if snapshot is None:
+                    try:
+                        with open(os.path.join(directory, name), encoding="utf-8") as f:
+                            snapshot = Snapshot.from_dict(json.load(f))
+                    except (OSError, ValueError, KeyError):
+                        continue  # 损坏的清单不影响其他快照
+                snapshots[snapshot.id] = snapshot
+            self.snapshots = snapshots
+            return snapshots
+
+    def list(self, instance=None):
+        """按时间从新到旧返回快照"""
+        snapshots = self.load_snapshots()
+        with self.lock:
+            snapshots = [s for s in snapshots.values() if instance is None or s.instance == instance]
+        return sorted(snapshots, key=lambda s: s.created, reverse=True)
+
+    def get(self, snapshot_id):
+        snapshot = self.load_snapshots().get(snapshot_id)
+        if snapshot is None:
+            raise Exception(f"没有编号为 {snapshot_id} 的备份")
+        return snapshot
+
+    def stage(self, instance, source):
+        """把存档目录增量同步到暂存目录，返回复制的文件数
+
+        变化的文件写到临时文件再替换，不改动原来的 inode，freeze() 得到的链接因此保持不变。
+        """
+        if not os.path.isdir(source):
+            raise Exception(f"存档目录不存在: {source}")
+        staging = self.path("staging", instance)
+        current = scan_tree(source)
+        staged = scan_tree(staging) if os.path.isdir(staging) else {}
+        copied = 0
+        for relative, st in current.items():
+            old = staged.get(relative)
+            if old is not None and old.st_size == st.st_size and old.st_mtime_ns == st.st_mtime_ns:
+                continue
+            target = os.path.join(staging, *relative.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+            try:
+                clone_file(os.path.join(source, *relative.split("/")), tmp_path)
+                os.replace(tmp_path, target)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            copied += 1
+        for relative in staged.keys() - current.keys():
+            os.remove(os.path.join(staging, *relative.split("/")))
+        return copied
+
+    def freeze(self, instance):
+        """用硬链接为暂存目录做一个不随后续暂存变化的副本，返回它的路径，用完由调用者删除"""
+        staging = self.path("staging", instance)
+        frozen = self.path("frozen", uuid.uuid4().hex)
+        for relative in scan_tree(staging):
+            parts = relative.split("/")
+            target = os.path.join(frozen, *parts)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                os.link(os.path.join(staging, *parts), target)
+            except OSError:
+                clone_file(os.path.join(staging, *parts), target)  # 不支持硬链接的文件系统
+        os.makedirs(frozen, exist_ok=True)
+        return frozen
+
+    def store_file(self, path):
+        """把一个文件切块写入仓库，返回 (数据块列表, 新写入的压缩后字节数)"""
+        chunks = []
+        written = 0
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                digest = hashlib.sha256(data).hexdigest()
+                chunks.append(digest)
+                target = self.object_path(digest)
+                if os.path.exists(target):
+                    continue  # 已有相同内容的数据块
+                compressed = zlib.compress(data, self.level)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                tmp_path = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+                with open(tmp_path, "wb") as out:
+                    out.write(compressed)
+                    out.flush()
+                    os.fsync(out.fileno())
+                os.replace(tmp_path, target)
+                written += len(compressed)
+        return chunks, written
+
+    def snapshot(self, instance, source, reason=""):
+        """为 source 目录创建快照，大小和修改时间与上一个快照相同的文件不重新读取"""
+        with self.writing():
+            return self.create_snapshot(instance, source, reason)
+
+    def create_snapshot(self, instance, source, reason):
+        started = time.monotonic()
+        previous = self.list(instance)
+        previous = previous[0].files if previous else {}
+        files = {}
+        futures = {}
+        reused = 0
+        for relative, st in scan_tree(source).items():
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "mode": st.st_mode & 0o7777}
+            old = previous.get(relative)
+            if old is not None and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+                entry["chunks"] = old["chunks"]
+                reused += 1
+            else:
+                futures[relative] = self.pool.submit(self.store_file, os.path.join(source, *relative.split("/")))
+            files[relative] = entry
+        written = 0
+        for relative, future in futures.items():
+            files[relative]["chunks"], size = future.result()
+            written += size
+        created = time.time()
+        snapshot_id = datetime.datetime.fromtimestamp(created).strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:4]
+        stats = {"files": len(files), "changed": len(futures), "reused": reused, "written_bytes": written,
+                 "seconds": round(time.monotonic() - started, 3)}
+        snapshot = Snapshot(snapshot_id, instance, created, reason, files, stats)
+        os.makedirs(self.path("snapshots"), exist_ok=True)
+        write_atomic(self.path("snapshots", snapshot_id + ".json"),
+                     json.dumps(snapshot.to_dict(), ensure_ascii=False).encode("utf-8"))
+        snapshots = self.load_snapshots()
+        with self.lock:
+            snapshots[snapshot_id] = snapshot
+        return snapshot
+
+    def read_chunk(self, digest):
+        with open(self.object_path(digest), "rb") as f:
+            data = zlib.decompress(f.read())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise Exception(f"备份数据块已损坏: {digest}")
+        return data
+
+    def restore(self, snapshot_id, target):
+        """把快照恢复到 target：先完整写到旁边的临时目录并校验，再替换
+
+        原来的目录改名为 target.before-restore-时间 保留下来，返回这个路径（target 原本不存在时返回 None）。
+        """
+        snapshot = self.get(snapshot_id)
+        target = os.path.abspath(target)
+        building = f"{target}.restoring-{uuid.uuid4().hex[:8]}"
+        try:
+            for relative, entry in snapshot.files.items():
+                path = os.path.join(building, *relative.split("/"))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    for digest in entry["chunks"]:
+                        f.write(self.read_chunk(digest))
+                os.chmod(path, entry["mode"])
+                os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+        except BaseException:
+            shutil.rmtree(building, ignore_errors=True)
+            raise
+        kept = None
+        if os.path.exists(target):
+            kept = f"{target}.before-restore-{time.strftime('%Y%m%d-%H%M%S')}"
+            os.replace(target, kept)
+        os.replace(building, target)
+        return kept
+
+    def retained(self, instance, policy, now=None):
+        """按保留策略返回要保留的快照 ID：最近 keep_last 个，以及最近几天、几周中每天、每周最新的一个"""
+        snapshots = self.list(instance)
+        keep = {s.id for s in snapshots[:policy.keep_last]}
+        for count, period in ((policy.keep_daily, lambda d: d.date()),
+                              (policy.keep_weekly, lambda d: d.isocalendar()[:2])):
+            seen = []
+            for snapshot in snapshots:
+                key = period(datetime.datetime.fromtimestamp(snapshot.created))
+                if key not in seen:
+                    if len(seen) >= count:
+                        break
+                    seen.append(key)
+                    keep.add(snapshot.id)
+        return keep
+
+    def prune(self, instance, policy):
+        """删除保留策略之外的快照和不再被引用的数据块，返回删除的快照 ID"""
+        with self.writing():
+            keep = self.retained(instance, policy)
+            removed = [s.id for s in self.list(instance) if s.id not in keep]
+            snapshots = self.load_snapshots()
+            for snapshot_id in removed:
+                os.remove(self.path("snapshots", snapshot_id + ".json"))
+                with self.lock:
+                    del snapshots[snapshot_id]
+            if removed:
+                self.collect_garbage()
+        return removed
+
+    def collect_garbage(self):
+        """删除没有被任何快照引用的数据块，调用时需持有 writing()"""
+        referenced = set()
+        snapshots = list(self.load_snapshots().values())  # 重新读取清单目录，包括其他进程的快照
+        for snapshot in snapshots:
+            for entry in snapshot.files.values():
+                referenced.update(entry["chunks"])
+        directory = self.path("objects")
+        for prefix in os.listdir(directory) if os.path.isdir(directory) else ():
+            for name in os.listdir(os.path.join(directory, prefix)):
+                if name not in referenced:
+                    os.remove(os.path.join(directory, prefix, name))
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+class BackupManager:
+    """把备份接到监控器的生命周期和定时任务上
+
+    服务器停止（包括重启和崩溃）后先暂存存档，暂存完成就继续后续操作（例如重新启动），
+    快照和清理在后台完成。同一实例的暂存和恢复依次执行；快照和清理在单独的线程中逐个执行，
+    暂存不用等待它们。
+    """
+
+    def __init__(self, manager, store):
+        self.manager = manager
+        self.store = store
+        self.policies = {}  # 实例名 -> BackupPolicy
+        self.locks = {}  # 实例名 -> threading.Lock
+        self.claims = None  # 实例名 -> FileLock，claim() 之后才有，见 claim()
+        self.runner = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="BackupRunner")
+        self.writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="BackupWriter")
+
+    def set_policy(self, name, policy):
+        if policy is None:
+            self.policies.pop(name, None)
+            if name in self.manager.instances:
+                self.manager.get(name).after_stop = None
+            return
+        self.policies[name] = policy
+        self.locks.setdefault(name, threading.Lock())
+        if self.claims is not None:
+            self.claim_instance(name)
+        if name in self.manager.instances:
+            self.manager.get(name).after_stop = self.after_stop if policy.on_stop else None
+
+    def claim(self):
+        """由管理服务器的长期运行进程（无界面、图形界面）调用，为每个实例持有 locks/run-实例名
+
+        命令行 --restore 据此拒绝恢复仍由其他进程管理的实例的存档。
+        """
+        self.claims = {}
+        for name in list(self.policies):
+            self.claim_instance(name)
+
+    def claim_instance(self, name):
+        if name in self.claims:
+            return
+        lock = self.store.file_lock(f"run-{name}", blocking=False)
+        try:
+            lock.__enter__()
+        except BlockingIOError:
+            self.manager.events.put((name, "log", f"实例 {name} 已由另一个 Pltool 进程管理，两边同时运行会互相干扰。"))
+            return
+        self.claims[name] = lock
+
+    def after_stop(self, name, reason, then):
+        """ServerSupervisor 在进程组退出后调用，then 在暂存完成后于事件循环线程中执行"""
+        self.backup(name, reason, then)
+
+    def backup(self, name, reason="manual", then=None):
+        """暂存后在后台创建快照，返回 Future（结果为 Snapshot）"""
+        policy = self.policies.get(name)
+        if policy is None:
+            raise Exception(f"实例 {name} 没有设置存档目录 save_dir")
+        future = concurrent.futures.Future()
+        self.runner.submit(self.run_stage, name, policy, reason, then, future)
+        return future
+
+    def poster(self, name):
+        supervisor = self.manager.get(name) if name in self.manager.instances else None
+        return supervisor, supervisor.post if supervisor is not None else lambda kind, data=None: None
+
+    def run_stage(self, name, policy, reason, then, future):
+        _, post = self.poster(name)
+        try:
+            with self.locks[name], self.store.file_lock(f"stage-{name}"):
+                try:
+                    copied = self.store.stage(name, policy.save_dir)
+                    frozen = self.store.freeze(name)
+                finally:
+                    if then is not None:
+                        self.manager.loop.call_soon(then)  # 暂存失败也不能耽误重启
+        except Exception as e:
+            post("log", f"备份存档失败: {e}")
+            future.set_exception(e)
+            return
+        self.writer.submit(self.run_snapshot, name, policy, reason, frozen, copied, future)  # 切块在 store.pool 中进行
+
+    def run_snapshot(self, name, policy, reason, frozen, copied, future):
+        supervisor, post = self.poster(name)
+        try:
+            snapshot = self.store.snapshot(name, frozen, reason)
+            removed = self.store.prune(name, policy)
+        except Exception as e:
+            post("log", f"备份存档失败: {e}")
+            future.set_exception(e)
+            return
+        finally:
+            shutil.rmtree(frozen, ignore_errors=True)
+        stats = snapshot.stats
+        post("log", f"已备份存档 {snapshot.id}: {stats['files']} 个文件，暂存 {copied} 个，"
+                    f"变化 {stats['changed']} 个，新写入 {stats['written_bytes'] / 1024 / 1024:.1f} MB，"
+                    f"耗时 {stats['seconds']:.1f} 秒" + (f"，清理 {len(removed)} 个旧备份" if removed else ""))
+        post("backups", snapshot.id)
+        if supervisor is not None:
+            supervisor.record("backup", snapshot=snapshot.id, reason=reason, **stats)
+        future.set_result(snapshot)
+
+    def restore(self, name, snapshot_id):
+        """恢复快照到实例的存档目录（服务器必须已停止），返回原目录保留的位置"""
+        policy = self.policies.get(name)
+        if policy is None:
+            raise Exception(f"实例 {name} 没有设置存档目录 save_dir")
+        supervisor = self.manager.get(name)
+        owner = None
+        if self.claims is None or name not in self.claims:  # 实例不由本进程管理时检查其他进程
+            owner = self.store.file_lock(f"run-{name}", blocking=False)
+            try:
+                owner.__enter__()  # 恢复期间一直持有，其他进程这时也不能接管这个实例
+            except BlockingIOError:
+                raise Exception(f"实例 {name} 正由另一个 Pltool 进程管理，请在那里停止服务器并恢复存档")
+        try:
+            with supervisor.lock:
+                if supervisor.is_active():
+                    raise Exception("请先停止服务器再恢复存档")
+                supervisor.blocked = "正在恢复存档"
+            try:
+                with self.locks[name]:
+                    kept = self.store.restore(snapshot_id, policy.save_dir)
+            finally:
+                supervisor.blocked = None
+        finally:
+            if owner is not None:
+                owner.release()
+        supervisor.log(f"已从备份 {snapshot_id} 恢复存档" + (f"，原存档保留在 {kept}" if kept else ""))
+        supervisor.record("restore", snapshot=snapshot_id)
+        supervisor.post("backups", snapshot_id)
+        return kept
+
+    def close(self):
+        self.runner.shutdown(wait=True)  # 暂存完成后才会提交快照，所以先等它
+        self.writer.shutdown(wait=True)
+        self.store.close()
+        for lock in (self.claims or {}).values():
+            lock.release()
@@ -0,0 +1,942 @@
+"""服务器进程管理核心：启动/停止服务器、收集输出、崩溃监控与自动重启，不依赖 tkinter"""
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import locale
+import os
+import queue
+import random
+import selectors
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+
+class OutputBuffer:
+    """有界的服务器输出队列，读取线程写入，界面线程按批取出"""
+
+    def __init__(self, capacity=10000):
+        self.lines = collections.deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.dropped = 0  # 队列已满时被丢弃的行数
+
+    def put(self, line):
+        with self.lock:
+            if len(self.lines) == self.lines.maxlen:
+                self.dropped += 1  # deque 会自动丢弃最旧的一行
+            self.lines.append(line)
+
+    def drain(self, max_lines):
+        """取出最多 max_lines 行，返回 (行列表, 期间丢弃的行数)"""
+        with self.lock:
+            count = min(max_lines, len(self.lines))
+            batch = [self.lines.popleft() for _ in range(count)]
+            dropped, self.dropped = self.dropped, 0
+        return batch, dropped
+
+
+class TimerHandle:
+    """EventLoop.call_later 返回的句柄，可用于取消定时回调"""
+
+    def __init__(self, when, callback, args):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class EventLoop:
+    """所有服务器实例共用的事件循环线程
+
+    维护一个定时器堆和一个跨线程回调队列；在 POSIX 上还通过 selector 读取
+    服务器的输出管道和 pidfd，因此无论管理多少个服务器都只需要这一个线程。
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.timers = []  # (触发时间, 序号, TimerHandle) 组成的最小堆
+        self.sequence = itertools.count()
+        self.ready = collections.deque()  # 待执行的 (回调, 参数)
+        self.lock = threading.Lock()
+        self.waker, self.wake_sender = socket.socketpair()
+        self.waker.setblocking(False)
+        self.wake_sender.setblocking(False)
+        self.selector.register(self.waker, selectors.EVENT_READ, self.drain_waker)
+        self.running = False
+        self.thread = None
+
+    @property
+    def supports_pipes(self):
+        """Windows 上的 select 只支持 socket，管道需要改用读取线程"""
+        return os.name != "nt"
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="EventLoop", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.wake()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=5)
+
+    def in_loop_thread(self):
+        return self.thread is threading.current_thread()
+
+    def wake(self):
+        try:
+            self.wake_sender.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # 缓冲区已满说明循环已经会被唤醒
+
+    def drain_waker(self):
+        try:
+            while self.waker.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def call_soon(self, callback, *args):
+        """在事件循环线程中尽快执行回调（可在任意线程调用）"""
+        self.ready.append((callback, args))
+        if not self.in_loop_thread():
+            self.wake()
+
+    def call_later(self, delay, callback, *args):
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def call_at(self, when, callback, *args):
+        """在 time.monotonic() 达到 when 时执行回调，返回可取消的 TimerHandle"""
+        handle = TimerHandle(when, callback, args)
+        with self.lock:
+            heapq.heappush(self.timers, (when, next(self.sequence), handle))
+        if not self.in_loop_thread():
+            self.wake()
+        return handle
+
+    def add_reader(self, fileobj, callback):
+        """fileobj 可读时在循环线程中调用 callback()"""
+        if not self.in_loop_thread():
+            self.call_soon(self.add_reader, fileobj, callback)
+            return
+        self.selector.register(fileobj, selectors.EVENT_READ, callback)
+
+    def remove_reader(self, fileobj):
+        if not self.in_loop_thread():
+            self.call_soon(self.remove_reader, fileobj)
+            return
+        try:
+            self.selector.unregister(fileobj)
+        except (KeyError, ValueError):
+            pass
+
+    def run(self):
+        while self.running:
+            for key, _ in self.selector.select(self.next_timeout()):
+                self.run_callback(key.data, ())
+            self.run_due_timers()
+            for _ in range(len(self.ready)):
+                self.run_callback(*self.ready.popleft())
+
+    def next_timeout(self):
+        if self.ready:
+            return 0
+        with self.lock:
+            while self.timers and self.timers[0][2].cancelled:
+                heapq.heappop(self.timers)
+            if not self.timers:
+                return None
+            return max(0, self.timers[0][0] - time.monotonic())
+
+    def run_due_timers(self):
+        now = time.monotonic()
+        due = []
+        with self.lock:
+            while self.timers and self.timers[0][0] <= now:
+                due.append(heapq.heappop(self.timers)[2])
+        for handle in due:
+            if not handle.cancelled:
+                self.run_callback(handle.callback, handle.args)
+
+    def run_callback(self, callback, args):
+        try:
+            callback(*args)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)  # 单个回调出错不能让整个循环退出
+
+
+class GameServer:
+    MAX_LINE_LENGTH = 4096  # 单行输出的最大长度，超长的行会被拆分
+    READ_CHUNK_SIZE = 65536
+
+    def __init__(self, name="default", loop=None, output_capacity=10000):
+        self.name = name
+        self.loop = loop or get_event_loop()
+        self.process = None
+        self.start_command = None  # 用于存储启动命令
+        self.start_args = ""  # 启动参数
+        self.last_command = None  # 最近一次实际使用的完整启动命令（含参数）
+        self.is_running = False  # 添加用于跟踪服务器是否运行的标志
+        self.was_stopped = False  # 服务器启动时重置标志
+        self.output = OutputBuffer(output_capacity)  # 服务器 stdout/stderr 输出
+        self.last_stdout = None  # 最近一次 stdout 输出的 time.monotonic()，用于卡死检测
+        self.encoding = locale.getpreferredencoding(False)
+        self.on_exit = None  # 进程退出时在事件循环线程中调用 on_exit(process, returncode)
+        self.watchers = {}  # 进程 -> 等待句柄（pidfd 或等待线程），保证每个进程只有一个
+        self.watch_lock = threading.Lock()
+
+    def full_command(self):
+        if self.start_command is None:
+            return None
+        return f"{self.start_command} {self.start_args}".strip()
+
+    def start_server(self, command=None):
+        """启动服务器，未指定命令时使用类中存储的启动命令"""
+        if self.is_process_running():
+            raise Exception("服务器已经在运行。")
+        command = command or self.full_command() or self.last_command
+        if not command:
+            raise Exception("没有设置服务器启动文件。")
+        if os.name == "nt":
+            group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            group = {"start_new_session": True}  # 服务器及其子进程单独成组，停止时整组发送信号
+        try:
+            self.process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, **group)
+            self.last_command = command
+            self.is_running = True
+            self.was_stopped = False  # 服务器启动时重置标志
+        except Exception as e:
+            raise Exception(f"无法启动服务器: {e}")
+        self.start_output_readers(self.process)
+        self.watch_process(self.process)
+
+    def start_output_readers(self, process):
+        """由事件循环读取 stdout 和 stderr；不支持管道的平台上各用一个读取线程"""
+        for pipe, prefix in ((process.stdout, ""), (process.stderr, "[stderr] ")):
+            if self.loop.supports_pipes:
+                os.set_blocking(pipe.fileno(), False)
+                partial = bytearray()
+                self.loop.add_reader(pipe, lambda p=pipe, pre=prefix, buf=partial: self.on_pipe_readable(p, pre, buf))
+            else:
+                reader = threading.Thread(target=self.read_output, args=(pipe, prefix), daemon=True)
+                reader.start()
+
+    def decode_line(self, raw):
+        return raw.decode(self.encoding, errors="replace").rstrip("\r\n")
+
+    def put_output(self, prefix, raw):
+        if not prefix:
+            self.last_stdout = time.monotonic()
+        self.output.put(prefix + self.decode_line(raw))
+
+    def on_pipe_readable(self, pipe, prefix, partial):
+        """在事件循环线程中读取管道里已有的数据，按行放入输出队列"""
+        try:
+            data = os.read(pipe.fileno(), self.READ_CHUNK_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:  # EOF
+            self.loop.remove_reader(pipe)
+            if partial:
+                self.put_output(prefix, bytes(partial))
+            pipe.close()
+            return
+        partial.extend(data)
+        start = 0
+        while True:
+            end = partial.find(b"\n", start)
+            if end < 0:
+                break
+            self.put_output(prefix, bytes(partial[start:end]))
+            start = end + 1
+        del partial[:start]
+        while len(partial) >= self.MAX_LINE_LENGTH:
+            self.put_output(prefix, bytes(partial[:self.MAX_LINE_LENGTH]))
+            del partial[:self.MAX_LINE_LENGTH]
+
+    def read_output(self, pipe, prefix):
+        """逐行读取管道直到 EOF，放入有界输出队列"""
+        try:
+            for raw in iter(lambda: pipe.readline(self.MAX_LINE_LENGTH), b""):
+                self.put_output(prefix, raw)
+        except (OSError, ValueError):
+            pass  # 管道被关闭
+        finally:
+            pipe.close()
+
+    def watch_process(self, process):
+        """等待进程退出：Linux 上把 pidfd 交给事件循环，其他平台用一个阻塞在 wait() 上的线程
+
+        每个进程只会注册一次，已在等待的进程直接返回。
+        """
+        with self.watch_lock:
+            if process in self.watchers:
+                return
+            pidfd = None
+            if self.loop.supports_pipes and hasattr(os, "pidfd_open"):
+                try:
+                    pidfd = os.pidfd_open(process.pid)
+                except OSError:
+                    pidfd = None  # 内核不支持 pidfd
+            if pidfd is not None:
+                self.watchers[process] = pidfd
+                self.loop.add_reader(pidfd, lambda: self.on_pidfd_readable(process, pidfd))
+                return
+            waiter = threading.Thread(target=self.wait_for_exit, args=(process,), daemon=True)
+            self.watchers[process] = waiter
+        waiter.start()
+
+    def on_pidfd_readable(self, process, pidfd):
+        self.loop.remove_reader(pidfd)
+        os.close(pidfd)
+        self.process_exited(process, process.wait())
+
+    def wait_for_exit(self, process):
+        returncode = process.wait()
+        self.loop.call_soon(self.process_exited, process, returncode)
+
+    def process_exited(self, process, returncode):
+        with self.watch_lock:
+            del self.watchers[process]
+        if process is self.process:
+            self.is_running = False
+        if self.on_exit is not None:
+            self.on_exit(process, returncode)
+
+    def send_input(self, line):
+        """向服务器的标准输入写入一行命令"""
+        process = self.process
+        if process is None or process.stdin is None or process.stdin.closed:
+            raise Exception("服务器没有在运行。")
+        process.stdin.write((line + "\n").encode(self.encoding))
+        process.stdin.flush()
+
+    def terminate_group(self, process):
+        """请求整个进程组退出：POSIX 上发送 SIGTERM，Windows 上发送 CTRL_BREAK_EVENT"""
+        try:
+            if os.name == "nt":
+                os.kill(process.pid, signal.CTRL_BREAK_EVENT)
+            else:
+                os.killpg(process.pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError, OSError):
+            pass  # 进程组已经不存在
+
+    def kill_group(self, process):
+        """强制结束整个进程组（Windows 上为整个进程树）"""
+        if os.name == "nt":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            return
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def group_alive(self, process):
+        """进程本身或同组的任何子进程是否还在运行"""
+        if process.poll() is None:
+            return True
+        if os.name == "nt":
+            return False  # Windows 上无法按组检查，taskkill /T 已按进程树处理
+        try:
+            os.killpg(process.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def close_stdin(self, process):
+        try:
+            if process.stdin is not None:
+                process.stdin.close()
+        except OSError:
+            pass
+
+    def is_process_running(self):
+        """检查进程是否仍在运行。"""
+        if self.process is not None:
+            running = self.process.poll() is None
+            self.is_running = running  # was_stopped 由监控器在记录停止后设置
+            return running
+        return False
+
+    @property
+    def pid(self):
+        return self.process.pid if self.process is not None and self.is_running else None
+
+
+class StopPolicy:
+    """停止服务器的流程参数
+
+    停止时先通过 stdin 或 RCON 发送 commands（例如保存、广播），等待 command_wait 秒，
+    再向整个进程组发送 SIGTERM；timeout 秒后仍未全部退出则发送 SIGKILL。
+    """
+
+    def __init__(self, timeout=30.0, commands=(), command_mode="stdin", command_wait=5.0,
+                 rcon_host="127.0.0.1", rcon_port=0, rcon_password=""):
+        self.timeout = timeout
+        self.commands = list(commands)
+        self.command_mode = command_mode  # stdin 或 rcon
+        self.command_wait = command_wait
+        self.rcon_host = rcon_host
+        self.rcon_port = rcon_port
+        self.rcon_password = rcon_password
+
+    @classmethod
+    def from_section(cls, section):
+        """从工具配置文件的 [server:名称] 小节读取，stop_commands 用分号分隔"""
+        commands = [c.strip() for c in section.get("stop_commands", fallback="").split(";") if c.strip()]
+        return cls(timeout=section.getfloat("stop_timeout", fallback=30.0),
+                   commands=commands,
+                   command_mode=section.get("stop_command_mode", fallback="stdin").lower(),
+                   command_wait=section.getfloat("stop_command_wait", fallback=5.0),
+                   rcon_host=section.get("rcon_host", fallback="127.0.0.1"),
+                   rcon_port=section.getint("rcon_port", fallback=0),
+                   rcon_password=section.get("rcon_password", fallback=""))
+
+
+class RestartPolicy:
+    """崩溃自动重启的退避和熔断参数
+
+    第 n 次连续崩溃后等待 backoff * multiplier^(n-1) 秒（不超过 backoff_max），再加减 jitter 比例的随机量，
+    避免多个实例同时重启；window 秒内自动重启超过 max_restarts 次时熔断，不再自动重启，
+    直到手动启动或手动重启（定时任务和健康检查的重启不算）。崩溃前已稳定运行 stable_uptime 秒时视为新的一轮，计数清零。
+    """
+
+    def __init__(self, backoff=2.0, backoff_max=300.0, multiplier=2.0, jitter=0.2, max_restarts=5, window=600.0,
+                 stable_uptime=300.0):
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.max_restarts = max_restarts
+        self.window = window
+        self.stable_uptime = stable_uptime
+
+    @classmethod
+    def from_section(cls, section):
+        return cls(backoff=section.getfloat("crash_backoff", fallback=2.0),
+                   backoff_max=section.getfloat("crash_backoff_max", fallback=300.0),
+                   jitter=section.getfloat("crash_jitter", fallback=0.2),
+                   max_restarts=section.getint("crash_max_restarts", fallback=5),
+                   window=section.getfloat("crash_window", fallback=600.0),
+                   stable_uptime=section.getfloat("crash_stable_uptime", fallback=300.0))
+
+
+class CrashLoopGuard:
+    """按 RestartPolicy 决定崩溃后是否以及多久后重启；clock 和 random 可以替换，便于测试"""
+
+    def __init__(self, policy=None, clock=time.monotonic, random=random.random):
+        self.policy = policy or RestartPolicy()
+        self.clock = clock
+        self.random = random
+        self.started = None  # 最近一次启动的时间
+        self.attempts = 0  # 本轮连续崩溃后的重启次数
+        self.history = collections.deque()  # window 内自动重启的时间
+        self.tripped = False
+
+    @property
+    def state(self):
+        if self.tripped:
+            return "open"
+        return "backoff" if self.attempts else "closed"
+
+    def on_start(self):
+        self.started = self.clock()
+
+    def reset(self):
+        """手动启动时调用：关闭熔断，清空计数"""
+        self.attempts = 0
+        self.history.clear()
+        self.tripped = False
+
+    def on_crash(self):
+        """返回重启前等待的秒数；熔断时返回 None"""
+        policy = self.policy
+        now = self.clock()
+        if self.started is not None and now - self.started >= policy.stable_uptime:
+            self.reset()  # 崩溃前已经稳定运行了足够久
+        self.started = None
+        while self.history and now - self.history[0] >= policy.window:
+            self.history.popleft()
+        if self.tripped or len(self.history) >= policy.max_restarts:
+            self.tripped = True
+            return None
+        delay = min(policy.backoff_max, policy.backoff * policy.multiplier ** self.attempts)
+        delay *= 1 + policy.jitter * (2 * self.random() - 1)
+        self.attempts += 1
+        self.history.append(now)
+        return max(0.0, delay)
+
+
+class StopSequence:
+    """一次正在进行的停止流程"""
+
+    def __init__(self, process):
+        self.process = process
+        self.callbacks = []  # 进程组全部退出后在事件循环线程中调用
+        self.deadline = None  # 发送 SIGTERM 后开始计时
+        self.killed = False
+        self.handle = None
+        self.reason = "stop"  # 传给停止后阶段，重启时为 restart
+
+
+class ServerSupervisor:
+    """监控单个服务器实例：崩溃检测、崩溃自动重启和定时重启
+
+    不直接操作界面，所有日志和状态变化都以 (实例名, 类型, 数据) 的形式放入 events 队列，
+    由图形界面或无界面模式的主循环在各自的线程中取出处理。
+    """
+
+    STOP_POLL_INTERVAL = 0.05  # 发送信号后检查进程组是否已退出的间隔（秒）
+    KILL_WAIT = 5.0  # 发送 SIGKILL 后最多再等待的秒数
+    USER_RESTART_REASONS = ("manual", "api")  # 这些重启像手动启动一样解除崩溃熔断
+
+    def __init__(self, server, auto_restart=False, events=None, stop_policy=None, restart_policy=None):
+        self.server = server
+        self.name = server.name
+        self.loop = server.loop
+        self.auto_restart = auto_restart
+        self.stop_policy = stop_policy or StopPolicy()
+        self.status = "停止"
+        self.events = events if events is not None else queue.Queue()
+        self.lock = threading.RLock()  # 界面线程和事件循环线程都会调用启动/停止
+        self.scheduled = []  # 尚未触发的定时重启
+        self.log_tailer = None  # 可选的 pltool_watch.LogTailer，跟踪服务器自己写的日志文件
+        self.config_file = None  # 服务器配置文件路径，控制接口读写配置时使用
+        self.telemetry = None  # 可选的 pltool_metrics.Telemetry，记录生命周期事件和指标
+        self.after_stop = None  # 进程组退出后调用 after_stop(名称, 原因, then)，例如 pltool_backup 暂存存档
+        self.stopping = None  # 正在进行的 StopSequence
+        self.guard = CrashLoopGuard(restart_policy)
+        self.backoff_handle = None  # 退避中等待执行的自动重启
+        self.restart_pending = None  # 重启中时为重启原因：停止流程和停止后阶段结束后再次启动，显式停止时清除
+        self.blocked = None  # 暂时不能启动的原因，例如 BackupManager 正在恢复存档
+        server.on_exit = self.on_process_exit
+
+    def post(self, kind, data=None):
+        self.events.put((self.name, kind, data))
+
+    def log(self, message):
+        self.post("log", message)
+
+    def error(self, message):
+        """记录错误，附带当前异常的堆栈"""
+        self.post("error", (message, traceback.format_exc()))
+
+    def set_status(self, status):
+        self.status = status
+        self.post("status", status)
+
+    def record(self, event, **fields):
+        """把生命周期事件交给事件日志和指标（没有配置时什么也不做）"""
+        if self.telemetry is not None:
+            self.telemetry.record(self.name, event, fields)
+
+    def start(self, command=None, automatic=False):
+        """启动服务器；automatic 为假（手动启动）时同时解除崩溃熔断"""
+        with self.lock:
+            if self.blocked is not None:
+                self.log(f"{self.blocked}，暂时不能启动服务器。")
+                return False
+            self.cancel_backoff()
+            if not automatic:
+                self.guard.reset()
+            try:
+                self.server.start_server(command)
+            except Exception as e:
+                self.error(f"启动服务器时出错: {e}")
+                self.record("start_failed", error=str(e))
+                return False
+            self.set_status("运行中")
+            self.log("服务器启动命令: " + self.server.last_command)
+            self.record("start", pid=self.server.pid)
+            self.guard.on_start()
+            return True
+
+    def is_active(self):
+        """进程组还在运行、正在停止或在等待退避后的自动重启
+
+        崩溃后 server.process 仍指向已退出的进程，不能只看它是否为 None。
+        """
+        with self.lock:
+            if self.stopping is not None or self.backoff_handle is not None:
+                return True
+            process = self.server.process
+            return process is not None and self.server.group_alive(process)
+
+    def stop(self, on_stopped=None):
+        """开始停止流程后立即返回，整个进程组退出后在事件循环线程中调用 on_stopped()
+
+        正在重启时调用会取消其中的再次启动。
+        """
+        with self.lock:
+            self.restart_pending = None
+            if self.stopping is not None:
+                self.stopping.reason = "stop"
+                if on_stopped is not None:
+                    self.stopping.callbacks.append(on_stopped)
+                return
+            if self.backoff_handle is not None:
+                self.cancel_backoff()
+                self.set_status("停止")
+                self.log("已取消等待中的自动重启。")
+            process = self.server.process
+            if process is None or not self.server.group_alive(process):
+                self.log("服务器现在没有运行。")
+                if on_stopped is not None:
+                    self.loop.call_soon(on_stopped)
+                return
+            self.server.was_stopped = True  # 之后的退出不是崩溃
+            sequence = self.stopping = StopSequence(process)
+            if on_stopped is not None:
+                sequence.callbacks.append(on_stopped)
+            self.set_status("停止中")
+        policy = self.stop_policy
+        if policy.commands:
+            self.log(f"正在停止服务器，先发送命令: {'; '.join(policy.commands)}")
+            get_worker_pool().submit(self.send_stop_commands, sequence)
+        else:
+            self.log("正在停止服务器...")
+            self.loop.call_soon(self.terminate_stopping, sequence)
+
+    def send_commands(self, commands):
+        """按 stop_policy.command_mode 通过 stdin 或 RCON 发送命令（阻塞，在工作线程中调用）"""
+        policy = self.stop_policy
+        if policy.command_mode == "rcon":
+            from pltool_rcon import RconClient
+            with RconClient(policy.rcon_host, policy.rcon_port, policy.rcon_password) as client:
+                for command in commands:
+                    reply = client.command(command)
+                    if reply:
+                        self.log(f"RCON {command}: {reply.strip()}")
+        else:
+            for command in commands:
+                self.server.send_input(command)
+
+    def send_stop_commands(self, sequence):
+        try:
+            self.send_commands(self.stop_policy.commands)
+        except Exception as e:
+            self.log(f"发送停服命令失败: {e}")
+        self.loop.call_later(self.stop_policy.command_wait, self.terminate_stopping, sequence)
+
+    def terminate_stopping(self, sequence):
+        if sequence is not self.stopping or sequence.deadline is not None:
+            return
+        sequence.deadline = time.monotonic() + self.stop_policy.timeout
+        self.server.terminate_group(sequence.process)
+        self.check_stopping(sequence)
+
+    def check_stopping(self, sequence):
+        """进程组已退出则结束停止流程，超时则升级为 SIGKILL"""
+        if sequence is not self.stopping:
+            return
+        if sequence.handle is not None:
+            sequence.handle.cancel()
+            sequence.handle = None
+        if not self.server.group_alive(sequence.process):
+            self.finish_stopping(sequence)
+            return
+        if sequence.deadline is None:
+            return  # 还在等待停服命令生效，进程退出时会再次检查
+        now = time.monotonic()
+        if now >= sequence.deadline:
+            if sequence.killed:
+                self.log("服务器进程组在 SIGKILL 后仍未退出，放弃等待。")
+                self.finish_stopping(sequence)
+                return
+            self.log(f"服务器在 {self.stop_policy.timeout:g} 秒内没有退出，强制结束进程组。")
+            sequence.killed = True
+            sequence.deadline = now + self.KILL_WAIT
+            self.server.kill_group(sequence.process)
+        sequence.handle = self.loop.call_later(self.STOP_POLL_INTERVAL, self.check_stopping, sequence)
+
+    def finish_stopping(self, sequence):
+        with self.lock:
+            self.stopping = None
+            self.server.close_stdin(sequence.process)
+            if self.server.process is sequence.process:
+                self.server.process = None
+                self.server.is_running = False
+            self.set_status("停止")
+            self.log("服务器停止。")
+            self.record("stop", killed=sequence.killed)
+        self.run_after_stop(sequence.reason, lambda: self.after_stopped(sequence.callbacks))
+
+    def after_stopped(self, callbacks):
+        for callback in callbacks:
+            callback()
+        with self.lock:
+            reason = self.restart_pending
+            if reason is None:
+                return  # 不是重启，或者重启期间又收到了停止请求
+            self.restart_pending = None
+            self.start(automatic=reason not in self.USER_RESTART_REASONS)
+
+    def run_after_stop(self, reason, then):
+        """执行可选的停止后阶段，完成后在事件循环线程中调用 then()（包括重启时的再次启动）"""
+        if self.after_stop is None:
+            then()
+            return
+        try:
+            self.after_stop(self.name, reason, then)
+        except Exception as e:
+            self.log(f"停止后处理失败: {e}")
+            then()
+
+    def restart(self, reason="manual"):
+        """停止服务器，进程组真正退出后立即重新启动，不阻塞调用线程
+
+        reason 记录在事件日志和指标中: manual、schedule、job、health、api 等。只有用户发起的重启
+        （manual、api）像手动启动一样解除崩溃熔断；熔断期间的定时和健康检查重启直接跳过。
+        """
+        automatic = reason not in self.USER_RESTART_REASONS
+        with self.lock:
+            if automatic and self.guard.tripped:
+                self.log(f"崩溃自动重启已熔断，跳过本次重启（{reason}），手动启动后恢复。")
+                return
+            self.record("restart", reason=reason)
+            if self.stopping is not None or self.server.is_process_running():
+                self.stop()
+                if self.stopping is not None:
+                    self.stopping.reason = "restart"
+                    self.restart_pending = reason
+                    return
+            self.start(automatic=automatic)
+
+    def schedule_restart(self, interval):
+        """interval 秒后重启服务器"""
+        with self.lock:
+            self.scheduled = [handle for handle in self.scheduled if not handle.cancelled]
+            handle = self.loop.call_later(interval, self.run_scheduled_restart)
+            self.scheduled.append(handle)
+        self.log(f"已计划在{interval}秒后重启服务器。")
+        return handle
+
+    def run_scheduled_restart(self):
+        self.log("定时重启服务器。")
+        self.restart("schedule")
+
+    def cancel_scheduled(self):
+        """取消定时重启、退避中等待的自动重启和正在进行的重启中的再次启动"""
+        with self.lock:
+            self.restart_pending = None
+            for handle in self.scheduled:
+                handle.cancel()
+            self.scheduled = []
+            if self.backoff_handle is not None:
+                self.cancel_backoff()
+                self.set_status("停止")
+
+    def on_process_exit(self, process, returncode):
+        """服务器进程退出时在事件循环线程中调用，如果是崩溃且开启了自动重启则立即重新启动"""
+        with self.lock:
+            if self.stopping is not None and process is self.stopping.process:
+                self.check_stopping(self.stopping)  # 主动停止的进程退出了，检查整个进程组
+                return
+            if process is not self.server.process or self.server.was_stopped:
+                return  # 已经被新进程替换
+            self.server.was_stopped = True  # 设置标志，避免重复记录
+            self.log(f"服务器进程已停止（退出码 {returncode}）。")
+            self.record("crash", returncode=returncode)
+            if self.server.group_alive(process):
+                self.log("清理崩溃后残留的子进程。")
+                self.server.kill_group(process)
+            self.server.close_stdin(process)
+            self.set_status("停止")
+            self.run_after_stop("crash", lambda: self.restart_after_crash(process))
+
+    def restart_after_crash(self, process):
+        """按 CrashLoopGuard 退避后重启；过于频繁时熔断，等待手动启动"""
+        with self.lock:
+            if not self.auto_restart or self.server.process is not process:  # 期间已被手动启动
+                return
+            delay = self.guard.on_crash()
+            if delay is None:
+                policy = self.guard.policy
+                self.set_status("熔断")
+                self.log(f"服务器在 {policy.window:g} 秒内已自动重启 {policy.max_restarts} 次仍然崩溃，"
+                         f"停止自动重启，请检查后手动启动。")
+                self.record("breaker_open", restarts=len(self.guard.history))
+                return
+            self.set_status("等待重启")
+            self.log(f"将在 {delay:.1f} 秒后第 {self.guard.attempts} 次尝试重启服务器...")
+            self.backoff_handle = self.loop.call_later(delay, self.run_backoff_restart, process)
+
+    def run_backoff_restart(self, process):
+        with self.lock:
+            if self.backoff_handle is None or self.server.process is not process:
+                return
+            self.backoff_handle = None
+            # 重启逻辑
+            self.log("正在尝试重启服务器...")
+            self.record("restart", reason="crash", attempt=self.guard.attempts)
+            if not self.start(automatic=True):
+                self.log("重启服务器失败。")
+                self.restart_after_crash(process)  # 启动失败同样计入退避和熔断，而不是就此停止重试
+
+    def cancel_backoff(self):
+        if self.backoff_handle is not None:
+            self.backoff_handle.cancel()
+            self.backoff_handle = None
+
+
+class ServerManager:
+    """按名称管理多个服务器实例，所有实例共用一个事件循环和一个事件队列"""
+
+    def __init__(self, loop=None):
+        self.loop = loop or get_event_loop()
+        self.events = queue.Queue()
+        self.instances = {}  # 名称 -> ServerSupervisor，保持添加顺序
+        self.lock = threading.Lock()
+        self.monitor = None  # 可选的 ResourceMonitor
+        self.health = None  # 可选的 HealthMonitor
+        self.scheduler = None  # 可选的 pltool_scheduler.Scheduler
+        self.telemetry = None  # 可选的 pltool_metrics.Telemetry
+        self.backups = None  # 可选的 pltool_backup.BackupManager
+        self.watcher = None  # 可选的 pltool_watch.FileWatcher
+        self.recent_output = {}  # 名称 -> 最近显示过的日志行，供控制接口查询
+        self.output_listeners = []  # 界面或无界面模式显示日志行后调用 listener(名称, 行列表)
+        self.output_lock = threading.Lock()
+
+    def add(self, name, command=None, args="", auto_restart=False, output_capacity=10000, stop_policy=None,
+            restart_policy=None):
+        with self.lock:
+            if name in self.instances:
+                raise Exception(f"服务器实例已存在: {name}")
+            server = GameServer(name, self.loop, output_capacity)
+            server.start_command = command or None
+            server.start_args = args
+            supervisor = ServerSupervisor(server, auto_restart, self.events, stop_policy, restart_policy)
+            supervisor.telemetry = self.telemetry
+            self.instances[name] = supervisor
+        self.events.put((name, "added", None))
+        return supervisor
+
+    def remove(self, name):
+        with self.lock:
+            supervisor = self.instances.pop(name)
+        supervisor.cancel_scheduled()
+        if supervisor.log_tailer is not None:
+            supervisor.log_tailer.close()
+        if self.scheduler is not None:
+            self.scheduler.cancel_instance(name)
+        if supervisor.server.process is not None:
+            supervisor.stop()
+        self.events.put((name, "removed", None))
+
+    def get(self, name):
+        return self.instances[name]
+
+    def names(self):
+        with self.lock:
+            return list(self.instances)
+
+    def supervisors(self):
+        with self.lock:
+            return list(self.instances.values())
+
+    def start_all(self):
+        for supervisor in self.supervisors():
+            if supervisor.server.full_command() and supervisor.status != "运行中":
+                supervisor.start()
+
+    def stop_all(self, wait=False, on_done=None):
+        """停止所有实例；wait 为真时阻塞到所有进程组都退出，on_done 在全部停止后调用"""
+        pending = []
+        for supervisor in self.supervisors():
+            supervisor.cancel_scheduled()
+            if supervisor.stopping is not None or supervisor.server.is_process_running():
+                pending.append(supervisor)
+        done = threading.Event()
+        remaining = [len(pending)]
+        counter_lock = threading.Lock()
+
+        def one_stopped():
+            with counter_lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                done.set()
+                if on_done is not None:
+                    on_done()
+
+        if not pending:
+            done.set()
+            if on_done is not None:
+                on_done()
+        for supervisor in pending:
+            supervisor.stop(on_stopped=one_stopped)
+        if wait:
+            limit = max((s.stop_policy.command_wait + s.stop_policy.timeout for s in pending), default=0)
+            done.wait(limit + ServerSupervisor.KILL_WAIT + 5)  # 停止流程最终一定会结束，这里只是兜底
+        return done.is_set()
+
+    def publish_output(self, name, lines, recent=1000):
+        """前端显示了一批日志行（服务器输出和监控日志）后调用，转发给其他订阅者"""
+        with self.output_lock:
+            if name not in self.recent_output:
+                self.recent_output[name] = collections.deque(maxlen=recent)
+            self.recent_output[name].extend(lines)
+            listeners = list(self.output_listeners)
+        for listener in listeners:
+            listener(name, lines)
+
+    def tail_output(self, name, count):
+        with self.output_lock:
+            lines = self.recent_output.get(name, ())
+            return list(lines)[-count:] if count > 0 else []
+
+    def status_rows(self):
+        """返回 (名称, 状态, PID, 启动命令) 列表"""
+        return [(s.name, s.status, s.server.pid, s.server.last_command or s.server.full_command() or "")
+                for s in self.supervisors()]
+
+    def status_table(self):
+        rows = [("名称", "状态", "PID", "CPU", "内存", "启动命令")]
+        for name, status, pid, command in self.status_rows():
+            sample = self.monitor.latest(name) if self.monitor is not None and pid else None
+            cpu = f"{sample.cpu_percent:.1f}%" if sample else "-"
+            rss = f"{sample.rss_bytes / 1024 / 1024:.0f}MB" if sample else "-"
+            rows.append((name, status, str(pid or "-"), cpu, rss, command))
+        widths = [max(len(row[i]) for row in rows) for i in range(5)]
+        return "\n".join("  ".join(f"{cell:<{width}}" for cell, width in zip(row, widths)) + "  " + row[5]
+                         for row in rows)
+
+
+_default_loop = None
+_default_loop_lock = threading.Lock()
+_worker_pool = None
+
+
+def get_event_loop():
+    """返回进程内共用的事件循环，首次调用时启动"""
+    global _default_loop
+    with _default_loop_lock:
+        if _default_loop is None:
+            _default_loop = EventLoop()
+            _default_loop.start()
+        return _default_loop
+
+
+def get_worker_pool():
+    """返回共用的工作线程池，用于 RCON、端口探测等会阻塞的操作"""
+    global _worker_pool
+    with _default_loop_lock:
+        if _worker_pool is None:
+            _worker_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="Worker")
+        return _worker_pool
@@ -0,0 +1,1399 @@
+"""tkinter 图形界面，是 pltool_core 中服务器监控器的一个轻量前端"""
+import os
+import queue
+import re
+import sys
+import tkinter as tk
+import tkinter.scrolledtext as tkst
+import time
+import traceback
+from tkinter import filedialog, messagebox, simpledialog, ttk
+
+from pltool_core import get_worker_pool
+from pltool_ini import IniDocument
+from pltool_logs import LogBuffer, LogSink, format_log_line
+from pltool_resources import format_bytes
+from pltool_search import ConfigIndex
+from pltool_schema import Schema, display_raw
+from pltool_scheduler import ACTION_NAMES, ACTIONS, TRIGGERS, format_time
+from pltool_tuple import KINDS, TupleValue, is_tuple_value
+
+
+class LogView:
+    """只渲染环形缓冲区中一个窗口的日志框
+
+    Text 控件中只保留 [win_start, win_end) 这一段行，超出 view_lines 时按块裁剪；
+    滚动到顶部或底部时再从缓冲区加载更早或更新的行。
+    """
+
+    def __init__(self, master, buffer, view_lines=1000, chunk_lines=200):
+        self.buffer = buffer
+        self.view_lines = view_lines
+        self.chunk_lines = chunk_lines
+        self.win_start = buffer.total
+        self.win_end = buffer.total
+        self.loading = False
+        self.text = tkst.ScrolledText(master, state='disabled', height=10, wrap='word')
+        self.text.config(yscrollcommand=self.on_yscroll)
+
+    def pack(self, **kwargs):
+        self.text.pack(**kwargs)
+
+    def set_buffer(self, buffer):
+        """切换到另一个缓冲区（例如另一个服务器实例的日志）"""
+        self.buffer = buffer
+        self.show_tail()
+
+    def is_following(self):
+        """窗口位于缓冲区末尾并且滚动条在底部时自动跟随新日志"""
+        return self.win_end == self.buffer.total and self.text.yview()[1] >= 0.999
+
+    def append(self, lines):
+        following = self.is_following()
+        self.buffer.extend(lines)
+        if not following:
+            return  # 用户正在查看历史日志，新行只进入缓冲区
+        self.text.config(state='normal')
+        self.text.insert(tk.END, "\n".join(lines) + "\n")
+        self.win_end = self.buffer.total
+        excess = (self.win_end - self.win_start) - self.view_lines
+        if excess >= self.chunk_lines:
+            self.text.delete('1.0', f'{excess + 1}.0')  # 按块删除最旧的行
+            self.win_start += excess
+        self.text.config(state='disabled')
+        self.text.yview(tk.END)
+
+    def on_yscroll(self, first, last):
+        self.text.vbar.set(first, last)
+        if self.loading:
+            return
+        if float(first) <= 0.0 and self.win_start > self.buffer.first_seq:
+            self.loading = True
+            self.text.after_idle(self.load_older)
+        elif float(last) >= 1.0 and self.win_end < self.buffer.total:
+            self.loading = True
+            self.text.after_idle(self.load_newer)
+
+    def load_older(self):
+        """在顶部插入更早的一块日志，并从底部裁掉同样多的行"""
+        start = max(self.buffer.first_seq, self.win_start - self.chunk_lines)
+        lines = self.buffer.get_range(start, self.win_start)
+        self.text.config(state='normal')
+        if lines:
+            self.text.insert('1.0', "\n".join(lines) + "\n")
+            self.win_start = start
+        excess = (self.win_end - self.win_start) - self.view_lines
+        if excess > 0:
+            self.text.delete(f'end-{excess + 1}l', 'end-1c')
+            self.win_end -= excess
+        self.text.config(state='disabled')
+        self.text.yview(f'{len(lines) + 1}.0')  # 保持原来的阅读位置
+        self.loading = False
+
+    def load_newer(self):
+        """在底部追加更新的一块日志，并从顶部裁掉同样多的行"""
+        if self.win_start < self.buffer.first_seq:
+            self.show_tail()  # 窗口已落后于缓冲区，直接跳回最新日志
+            return
+        lines = self.buffer.get_range(self.win_end, self.win_end + self.chunk_lines)
+        self.text.config(state='normal')
+        self.text.insert(tk.END, "\n".join(lines) + "\n")
+        self.win_end += len(lines)
+        excess = (self.win_end - self.win_start) - self.view_lines
+        if excess > 0:
+            self.text.delete('1.0', f'{excess + 1}.0')
+            self.win_start += excess
+        self.text.config(state='disabled')
+        self.loading = False
+
+    def show_tail(self):
+        """重新渲染缓冲区末尾的 view_lines 行"""
+        self.win_end = self.buffer.total
+        self.win_start = max(self.buffer.first_seq, self.win_end - self.view_lines)
+        lines = self.buffer.get_range(self.win_start, self.win_end)
+        self.text.config(state='normal')
+        self.text.delete('1.0', tk.END)
+        if lines:
+            self.text.insert(tk.END, "\n".join(lines) + "\n")
+        self.text.config(state='disabled')
+        self.text.yview(tk.END)
+        self.loading = False
+
+
+class Sparkline:
+    """在 Canvas 上把一组数值画成折线"""
+
+    def __init__(self, master, width=150, height=32, color='blue'):
+        self.width = width
+        self.height = height
+        self.color = color
+        self.canvas = tk.Canvas(master, width=width, height=height, bg='white',
+                                highlightthickness=1, highlightbackground='gray')
+
+    def grid(self, **kwargs):
+        self.canvas.grid(**kwargs)
+
+    def draw(self, values):
+        self.canvas.delete('all')
+        values = values[-self.width:]  # 每个像素最多一个点
+        if len(values) < 2:
+            return
+        top = max(values) or 1
+        step = (self.width - 2) / (len(values) - 1)
+        points = []
+        for i, value in enumerate(values):
+            points.extend((1 + i * step, self.height - 2 - value / top * (self.height - 4)))
+        self.canvas.create_line(*points, fill=self.color)
+
+
+class TupleEditor:
+    """把 OptionSettings=(...) 这样的元组值显示为 键/类型/值 表格，双击值进行编辑
+
+    嵌套元组作为一个整体编辑；修改直接写入 TupleValue，get() 返回序列化后的文本。
+    """
+
+    def __init__(self, master, tuple_value, height=10, on_change=None):
+        self.value = tuple_value
+        self.on_change = on_change  # 每次成功修改一个字段后调用 on_change(字段)
+        self.frame = tk.Frame(master)
+        self.tree = ttk.Treeview(self.frame, columns=("kind", "value"), height=height)
+        self.tree.heading('#0', text="键")
+        self.tree.heading('kind', text="类型")
+        self.tree.heading('value', text="值")
+        self.tree.column('#0', width=200)
+        self.tree.column('kind', width=60)
+        self.tree.column('value', width=240)
+        scrollbar = tk.Scrollbar(self.frame, command=self.tree.yview)
+        self.tree.config(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        for i, field in enumerate(tuple_value.fields):
+            if field.key is not None:
+                self.tree.insert('', tk.END, iid=str(i), text=field.key,
+                                 values=(KINDS[field.kind], field.display))
+        self.tree.bind('<Double-1>', self.begin_edit)
+        self.editor = None
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def get(self):
+        return self.value.serialize()
+
+    def mark_issues(self, issues):
+        """按模式校验结果给字段着色：错误为红色，警告为橙色"""
+        self.tree.tag_configure('error', foreground='red')
+        self.tree.tag_configure('warning', foreground='darkorange')
+        severities = {}
+        for issue in issues:
+            if issue.subkey is not None and severities.get(issue.subkey) != "error":
+                severities[issue.subkey] = issue.severity
+        for i, field in enumerate(self.value.fields):
+            if field.key is not None:
+                severity = severities.get(field.key)
+                self.tree.item(str(i), tags=(severity,) if severity else ())
+
+    def select(self, key):
+        """选中并滚动到某个字段（搜索结果跳转用）"""
+        for i, field in enumerate(self.value.fields):
+            if field.key == key:
+                self.tree.selection_set(str(i))
+                self.tree.see(str(i))
+                return
+
+    def begin_edit(self, event):
+        """在值单元格上覆盖一个输入框，回车确认，Esc 取消"""
+        item = self.tree.identify_row(event.y)
+        if not item:
+            return
+        self.cancel_edit()
+        x, y, width, height = self.tree.bbox(item, 'value')
+        field = self.value.fields[int(item)]
+        self.editor = tk.Entry(self.tree)
+        self.editor.insert(0, field.display)
+        self.editor.place(x=x, y=y, width=width, height=height)
+        self.editor.focus_set()
+        self.editor.bind('<Return>', lambda e: self.finish_edit(item))
+        self.editor.bind('<FocusOut>', lambda e: self.finish_edit(item))
+        self.editor.bind('<Escape>', lambda e: self.cancel_edit())
+
+    def finish_edit(self, item):
+        if self.editor is None:
+            return
+        field = self.value.fields[int(item)]
+        text = self.editor.get()
+        self.cancel_edit()
+        try:
+            self.value.set(field.key, text)
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+            return
+        self.tree.set(item, 'value', field.display)
+        if self.on_change is not None:
+            self.on_change(field)
+
+    def cancel_edit(self):
+        if self.editor is not None:
+            editor, self.editor = self.editor, None
+            editor.destroy()
+
+
+SEVERITY_COLORS = {"error": 'red', "warning": 'darkorange'}
+
+
+class ConfigListView:
+    """只为可见行创建控件的配置项列表
+
+    控件池中固定有 visible_rows 行（标签 + 输入框 + 按钮），滚动时只把它们重新绑定到
+    其他配置项，因此打开有成百上千个键的文件也不会创建更多控件。输入直接写入 IniDocument，
+    元组值和较长的值通过行尾的按钮在单独的窗口中编辑。
+    """
+
+    def __init__(self, master, visible_rows=15, is_complex=None, on_open=None, on_set=None, severity=None):
+        self.visible_rows = visible_rows
+        self.severity = severity or (lambda section, key: None)  # 返回该键校验结果中最严重的级别
+        self.is_complex = is_complex or (lambda value: False)
+        self.on_open = on_open  # on_open(小节, 键, 类型, 元组字段) 打开单独的编辑窗口
+        self.on_set = on_set  # on_set(小节, 键, 值)，默认直接写入 document
+        self.document = None
+        self.all_rows = []  # [(小节, 键)]，重复的键只保留第一个
+        self.rows = []  # 当前显示的行，搜索时是 all_rows 的子集
+        self.highlights = {}  # (小节, 键) -> 命中的 SearchMatch
+        self.kinds = {}  # (小节, 键) -> "tuple"/"long"/"plain"，首次显示时计算
+        self.top = 0
+        self.binding = False
+        self.frame = tk.Frame(master)
+        self.scrollbar = tk.Scrollbar(self.frame, command=self.on_scrollbar)
+        self.scrollbar.grid(row=0, column=3, rowspan=visible_rows, sticky='ns')
+        self.slots = []
+        for slot in range(visible_rows):
+            var = tk.StringVar()
+            label = tk.Label(self.frame, anchor='w', width=36)
+            entry = tk.Entry(self.frame, textvariable=var, width=50)
+            button = tk.Button(self.frame, text="...", command=lambda s=slot: self.open_slot(s))
+            label.grid(row=slot, column=0, sticky='w')
+            entry.grid(row=slot, column=1, sticky='we')
+            button.grid(row=slot, column=2, padx=2)
+            var.trace_add('write', lambda *args, s=slot: self.on_edit(s))
+            for widget in (label, entry, button):
+                widget.bind('<MouseWheel>', self.on_mousewheel)
+                widget.bind('<Button-4>', lambda e: self.scroll(-3))
+                widget.bind('<Button-5>', lambda e: self.scroll(3))
+            self.slots.append({"var": var, "label": label, "entry": entry, "button": button, "index": None})
+        self.label_bg = self.slots[0]["label"].cget('bg')
+        self.entry_bg = self.slots[0]["entry"].cget('bg')
+        self.frame.grid_columnconfigure(1, weight=1)
+        self.render()
+
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+
+    def set_document(self, document):
+        self.document = document
+        seen = set()
+        self.all_rows = []
+        for section, key, _ in document.items():
+            if (section, key) not in seen:
+                seen.add((section, key))
+                self.all_rows.append((section, key))
+        self.rows = self.all_rows
+        self.highlights = {}
+        self.kinds = {}
+        self.top = 0
+        self.render()
+
+    def reload(self):
+        """文档中增删了键之后重建行列表，保持当前滚动位置"""
+        top = self.top
+        filtered = self.rows is not self.all_rows
+        self.set_document(self.document)
+        if not filtered:
+            self.scroll(top)
+
+    def clear(self):
+        self.document = None
+        self.all_rows = self.rows = []
+        self.highlights = {}
+        self.kinds = {}
+        self.top = 0
+        self.render()
+
+    def set_filter(self, matches):
+        """只显示命中的键并高亮命中的位置；matches 为 None 时显示全部"""
+        self.highlights = {}
+        if matches is None:
+            self.rows = self.all_rows
+        else:
+            self.rows = []
+            for match in matches:
+                row = (match.record.section, match.record.key)
+                if row not in self.highlights:
+                    self.highlights[row] = match
+                    self.rows.append(row)
+        self.top = 0
+        self.render()
+
+    def refresh(self):
+        """值或类型判断条件在列表外被修改后重新显示"""
+        self.kinds = {}
+        self.render()
+
+    def kind(self, index):
+        row = self.rows[index]
+        if row not in self.kinds:
+            value = self.document.get(*row, "")
+            if is_tuple_value(value):
+                self.kinds[row] = "tuple"
+            elif self.is_complex(value):
+                self.kinds[row] = "long"
+            else:
+                self.kinds[row] = "plain"
+        return self.kinds[row]
+
+    def render(self):
+        """把控件池绑定到从 top 开始的行"""
+        self.binding = True
+        try:
+            for offset, slot in enumerate(self.slots):
+                index = self.top + offset
+                if index >= len(self.rows):
+                    slot["index"] = None
+                    slot["label"].config(text="", bg=self.label_bg, fg='black')
+                    slot["entry"].config(state='normal', bg=self.entry_bg)
+                    slot["var"].set("")
+                    slot["entry"].config(state='disabled')
+                    slot["button"].grid_remove()
+                    continue
+                section, key = self.rows[index]
+                match = self.highlights.get((section, key))
+                name = f"{section}.{key}"
+                if match is not None and match.record.subkey is not None:
+                    name += f" › {match.record.subkey}"  # 命中的是元组中的字段
+                name_hit = match is not None and not match.in_value
+                value_hit = match is not None and match.in_value and match.record.subkey is None
+                slot["index"] = index
+                severity = self.severity(section, key)
+                slot["label"].config(text=f"{name}:", bg='yellow' if name_hit else self.label_bg,
+                                     fg=SEVERITY_COLORS.get(severity, 'black'))
+                slot["entry"].config(state='normal', bg='lightyellow' if value_hit else self.entry_bg)
+                slot["var"].set(self.document.get(section, key, ""))
+                kind = self.kind(index)
+                slot["entry"].config(state='readonly' if kind == "tuple" else 'normal')
+                if kind == "plain":
+                    slot["button"].grid_remove()
+                else:
+                    slot["button"].config(text="表格" if kind == "tuple" else "...")
+                    slot["button"].grid()
+        finally:
+            self.binding = False
+        total = max(len(self.rows), 1)
+        self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible_rows) / total))
+
+    def on_edit(self, slot):
+        if self.binding:
+            return
+        index = self.slots[slot]["index"]
+        if index is not None and self.kind(index) != "tuple":
+            section, key = self.rows[index]
+            if self.on_set is not None:
+                self.on_set(section, key, self.slots[slot]["var"].get())
+            else:
+                self.document.set(section, key, self.slots[slot]["var"].get())
+
+    def open_slot(self, slot):
+        index = self.slots[slot]["index"]
+        if index is not None and self.on_open is not None:
+            section, key = self.rows[index]
+            match = self.highlights.get((section, key))
+            self.on_open(section, key, self.kind(index), match.record.subkey if match else None)
+
+    def scroll(self, rows):
+        top = max(0, min(self.top + rows, len(self.rows) - self.visible_rows))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def on_scrollbar(self, command, amount, unit=None):
+        if command == 'moveto':
+            self.scroll(int(float(amount) * len(self.rows)) - self.top)
+        elif unit == 'pages':
+            self.scroll(int(amount) * self.visible_rows)
+        else:
+            self.scroll(int(amount))
+
+    def on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+
+
+class ServerApp:
+    OUTPUT_POLL_INTERVAL = 100  # 毫秒，服务器输出刷新到日志框的间隔
+    OUTPUT_BATCH_SIZE = 500  # 每次刷新最多写入日志框的行数
+
+    def __init__(self, root, manager, log_capacity=20000, log_view_lines=1000, log_sink=None, schema=None):
+        self.config = None
+        self.schema = schema or Schema()  # 服务器配置文件的模式，用于校验和比较默认值
+        self.config_issues = {}  # (小节, 键) -> [SchemaIssue]
+        self.config_status_label = None
+        self.log_frame = None
+        self.log_view = None
+        self.log_sink = log_sink or LogSink()  # 所有日志统一写入的文件
+        self.log_capacity = log_capacity  # 每个实例的日志最多保留的行数
+        self.log_buffers = {}  # 实例名 -> LogBuffer
+        self.manager = manager
+        self.instance_var = tk.StringVar(value=manager.names()[0])  # 服务器控制页当前操作的实例
+        self.instance_combobox = None
+        self.instance_tree = None
+        self.job_tree = None
+        self.job_instance_combobox = None
+        self.job_spec_entry = None
+        self.clear_button = None
+        self.filepath_entry = None
+        self.status_label = None
+        self.stop_button = None
+        self.restart_button = None
+        self.choose_exe_button = None
+        self.start_parameters_entry = None
+        self.choose_config_button = None
+        self.config_file_entry = None
+        self.start_button = None
+        self.server_status = "停止"
+        self.log_view_lines = log_view_lines  # 日志框中最多渲染的行数
+        self.log_text = None
+        self.restart_interval_entry = None  # 用于输入重启间隔的Entry
+        self.config = IniDocument()  # 当前打开的服务器配置文件
+        self.complex_value_param = 3  # 可以根据需要设置一个合适的默认值
+        self.search_index = '1.0'  # 初始化搜索索引
+        self.auto_restart_var = tk.IntVar()
+        self.config_list = None
+        self.config_index = ConfigIndex()  # 配置项搜索索引
+        self.config_search_var = tk.StringVar()
+        self.config_regex_var = tk.IntVar()
+        self.config_search_entry = None
+        self.config_search_label = None
+        self.config_search_job = None
+        self.config_watch = None  # 当前配置文件的 pltool_watch.WatchHandle
+        self.text = None
+        self.search_entry = None
+        #     self.by_label = tk.Label(root, text="by lgnoer", fg="gray")  #
+        #     self.by_label.pack(side=tk.BOTTOM, fill=tk.X)  #
+        self.supervisor = manager.get(self.instance_var.get())
+        self.server = self.supervisor.server
+        self.root = root
+
+        # 创建顶部的菜单按钮
+        self.menu_frame = tk.Frame(root)
+        self.menu_frame.pack(side=tk.TOP, fill=tk.X)
+
+        self.page1_button = tk.Button(self.menu_frame, text="服务器控制",
+                                      command=lambda: self.show_frame(self.page1))
+        self.page1_button.pack(side=tk.LEFT)
+
+        self.page2_button = tk.Button(self.menu_frame, text="配置文件设置", command=lambda: self.show_frame(self.page2))
+        self.page2_button.pack(side=tk.LEFT)
+
+        self.page3_button = tk.Button(self.menu_frame, text="服务器列表", command=lambda: self.show_frame(self.page3))
+        self.page3_button.pack(side=tk.LEFT)
+
+        self.page4_button = tk.Button(self.menu_frame, text="定时任务", command=lambda: self.show_frame(self.page4))
+        self.page4_button.pack(side=tk.LEFT)
+
+        self.page5_button = tk.Button(self.menu_frame, text="存档备份", command=lambda: self.show_frame(self.page5))
+        self.page5_button.pack(side=tk.LEFT)
+
+        # 创建页面1 (Server Control)
+        self.page1 = tk.Frame(root)
+        self.init_page1(self.page1)
+
+        # 创建页面2 (Settings)
+        self.page2 = tk.Frame(root)
+        self.init_page2(self.page2)
+
+        # 创建页面3 (Instances)
+        self.page3 = tk.Frame(root)
+        self.init_page3(self.page3)
+
+        # 创建页面4 (Jobs)
+        self.page4 = tk.Frame(root)
+        self.init_page4(self.page4)
+
+        # 创建页面5 (Backups)
+        self.page5 = tk.Frame(root)
+        self.init_page5(self.page5)
+
+        self.frames = [self.page1, self.page2, self.page3, self.page4, self.page5]
+        self.show_frame(self.page1)
+
+        self.switch_instance(self.instance_var.get())
+
+        self.drain_server_output()  # 开始把服务器输出写入日志框
+
+    def show_frame(self, frame):
+        for f in self.frames:
+            f.pack_forget()
+        frame.pack()
+
+    def load_config(self, config_path):
+        """从给定路径加载配置文件，每次读取都重新建立索引"""
+        self.config = IniDocument.load(config_path)
+        return self.config
+
+    def save_config(self, config_path):
+        """只把改动过的值写回给定路径"""
+        return self.config.save(config_path)
+
+    def init_page1(self, frame):
+        tk.Label(frame, text="服务器实例:").grid(row=1, column=0, sticky='w', pady=2)
+        self.instance_combobox = ttk.Combobox(frame, textvariable=self.instance_var, state='readonly',
+                                              values=self.manager.names())
+        self.instance_combobox.grid(row=1, column=1, sticky='w', pady=2)
+        self.instance_combobox.bind('<<ComboboxSelected>>',
+                                    lambda event: self.switch_instance(self.instance_var.get()))
+
+        self.status_label = tk.Label(frame, text=f"服务器状态: {self.server_status}")
+        self.status_label.grid(row=2, column=0, columnspan=3, sticky='w', pady=2)
+
+        tk.Label(frame, text="服务器启动文件:").grid(row=3, column=0, sticky='w', pady=2)
+        self.filepath_entry = tk.Entry(frame, width=50, state='readonly')
+        self.filepath_entry.grid(row=3, column=1, sticky='we', pady=2)
+        self.choose_exe_button = tk.Button(frame, text="...", command=self.choose_exe)
+        self.choose_exe_button.grid(row=3, column=2, padx=5)
+        self.clear_button = tk.Button(frame, text="清除", command=self.clear_filepath)
+        self.clear_button.grid(row=3, column=3, padx=5)
+
+        tk.Label(frame, text="服务器参数(可以为空):").grid(row=4, column=0, sticky='w', pady=2)
+        self.start_parameters_entry = tk.Entry(frame, width=50)
+        self.start_parameters_entry.grid(row=4, column=1, sticky='we', columnspan=2, pady=2)
+
+        self.start_button = tk.Button(frame, text="启动服务器", command=self.start_server, state=tk.DISABLED)
+        self.start_button.grid(row=6, column=0, pady=5)
+        self.stop_button = tk.Button(frame, text="停止服务器", command=self.stop_server, state=tk.DISABLED)
+        self.stop_button.grid(row=6, column=1, pady=5)
+        self.restart_button = tk.Button(frame, text="重启服务器", command=self.restart_server, state=tk.DISABLED)
+        self.restart_button.grid(row=6, column=2, pady=5)
+
+        # 确保列1和列2能够扩展填充额外空间
+        frame.grid_columnconfigure(1, weight=1)
+
+        self.log_frame = tk.Frame(frame)  # 创建一个容纳日志框和滚动条的框架
+        self.log_frame.grid(row=5, column=0, columnspan=4, sticky='we', padx=5, pady=5)
+
+        self.log_view = LogView(self.log_frame, self.buffer_for(self.supervisor.name), view_lines=self.log_view_lines)
+        self.log_view.pack(expand=True, fill='both')
+        self.log_text = self.log_view.text
+
+        # 确保列能够扩展填充额外空间
+        frame.grid_columnconfigure(1, weight=1)
+        self.log_frame.grid_columnconfigure(0, weight=1)
+
+        tk.Label(frame, text="重启间隔（秒）:").grid(row=7, column=0, sticky='w')
+        self.restart_interval_entry = tk.Entry(frame, width=50)
+
+        self.restart_interval_entry.grid(row=7, column=1, sticky='w')
+
+        schedule_restart_button = tk.Button(frame, text="定时重启服务器", command=self.schedule_restart)
+        schedule_restart_button.grid(row=7, column=2, padx=5, pady=5)
+
+        self.auto_restart_checkbox = tk.Checkbutton(self.page1, text="崩溃时自动重启服务器",
+                                                    variable=self.auto_restart_var,
+                                                    command=self.toggle_auto_restart)
+        self.auto_restart_checkbox.grid(row=8, column=0, columnspan=3, pady=5)
+
+        self.init_resource_panel(frame)
+
+    def init_resource_panel(self, frame):
+        """CPU、内存、线程数和磁盘读写的迷你折线图"""
+        panel = tk.LabelFrame(frame, text="资源占用")
+        panel.grid(row=9, column=0, columnspan=4, sticky='we', padx=5, pady=5)
+        self.resource_labels = {}
+        self.resource_titles = {}
+        self.sparklines = {}
+        charts = (("cpu", "CPU", 'red'), ("rss", "内存", 'blue'), ("threads", "线程", 'darkgreen'),
+                  ("io", "磁盘读写/秒", 'purple'))
+        for column, (key, title, color) in enumerate(charts):
+            self.resource_titles[key] = title
+            self.resource_labels[key] = tk.Label(panel, text=f"{title}: -")
+            self.resource_labels[key].grid(row=0, column=column, sticky='w', padx=5)
+            self.sparklines[key] = Sparkline(panel, color=color)
+            self.sparklines[key].grid(row=1, column=column, padx=5, pady=2)
+        tk.Button(panel, text="导出CSV", command=self.export_resources).grid(row=1, column=len(charts), padx=5)
+        if self.manager.monitor is None or not self.manager.monitor.available:
+            self.resource_labels["cpu"].config(text="当前平台无法采样（需要 /proc 或 psutil）")
+
+    def update_resource_panel(self):
+        """用当前实例的采样序列重画折线图"""
+        monitor = self.manager.monitor
+        if monitor is None or not monitor.available:
+            return
+        series = monitor.series_for(self.supervisor.name)
+        io_rates = [r + w for r, w in zip(series.rates("read_bytes"), series.rates("write_bytes"))]
+        self.sparklines["cpu"].draw(series.values("cpu_percent"))
+        self.sparklines["rss"].draw(series.values("rss_bytes"))
+        self.sparklines["threads"].draw(series.values("threads"))
+        self.sparklines["io"].draw(io_rates)
+        sample = series.latest()
+        texts = {
+            "cpu": f"{sample.cpu_percent:.1f}%" if sample else "-",
+            "rss": format_bytes(sample.rss_bytes) if sample else "-",
+            "threads": str(sample.threads) if sample else "-",
+            "io": format_bytes(io_rates[-1]) if io_rates else "-",
+        }
+        for key, text in texts.items():
+            self.resource_labels[key].config(text=f"{self.resource_titles[key]}: {text}")
+
+    def export_resources(self):
+        """把当前实例的资源采样导出为 CSV"""
+        if self.manager.monitor is None:
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")],
+                                            initialfile=f"{self.supervisor.name}_resources.csv")
+        if not path:
+            return
+        try:
+            self.manager.monitor.export_csv(self.supervisor.name, path)
+            self.log_message(f"资源采样已导出到: {path}")
+        except OSError as e:
+            messagebox.showerror("导出错误", f"无法导出: {e}")
+
+    def init_page3(self, frame):
+        """所有服务器实例的状态列表"""
+        columns = ("status", "pid", "command")
+        self.instance_tree = ttk.Treeview(frame, columns=columns, height=15)
+        self.instance_tree.heading('#0', text="名称")
+        self.instance_tree.heading('status', text="状态")
+        self.instance_tree.heading('pid', text="PID")
+        self.instance_tree.heading('command', text="启动命令")
+        self.instance_tree.column('#0', width=120)
+        self.instance_tree.column('status', width=70)
+        self.instance_tree.column('pid', width=70)
+        self.instance_tree.column('command', width=380)
+        self.instance_tree.grid(row=0, column=0, columnspan=6, sticky='nsew', padx=5, pady=5)
+        self.instance_tree.bind('<Double-1>', lambda event: self.open_selected_instance())
+        for name in self.manager.names():
+            self.update_instance_row(name)
+
+        buttons = (("启动", lambda s: s.start()), ("停止", lambda s: s.stop()), ("重启", lambda s: s.restart()))
+        for column, (text, action) in enumerate(buttons):
+            tk.Button(frame, text=text, command=lambda a=action: self.on_selected_instances(a)).grid(
+                row=1, column=column, padx=5, pady=5)
+        tk.Button(frame, text="控制", command=self.open_selected_instance).grid(row=1, column=3, padx=5, pady=5)
+        tk.Button(frame, text="添加实例", command=self.add_instance).grid(row=1, column=4, padx=5, pady=5)
+        tk.Button(frame, text="删除实例", command=self.remove_instance).grid(row=1, column=5, padx=5, pady=5)
+        frame.grid_columnconfigure(0, weight=1)
+
+    def init_page4(self, frame):
+        """所有实例的定时任务列表"""
+        columns = ("instance", "trigger", "next_run", "last_run")
+        self.job_tree = ttk.Treeview(frame, columns=columns, height=15)
+        self.job_tree.heading('#0', text="编号")
+        self.job_tree.heading('instance', text="实例")
+        self.job_tree.heading('trigger', text="触发方式")
+        self.job_tree.heading('next_run', text="下次执行")
+        self.job_tree.heading('last_run', text="上次执行")
+        self.job_tree.column('#0', width=80)
+        self.job_tree.column('instance', width=100)
+        self.job_tree.column('trigger', width=180)
+        self.job_tree.column('next_run', width=140)
+        self.job_tree.column('last_run', width=140)
+        self.job_tree.grid(row=0, column=0, columnspan=6, sticky='nsew', padx=5, pady=5)
+
+        self.job_instance_var = tk.StringVar(value=self.instance_var.get())
+        self.job_trigger_var = tk.StringVar(value="daily")
+        self.job_action_var = tk.StringVar(value=ACTION_NAMES["restart"])
+        self.job_instance_combobox = ttk.Combobox(frame, textvariable=self.job_instance_var, state='readonly',
+                                                  values=self.manager.names(), width=12)
+        self.job_instance_combobox.grid(row=1, column=0, padx=5, pady=5)
+        ttk.Combobox(frame, textvariable=self.job_trigger_var, state='readonly', values=TRIGGERS[:3],
+                     width=10).grid(row=1, column=1, padx=5, pady=5)
+        self.job_spec_entry = tk.Entry(frame, width=24)
+        self.job_spec_entry.insert(0, "04:00-05:00")
+        self.job_spec_entry.grid(row=1, column=2, sticky='we', padx=5, pady=5)
+        ttk.Combobox(frame, textvariable=self.job_action_var, state='readonly',
+                     values=[ACTION_NAMES[action] for action in ACTIONS], width=8).grid(row=1, column=3, padx=5, pady=5)
+        tk.Button(frame, text="添加任务", command=self.add_job).grid(row=1, column=4, padx=5, pady=5)
+        tk.Button(frame, text="取消任务", command=self.cancel_jobs).grid(row=1, column=5, padx=5, pady=5)
+        tk.Label(frame, text="cron: 0 4 * * *    daily: 04:00 或 04:00-05:00    interval: 秒数",
+                 fg="gray").grid(row=2, column=0, columnspan=6, sticky='w', padx=5)
+        frame.grid_columnconfigure(2, weight=1)
+        self.refresh_jobs()
+
+    def refresh_jobs(self):
+        """按下次执行时间重建任务列表"""
+        if self.manager.scheduler is None:
+            return
+        self.job_tree.delete(*self.job_tree.get_children())
+        for job in self.manager.scheduler.list_jobs():
+            self.job_tree.insert('', tk.END, iid=job.id, text=job.id, values=(
+                job.instance, job.describe(), format_time(job.next_run), format_time(job.last_run)))
+
+    def add_job(self):
+        if self.manager.scheduler is None:
+            return
+        try:
+            action = next(a for a in ACTIONS if ACTION_NAMES[a] == self.job_action_var.get())
+            self.manager.scheduler.add(self.job_instance_var.get(), self.job_trigger_var.get(),
+                                       self.job_spec_entry.get(), action)
+        except (ValueError, OSError) as e:
+            messagebox.showerror("错误", f"无法添加定时任务: {e}")
+
+    def cancel_jobs(self):
+        for job_id in self.job_tree.selection():
+            self.manager.scheduler.cancel(job_id)
+
+    def init_page5(self, frame):
+        """当前选中实例的存档备份列表"""
+        columns = ("instance", "created", "reason", "files", "size")
+        self.backup_tree = ttk.Treeview(frame, columns=columns, height=15)
+        self.backup_tree.heading('#0', text="编号")
+        self.backup_tree.heading('instance', text="实例")
+        self.backup_tree.heading('created', text="时间")
+        self.backup_tree.heading('reason', text="原因")
+        self.backup_tree.heading('files', text="文件数")
+        self.backup_tree.heading('size', text="大小")
+        self.backup_tree.column('#0', width=150)
+        self.backup_tree.column('instance', width=100)
+        self.backup_tree.column('created', width=140)
+        self.backup_tree.column('reason', width=70)
+        self.backup_tree.column('files', width=60)
+        self.backup_tree.column('size', width=80)
+        self.backup_tree.grid(row=0, column=0, columnspan=4, sticky='nsew', padx=5, pady=5)
+        tk.Button(frame, text="立即备份", command=self.backup_now).grid(row=1, column=0, padx=5, pady=5)
+        tk.Button(frame, text="恢复所选备份", command=self.restore_backup).grid(row=1, column=1, padx=5, pady=5)
+        tk.Button(frame, text="刷新", command=self.refresh_backups).grid(row=1, column=2, padx=5, pady=5)
+        self.backup_status_label = tk.Label(frame, text="", fg="gray")
+        self.backup_status_label.grid(row=2, column=0, columnspan=4, sticky='w', padx=5)
+        frame.grid_columnconfigure(3, weight=1)
+        self.refresh_backups()
+
+    def refresh_backups(self):
+        """读取清单在工作线程中进行，完成后通过事件队列回到界面线程更新列表"""
+        if self.manager.backups is None:
+            self.backup_status_label.config(text="没有启用备份")
+            return
+        backups = self.manager.backups
+        name = self.supervisor.name
+        if name not in backups.policies:
+            self.backup_status_label.config(text=f"实例 {name} 没有设置存档目录 save_dir")
+        else:
+            self.backup_status_label.config(text=f"存档目录: {backups.policies[name].save_dir}")
+        future = get_worker_pool().submit(backups.store.list, name)
+        future.add_done_callback(lambda f: self.manager.events.put((name, "backup_list", f)))
+
+    def show_backups(self, future):
+        if future.exception() is not None:
+            self.backup_status_label.config(text=f"无法读取备份: {future.exception()}")
+            return
+        self.backup_tree.delete(*self.backup_tree.get_children())
+        for snapshot in future.result():
+            self.backup_tree.insert('', tk.END, iid=snapshot.id, text=snapshot.id, values=(
+                snapshot.instance, format_time(snapshot.created), snapshot.reason, len(snapshot.files),
+                format_bytes(snapshot.size)))
+
+    def backup_now(self):
+        if self.manager.backups is None:
+            return
+        try:
+            self.manager.backups.backup(self.supervisor.name, "manual")
+        except Exception as e:
+            messagebox.showerror("错误", str(e))
+            return
+        self.backup_status_label.config(text="正在备份...")
+
+    def restore_backup(self):
+        selection = self.backup_tree.selection()
+        if self.manager.backups is None or not selection:
+            return
+        snapshot_id = selection[0]
+        name = self.supervisor.name
+        if not messagebox.askyesno("恢复存档", f"把实例 {name} 的存档恢复到备份 {snapshot_id}？\n当前存档会改名保留。"):
+            return
+        future = get_worker_pool().submit(self.manager.backups.restore, name, snapshot_id)
+        future.add_done_callback(lambda f: self.manager.events.put((name, "restored", f)))
+        self.backup_status_label.config(text="正在恢复...")
+
+    def on_restored(self, future):
+        if future.exception() is not None:
+            self.backup_status_label.config(text="")
+            messagebox.showerror("恢复失败", str(future.exception()))
+
+    def update_instance_row(self, name):
+        supervisor = self.manager.get(name)
+        server = supervisor.server
+        values = (supervisor.status, server.pid or "-", server.last_command or server.full_command() or "")
+        if self.instance_tree.exists(name):
+            self.instance_tree.item(name, values=values)
+        else:
+            self.instance_tree.insert('', tk.END, iid=name, text=name, values=values)
+
+    def selected_instances(self):
+        return [name for name in self.instance_tree.selection() if name in self.manager.instances]
+
+    def on_selected_instances(self, action):
+        for name in self.selected_instances():
+            action(self.manager.get(name))
+
+    def open_selected_instance(self):
+        """在服务器控制页中打开选中的实例"""
+        names = self.selected_instances()
+        if names:
+            self.switch_instance(names[0])
+            self.show_frame(self.page1)
+
+    def add_instance(self):
+        name = simpledialog.askstring("添加实例", "实例名称:", parent=self.root)
+        if not name:
+            return
+        try:
+            self.manager.add(name.strip())
+        except Exception as e:
+            messagebox.showerror("错误", str(e))
+
+    def remove_instance(self):
+        names = self.selected_instances()
+        if len(names) >= len(self.manager.names()):
+            messagebox.showerror("错误", "至少需要保留一个实例")
+            return
+        if names and messagebox.askyesno("删除实例", f"确定删除 {', '.join(names)} 吗？运行中的服务器会被停止。"):
+            for name in names:
+                self.manager.remove(name)
+
+    def switch_instance(self, name):
+        """让服务器控制页操作另一个实例"""
+        self.supervisor = self.manager.get(name)
+        self.server = self.supervisor.server
+        self.instance_var.set(name)
+        if self.server.start_command:
+            self.set_filepath(self.server.start_command)
+        else:
+            self.clear_filepath()
+        self.start_parameters_entry.delete(0, tk.END)
+        self.start_parameters_entry.insert(0, self.server.start_args)
+        self.auto_restart_var.set(int(self.supervisor.auto_restart))
+        self.server_status = self.supervisor.status
+        if self.server_status == "运行中":
+            self.update_ui_on_server_start()
+        else:
+            self.update_ui_on_server_stop()
+        self.log_view.set_buffer(self.buffer_for(name))
+        self.update_resource_panel()
+        self.refresh_backups()
+
+    def buffer_for(self, name):
+        if name not in self.log_buffers:
+            self.log_buffers[name] = LogBuffer(self.log_capacity, self.log_sink, f"[{name}] ")
+        return self.log_buffers[name]
+
+    def refresh_instance_list(self):
+        names = self.manager.names()
+        self.instance_combobox.config(values=names)
+        self.job_instance_combobox.config(values=names)
+        for name in self.instance_tree.get_children():
+            if name not in names:
+                self.instance_tree.delete(name)
+        for name in names:
+            self.update_instance_row(name)
+        if self.supervisor.name not in names:
+            self.switch_instance(names[0])
+
+    def init_page2(self, frame):
+        tk.Label(frame, text="服务器配置文件:").grid(row=0, column=0, sticky='w', pady=5)
+        self.config_file_entry = tk.Entry(frame, width=50, state='readonly')
+        self.config_file_entry.grid(row=0, column=1, sticky='we', pady=5)
+        self.choose_config_button = tk.Button(frame, text="...", command=self.choose_config)
+        self.choose_config_button.grid(row=0, column=2, padx=5, pady=5)
+
+        self.read_config_button = tk.Button(frame, text="读取文件", command=self.read_config)
+        self.read_config_button.grid(row=0, column=3, padx=5, pady=5)
+
+        tk.Label(frame, text="参数长度>=(默认3):").grid(row=1, column=0, sticky='w', pady=2)
+
+        self.complex_value_param_entry = tk.Entry(frame, width=20)
+        self.complex_value_param_entry.grid(row=1, column=1, padx=5, pady=8)
+
+        self.config_status_label = tk.Label(frame, text="")
+        self.config_status_label.grid(row=2, column=0, columnspan=2, sticky='w', pady=2)
+        tk.Button(frame, text="校验结果", command=self.show_config_issues).grid(row=2, column=2, padx=5)
+        tk.Button(frame, text="与默认值比较", command=self.show_default_diff).grid(row=2, column=3, padx=5)
+
+        self.set_complex_param_button = tk.Button(frame, text="确定", command=self.set_complex_value_param)
+        self.set_complex_param_button.grid(row=1, column=2, padx=5, pady=8)
+
+        self.clear_layout_button = tk.Button(frame, text="清除布局", command=self.clear_dynamic_widgets)
+        self.clear_layout_button.grid(row=1, column=3, padx=5, pady=8)
+
+        self.save_config_button = tk.Button(frame, text="保存配置", command=self.save_config_to_file)
+        self.save_config_button.grid(row=3, column=3, padx=5, pady=5)
+
+        tk.Label(frame, text="搜索:").grid(row=3, column=0, sticky='w', pady=2)
+        self.config_search_entry = tk.Entry(frame, textvariable=self.config_search_var, width=50)
+        self.config_search_entry.grid(row=3, column=1, sticky='we', pady=2)
+        self.config_search_var.trace_add('write', lambda *args: self.schedule_config_search())
+        search_options = tk.Frame(frame)
+        search_options.grid(row=3, column=2, sticky='w')
+        tk.Checkbutton(search_options, text="正则", variable=self.config_regex_var,
+                       command=self.schedule_config_search).pack(side=tk.LEFT)
+        self.config_search_label = tk.Label(search_options, text="")
+        self.config_search_label.pack(side=tk.LEFT, padx=5)
+
+        self.config_list = ConfigListView(frame, is_complex=self.is_complex_value, on_open=self.open_config_value,
+                                          on_set=self.set_config_value, severity=self.config_severity)
+        self.config_list.grid(row=4, column=0, columnspan=4, sticky='we', padx=5, pady=5)
+
+        # 确保列1和列2能够扩展填充额外空间
+        frame.grid_columnconfigure(0, weight=0)  # 第0列不自动缩放
+        frame.grid_columnconfigure(1, weight=1)  # 第1列不自动缩放
+
+    def save_config_to_file(self):
+        config_path = self.config_file_entry.get()
+        if not config_path:
+            messagebox.showerror("错误", "未指定配置文件路径")
+            return
+
+        # 输入框中的修改已经实时记录在配置对象中，只有值变化的键会被写回
+        errors = self.config_errors()
+        if errors:
+            listed = "\n".join(str(issue) for issue in errors[:10])
+            more = f"\n……共 {len(errors)} 个错误" if len(errors) > 10 else ""
+            messagebox.showerror("无法保存", f"以下值会导致服务器无法读取配置，请先修正:\n{listed}{more}")
+            return
+
+        if config_path == self.config.path and self.config.changed_on_disk():
+            if not messagebox.askyesno("配置冲突", "配置文件在读取后被服务器或其他程序修改过，是否仍然保存？\n"
+                                                   "（选择“否”会先合并文件中的改动）"):
+                self.reload_config(os.path.abspath(config_path))
+                return
+
+        # 将配置写入文件
+        try:
+            if not self.config.modified and config_path == self.config.path:
+                self.log_message("配置没有修改。")
+                return
+            changed = len(self.config.changes) + len(self.config.additions)
+            self.save_config(config_path)
+            self.log_message(f"配置已保存到: {config_path}（修改了 {changed} 项）")
+        except Exception as e:
+            messagebox.showerror("保存错误", f"无法保存配置: {str(e)}")
+            self.log_message(f"保存配置错误: {str(e)}")
+
+    def log_message(self, message, name=None):
+        """ 在日志框中显示带时间戳的消息，name 为空时记录到当前实例 """
+        formatted_message = format_log_line(message)
+        self.append_log_lines(name or self.supervisor.name, formatted_message.splitlines())
+
+    def append_log_lines(self, name, lines):
+        """当前实例的日志直接显示，其他实例的日志只写入各自的缓冲区"""
+        if name == self.supervisor.name:
+            self.log_view.append(lines)
+        else:
+            self.buffer_for(name).extend(lines)
+        self.manager.publish_output(name, lines)
+
+    def drain_server_output(self):
+        """定时从各实例的输出队列中批量取出服务器输出写入日志，并处理监控事件"""
+        self.handle_supervisor_events()
+        for supervisor in self.manager.supervisors():
+            lines, dropped = supervisor.server.output.drain(self.OUTPUT_BATCH_SIZE)
+            if dropped:
+                lines.insert(0, f"... 输出过多，已丢弃 {dropped} 行 ...")
+            if lines:
+                self.append_log_lines(supervisor.name, lines)
+        self.root.after(self.OUTPUT_POLL_INTERVAL, self.drain_server_output)
+
+    def choose_exe(self):
+        """打开文件选择对话框以选择可执行文件"""
+        filepath = filedialog.askopenfilename(filetypes=[("Executable files", "*.exe")])
+        if filepath:
+            self.set_filepath(filepath)
+
+    def set_filepath(self, filepath):
+        self.filepath_entry.config(state='normal')
+        self.filepath_entry.delete(0, tk.END)
+        self.filepath_entry.insert(0, filepath)
+        self.filepath_entry.config(state='readonly')
+        self.server.start_command = filepath  # 更新服务器的启动命令
+        self.start_button.config(state=tk.NORMAL)  # 启动按钮现在可用
+
+    def choose_config(self):
+        """打开文件选择对话框以选择配置文件"""
+        config_path = filedialog.askopenfilename(filetypes=[("Config Files", "*.ini")])
+        if config_path:
+            self.config_file_entry.config(state='normal')  # 设置为可编辑状态
+            self.config_file_entry.delete(0, tk.END)  # 清除当前内容
+            self.config_file_entry.insert(0, config_path)  # 插入新选择的路径
+            self.config_file_entry.config(state='readonly')  # 设置回只读状态
+
+    def search_in_text(self):
+        """在文本框中搜索用户输入的字符串，并跳转到第一个匹配项"""
+        self.text.tag_remove('found', '1.0', tk.END)
+        search_query = self.search_entry.get()
+
+        if search_query:
+            idx = '1.0'
+            self.search_index, lastidx = self.find_next(search_query, idx)
+            if self.search_index:
+                self.text.tag_add('found', self.search_index, lastidx)
+                self.text.tag_config('found', foreground='blue')
+                self.text.see(self.search_index)  # 跳转到第一个匹配项
+            else:
+                messagebox.showinfo("搜索", "找不到匹配项")
+
+    def find_next(self, search_query, start_idx):
+        """在文本框中查找下一个匹配项，并返回其索引"""
+        idx = self.text.search(search_query, start_idx, nocase=1, stopindex=tk.END)
+        if idx:
+            lastidx = f"{idx}+{len(search_query)}c"
+            return idx, lastidx
+        return None, None
+
+    def goto_next_search_result(self):
+        """跳转到下一个搜索结果"""
+        search_query = self.search_entry.get()
+        if search_query and self.search_index:
+            self.search_index, lastidx = self.find_next(search_query, self.search_index)
+            if self.search_index:
+                self.text.tag_remove('found', '1.0', tk.END)
+                self.text.tag_add('found', self.search_index, lastidx)
+                self.text.see(self.search_index)
+            else:
+                messagebox.showinfo("搜索", "没有更多匹配项")
+
+    def read_config(self):
+        """读取并显示配置文件的参数"""
+        config_path = self.config_file_entry.get()
+        if not config_path:
+            messagebox.showerror("错误", "没有选择配置文件")
+            return
+
+        # 读取配置文件
+        try:
+            self.load_config(config_path)
+        except OSError as e:
+            messagebox.showerror("错误", f"无法读取配置文件: {e}")
+            return
+
+        # 列表只为可见的行创建控件
+        self.config_issues = {}
+        for issue in self.schema.validate_document(self.config):
+            self.config_issues.setdefault((issue.section, issue.key), []).append(issue)
+        self.update_config_status()
+        self.config_list.set_document(self.config)
+        self.config_index = ConfigIndex.build(self.config)
+        self.run_config_search()
+        self.watch_config(config_path)
+
+        # 更新日志
+        self.log_message(f"读取配置文件: {config_path}")
+
+    def set_complex_value_param(self):
+        """设置用于判断复杂值的参数"""
+        try:
+            param = int(self.complex_value_param_entry.get())
+            # 定义参数的下限和上限
+            MIN_PARAM = 1
+            MAX_PARAM = 99
+            if MIN_PARAM <= param <= MAX_PARAM:
+                # 在此处更新 is_complex_value 方法使用的参数
+                self.complex_value_param = param
+                self.config_list.refresh()
+                self.log_message(f"设置复杂值参数为: {param}")
+            else:
+                raise ValueError(f"参数必须在 {MIN_PARAM} 和 {MAX_PARAM} 之间")
+        except ValueError as e:
+            messagebox.showerror("错误", str(e))
+
+    def is_complex_value(self, value):
+        """判断配置值是否复杂，无法直接识别分割"""
+        # 使用 self.complex_value_param 作为判断条件
+        return len(value.split()) >= self.complex_value_param
+
+    def clear_dynamic_widgets(self):
+        """清空配置项列表"""
+        self.config_list.clear()
+        self.config_index = ConfigIndex()
+        self.config_issues = {}
+        self.config_status_label.config(text="")
+
+    def watch_config(self, config_path):
+        """监视当前配置文件，其他程序修改后把改动合并进已加载的配置"""
+        watcher = self.manager.watcher
+        if watcher is None:
+            return
+        if self.config_watch is not None:
+            watcher.unwatch(self.config_watch)
+        self.config_watch = watcher.watch(
+            config_path, lambda path: self.manager.events.put((None, "config_changed", path)))
+
+    def reload_config(self, path):
+        """合并外部修改：只更新变化的键的索引和列表行，本地未保存的修改保留并提示冲突"""
+        if self.config.path is None or os.path.abspath(self.config.path) != path:
+            return
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            self.log_message(f"无法重新读取配置文件: {e}")
+            return
+        changed, conflicts = self.config.merge(data)
+        if not changed:
+            return
+        for section, key in changed:
+            value = self.config.get(section, key)
+            if value is None:
+                self.config_index.remove(section, key)
+            else:
+                self.config_index.update(section, key, value)
+            self.validate_config_key(section, key)
+        self.config_list.reload()
+        self.run_config_search()
+        self.log_message(f"配置文件被其他程序修改，已更新 {len(changed)} 项: {path}")
+        if conflicts:
+            names = ", ".join(f"{section}.{key}" for section, key in conflicts)
+            messagebox.showwarning("配置冲突", f"以下项在文件中被其他程序修改，同时在这里也有未保存的修改:\n{names}\n"
+                                               "保存时将使用这里的值。")
+
+    def set_config_value(self, section, key, value):
+        """记录一个键的修改，更新搜索索引并重新校验这个键"""
+        self.config.set(section, key, value)
+        self.config_index.update(section, key, value)
+        self.validate_config_key(section, key)
+
+    def validate_config_key(self, section, key):
+        """只运行被修改的键的校验函数"""
+        value = self.config.get(section, key)
+        issues = self.schema.validate(section, key, value) if value is not None else []
+        had_issues = (section, key) in self.config_issues
+        if issues:
+            self.config_issues[(section, key)] = issues
+        else:
+            self.config_issues.pop((section, key), None)
+        if issues or had_issues:
+            self.update_config_status()
+            self.config_list.render()
+        return issues
+
+    def config_severity(self, section, key):
+        severities = {issue.severity for issue in self.config_issues.get((section, key), ())}
+        return "error" if "error" in severities else ("warning" if severities else None)
+
+    def config_errors(self):
+        return [issue for issues in self.config_issues.values() for issue in issues if issue.severity == "error"]
+
+    def update_config_status(self):
+        issues = [issue for issues in self.config_issues.values() for issue in issues]
+        errors = sum(1 for issue in issues if issue.severity == "error")
+        if not issues:
+            self.config_status_label.config(text="校验通过" if self.config.path else "", fg='darkgreen')
+        else:
+            self.config_status_label.config(text=f"{errors} 个错误，{len(issues) - errors} 个警告",
+                                            fg='red' if errors else 'darkorange')
+
+    def show_config_issues(self):
+        issues = [issue for issues in self.config_issues.values() for issue in issues]
+        self.show_table("校验结果", ("级别", "项", "说明"),
+                        [("错误" if i.severity == "error" else "警告", i.name, i.message) for i in issues])
+
+    def show_default_diff(self):
+        """只列出与默认值不同的项"""
+        rows = self.schema.diff_defaults(self.config)
+        self.show_table("与默认值不同的项", ("项", "当前值", "默认值"),
+                        [(name, display_raw(current), display_raw(default)) for name, current, default in rows])
+
+    def show_table(self, title, headings, rows):
+        window = tk.Toplevel(self.root)
+        window.title(f"{title}（{len(rows)}）")
+        tree = ttk.Treeview(window, columns=headings[1:], height=20)
+        tree.heading('#0', text=headings[0])
+        for column in headings[1:]:
+            tree.heading(column, text=column)
+        for row in rows:
+            tree.insert('', tk.END, text=row[0], values=row[1:])
+        scrollbar = tk.Scrollbar(window, command=tree.yview)
+        tree.config(yscrollcommand=scrollbar.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    def schedule_config_search(self):
+        """输入时延迟一小段时间再搜索，连续输入只搜索一次"""
+        if self.config_search_job is not None:
+            self.root.after_cancel(self.config_search_job)
+        self.config_search_job = self.root.after(150, self.run_config_search)
+
+    def run_config_search(self):
+        self.config_search_job = None
+        query = self.config_search_var.get()
+        if not query:
+            self.config_list.set_filter(None)
+            self.config_search_label.config(text="")
+            return
+        try:
+            matches = self.config_index.search(query, regex=bool(self.config_regex_var.get()))
+        except re.error as e:
+            self.config_search_label.config(text=f"正则错误: {e}")
+            return
+        self.config_list.set_filter(matches)
+        self.config_search_label.config(text=f"{len(matches)} 条结果")
+
+    def open_config_value(self, section, key, kind, subkey=None):
+        """在单独的窗口中编辑元组值（表格）或较长的值（带搜索的文本框）"""
+        window = tk.Toplevel(self.root)
+        window.title(f"{section}.{key}")
+        value = self.config.get(section, key, "")
+        if kind == "tuple":
+            try:
+                tuple_value = TupleValue(value)
+            except ValueError as e:
+                self.log_message(f"{section}.{key} 无法按元组解析，按文本编辑: {e}")
+            else:
+                def on_change(field):
+                    text = tuple_value.serialize()
+                    self.config.set(section, key, text)
+                    self.config_index.update_field(section, key, field.key, field.display, text)
+                    editor.mark_issues(self.validate_config_key(section, key))
+                    self.config_list.render()
+
+                editor = TupleEditor(window, tuple_value, height=20, on_change=on_change)
+                editor.pack(fill=tk.BOTH, expand=True)
+                editor.mark_issues(self.config_issues.get((section, key), ()))
+                if subkey is not None:
+                    editor.select(subkey)
+                return
+
+        search_frame = tk.Frame(window)
+        search_frame.pack(side=tk.TOP, fill=tk.X)
+        self.search_entry = tk.Entry(search_frame)
+        self.search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5, pady=5)
+        tk.Button(search_frame, text="搜索", command=self.search_in_text).pack(side=tk.LEFT, padx=5)
+        tk.Button(search_frame, text="下一个", command=self.goto_next_search_result).pack(side=tk.LEFT, padx=5)
+
+        self.text = tkst.ScrolledText(window, height=15, width=70, wrap=tk.WORD)
+        self.text.pack(fill=tk.BOTH, expand=True)
+        self.text.insert('1.0', value)
+
+        def apply():
+            self.set_config_value(section, key, self.text.get('1.0', 'end-1c').replace("\n", ""))  # INI 的值只能有一行
+            self.config_list.render()
+            window.destroy()
+
+        tk.Button(window, text="确定", command=apply).pack(side=tk.BOTTOM, pady=5)
+
+    def clear_filepath(self):
+        self.filepath_entry.config(state='normal')  # 设置文本框为可编辑状态
+        self.filepath_entry.delete(0, tk.END)
+        self.filepath_entry.config(state='readonly')
+        self.server.start_command = None  # 清除服务器启动命令
+        self.start_button.config(state=tk.DISABLED)  # 禁用启动服务器按钮
+
+    def start_server(self):
+        self.server.start_args = self.start_parameters_entry.get()
+        self.supervisor.start(self.server.full_command())
+
+    def update_ui_on_server_start(self):
+        """更新 UI 以反映服务器启动状态"""
+        self.status_label.config(text=f"服务器状态: {self.server_status}")
+        self.stop_button.config(state=tk.NORMAL)
+        self.restart_button.config(state=tk.NORMAL)
+
+    def update_ui_on_server_stop(self):
+        """更新 UI 以反映服务器停止状态；等待自动重启时仍可以停止（取消重启）"""
+        text = f"服务器状态: {self.server_status}"
+        if self.server_status == "熔断":
+            text += "（崩溃过于频繁，已停止自动重启，手动启动后恢复）"
+        self.status_label.config(text=text)
+        self.stop_button.config(state=tk.NORMAL if self.server_status == "等待重启" else tk.DISABLED)
+        self.restart_button.config(state=tk.DISABLED)
+
+    def handle_supervisor_events(self):
+        """在界面线程中处理监控器发出的日志和状态事件"""
+        while True:
+            try:
+                name, kind, data = self.manager.events.get_nowait()
+            except queue.Empty:
+                return
+            if kind == "all_stopped":
+                self.finish_close()
+            elif kind in ("added", "removed"):
+                self.refresh_instance_list()
+            elif kind == "jobs":
+                self.refresh_jobs()
+            elif kind == "backups":
+                if name == self.supervisor.name:
+                    self.refresh_backups()
+            elif kind == "backup_list":
+                if name == self.supervisor.name:  # 读取期间可能已切换到其他实例
+                    self.show_backups(data)
+            elif kind == "restored":
+                self.on_restored(data)
+            elif kind == "config_changed":
+                self.reload_config(data)
+            elif name is None and kind == "log":
+                self.log_message(data)
+            elif name not in self.manager.instances:
+                continue  # 实例已被删除
+            elif kind == "log":
+                self.log_message(data, name)
+            elif kind == "error":
+                message, trace = data
+                self.log_message(message, name)
+                self.log_error(f"[{name}] {message}", trace)
+            elif kind == "resources":
+                if name == self.supervisor.name:
+                    self.update_resource_panel()
+            elif kind == "status":
+                self.update_instance_row(name)
+                if name == self.supervisor.name:
+                    self.server_status = data
+                    if data == "运行中":
+                        self.update_ui_on_server_start()
+                    else:
+                        self.update_ui_on_server_stop()
+
+    def stop_server(self):
+        self.supervisor.stop()
+
+    def restart_server(self):
+        self.supervisor.restart()
+
+    def schedule_restart(self):
+        """添加一个一次性的定时重启任务，可在定时任务页中查看和取消"""
+        try:
+            interval = int(self.restart_interval_entry.get())
+        except ValueError:
+            self.log_message("错误: 请输入有效的秒数。")
+            return
+        if self.manager.scheduler is None:
+            self.supervisor.schedule_restart(interval)
+        else:
+            self.manager.scheduler.add(self.supervisor.name, "once", time.time() + interval)
+
+    def toggle_auto_restart(self):
+        self.supervisor.auto_restart = self.auto_restart_var.get() == 1
+
+    def log_error(self, error, trace=None):
+        """记录错误信息到日志文件"""
+        lines = [format_log_line(f"Error: {error}")]
+        if trace is None and sys.exc_info()[0] is not None:
+            trace = traceback.format_exc()
+        if trace and trace.strip() != "NoneType: None":
+            lines.extend(trace.rstrip("\n").splitlines())  # 记录错误的堆栈跟踪
+        self.log_sink.write_lines(lines)
+
+    def on_close(self):
+        """关闭窗口：可选择先按停止流程关闭所有服务器，再把剩余日志写入磁盘"""
+        running = [s.name for s in self.manager.supervisors() if s.is_active()]
+        if running:
+            answer = messagebox.askyesnocancel("退出", f"{', '.join(running)} 仍在运行，是否先停止服务器再退出？")
+            if answer is None:
+                return
+            if answer:
+                if self.manager.scheduler is not None:
+                    self.manager.scheduler.stop()  # 停止过程中不再触发定时重启
+                self.status_label.config(text="服务器状态: 正在停止所有服务器...")
+                self.manager.stop_all(on_done=lambda: self.manager.events.put((None, "all_stopped", None)))
+                return  # 全部停止后由 handle_supervisor_events 调用 finish_close
+        self.finish_close()
+
+    def finish_close(self):
+        self.log_sink.close()
+        self.root.destroy()
@@ -0,0 +1,220 @@
+"""健康检查策略：内存超限、长时间无输出或端口无响应时主动重启服务器
+
+每个实例可以配置一个 HealthPolicy。条件触发后先进入预警阶段（记录日志，
+warning_period 秒后再次确认），确认仍然异常才通过监控器重启服务器；
+每次决定都会连同触发它的指标一起记录。
+"""
+import socket
+import time
+
+from pltool_core import get_worker_pool
+
+
+class HealthPolicy:
+    """单个实例的健康检查参数，值为 0 表示关闭对应的检查"""
+
+    def __init__(self, max_rss_gb=0.0, rss_samples=3, output_timeout=0, probe_port=0, probe_protocol="tcp",
+                 probe_host="127.0.0.1", probe_timeout=0, probe_interval=10, probe_payload=b"",
+                 warning_period=60, startup_grace=120):
+        self.max_rss_gb = max_rss_gb  # 内存（RSS）上限，单位 GB
+        self.rss_samples = rss_samples  # 连续多少次采样超过上限才触发
+        self.output_timeout = output_timeout  # 多少秒没有 stdout 输出视为卡死
+        self.probe_port = probe_port  # 探测端口，0 为不探测
+        self.probe_protocol = probe_protocol  # tcp 或 udp
+        self.probe_host = probe_host
+        self.probe_timeout = probe_timeout  # 端口连续多少秒没有响应视为卡死
+        self.probe_interval = probe_interval  # 探测间隔（秒）
+        self.probe_payload = probe_payload  # UDP 探测时发送的数据
+        self.warning_period = warning_period  # 预警阶段长度（秒）
+        self.startup_grace = startup_grace  # 启动后多少秒内不做无输出/端口检查
+
+    @property
+    def enabled(self):
+        return bool(self.max_rss_gb or self.output_timeout or (self.probe_port and self.probe_timeout))
+
+    @classmethod
+    def from_section(cls, section):
+        """从工具配置文件的 [server:名称] 小节读取"""
+        return cls(max_rss_gb=section.getfloat("max_rss_gb", fallback=0.0),
+                   rss_samples=section.getint("rss_samples", fallback=3),
+                   output_timeout=section.getfloat("output_timeout", fallback=0),
+                   probe_port=section.getint("probe_port", fallback=0),
+                   probe_protocol=section.get("probe_protocol", fallback="tcp").lower(),
+                   probe_host=section.get("probe_host", fallback="127.0.0.1"),
+                   probe_timeout=section.getfloat("probe_timeout", fallback=0),
+                   probe_interval=section.getfloat("probe_interval", fallback=10),
+                   probe_payload=section.get("probe_payload", fallback="").encode("utf-8"),
+                   warning_period=section.getfloat("warning_period", fallback=60),
+                   startup_grace=section.getfloat("startup_grace", fallback=120))
+
+
+def probe_port(policy, timeout=3.0):
+    """探测端口，有响应返回 True
+
+    TCP 以能否建立连接为准；UDP 发送 probe_payload 后等待任意回复，
+    收到 ICMP 端口不可达或超时都视为无响应。
+    """
+    if policy.probe_protocol == "udp":
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(timeout)
+            try:
+                sock.connect((policy.probe_host, policy.probe_port))
+                sock.send(policy.probe_payload)
+                sock.recv(2048)
+                return True
+            except OSError:
+                return False
+    try:
+        with socket.create_connection((policy.probe_host, policy.probe_port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class HealthState:
+    """一个实例当前进程的健康检查状态，进程变化时重建"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.started = time.monotonic()
+        self.rss_over = 0  # 连续超过内存上限的采样次数
+        self.last_rss = 0
+        self.last_probe_ok = self.started
+        self.next_probe = self.started
+        self.probing = False
+        self.warning = None  # 预警中的 (原因, TimerHandle)
+
+
+class HealthMonitor:
+    """在共用的事件循环中执行所有实例的健康检查策略，端口探测放在共用的工作线程池中"""
+
+    CHECK_INTERVAL = 1.0  # 检查无输出和端口状态的间隔（秒）
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.policies = {}  # 实例名 -> HealthPolicy
+        self.states = {}  # 实例名 -> HealthState
+        self.handle = None
+        if manager.monitor is not None:
+            manager.monitor.listeners.append(self.on_sample)
+
+    def set_policy(self, name, policy):
+        if policy is None or not policy.enabled:
+            self.policies.pop(name, None)
+        else:
+            self.policies[name] = policy
+
+    def start(self):
+        if self.handle is None:
+            self.handle = self.manager.loop.call_later(self.CHECK_INTERVAL, self.tick)
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+    def state_for(self, name):
+        """返回当前进程的状态，服务器未运行时返回 None"""
+        pid = self.manager.get(name).server.pid if name in self.manager.instances else None
+        state = self.states.get(name)
+        if pid is None:
+            if state is not None:
+                self.cancel_warning(state)
+                del self.states[name]
+            return None
+        if state is None or state.pid != pid:
+            if state is not None:
+                self.cancel_warning(state)
+            state = self.states[name] = HealthState(pid)
+        return state
+
+    def on_sample(self, name, sample):
+        """ResourceMonitor 每次采样后在事件循环线程中调用"""
+        policy = self.policies.get(name)
+        if policy is None or not policy.max_rss_gb:
+            return
+        state = self.state_for(name)
+        if state is None:
+            return
+        state.last_rss = sample.rss_bytes
+        if sample.rss_bytes > policy.max_rss_gb * 1024 ** 3:
+            state.rss_over += 1
+            if state.rss_over >= policy.rss_samples:
+                self.warn(name, state, "memory",
+                          f"内存 {sample.rss_bytes / 1024 ** 3:.2f} GB 已连续 {state.rss_over} 次采样"
+                          f"超过上限 {policy.max_rss_gb} GB")
+        else:
+            state.rss_over = 0
+
+    def tick(self):
+        self.handle = self.manager.loop.call_later(self.CHECK_INTERVAL, self.tick)
+        now = time.monotonic()
+        for name, policy in list(self.policies.items()):
+            state = self.state_for(name)
+            if state is None or now - state.started < policy.startup_grace:
+                continue
+            server = self.manager.get(name).server
+            if policy.output_timeout:
+                silent = now - max(server.last_stdout or 0, state.started)
+                if silent >= policy.output_timeout:
+                    self.warn(name, state, "output", f"已有 {silent:.0f} 秒没有 stdout 输出")
+            if policy.probe_port and policy.probe_timeout:
+                if not state.probing and now >= state.next_probe:
+                    state.probing = True
+                    state.next_probe = now + policy.probe_interval
+                    future = get_worker_pool().submit(probe_port, policy)
+                    future.add_done_callback(
+                        lambda f, n=name, s=state: self.manager.loop.call_soon(self.on_probe_result, n, s, f))
+                unanswered = now - state.last_probe_ok
+                if unanswered >= policy.probe_timeout:
+                    self.warn(name, state, "probe",
+                              f"{policy.probe_protocol.upper()} 端口 {policy.probe_port} 已有 {unanswered:.0f} 秒没有响应")
+
+    def on_probe_result(self, name, state, future):
+        state.probing = False
+        if not future.exception() and future.result():
+            state.last_probe_ok = time.monotonic()
+
+    def condition_holds(self, name, state, reason):
+        """预警结束时重新确认触发条件"""
+        policy = self.policies.get(name)
+        if policy is None:
+            return False
+        now = time.monotonic()
+        if reason == "memory":
+            return state.rss_over >= policy.rss_samples
+        if reason == "output":
+            server = self.manager.get(name).server
+            return now - max(server.last_stdout or 0, state.started) >= policy.output_timeout
+        if reason == "probe":
+            return now - state.last_probe_ok >= policy.probe_timeout
+        return False
+
+    def warn(self, name, state, reason, detail):
+        """进入预警阶段；已在预警中时不重复触发"""
+        if state.warning is not None:
+            return
+        policy = self.policies[name]
+        supervisor = self.manager.get(name)
+        supervisor.log(f"健康检查预警: {detail}，{policy.warning_period:.0f} 秒后仍异常将重启服务器。")
+        self.manager.events.put((name, "health", (reason, detail)))
+        handle = self.manager.loop.call_later(policy.warning_period, self.confirm, name, state, reason, detail)
+        state.warning = (reason, handle)
+
+    def cancel_warning(self, state):
+        if state.warning is not None:
+            state.warning[1].cancel()
+            state.warning = None
+
+    def confirm(self, name, state, reason, detail):
+        state.warning = None
+        if self.states.get(name) is not state:
+            return  # 进程已经退出或被重启
+        if not self.condition_holds(name, state, reason):
+            self.manager.get(name).log("健康检查: 服务器已恢复正常，取消重启。")
+            return
+        supervisor = self.manager.get(name)
+        supervisor.log(f"健康检查: {detail}，正在重启服务器。")
+        self.manager.events.put((name, "health", ("restart", detail)))
+        del self.states[name]
+        supervisor.restart("health")
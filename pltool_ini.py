@@ -0,0 +1,294 @@
+"""无损的 INI 读写：记录每个键的值在原文件中的字节位置，保存时只替换改动过的值
+
+与 configparser 不同，这里不会改变键的大小写、注释、空行、换行符和键的顺序，
+未修改的字节原样写回；保存时先写临时文件再改名，避免写到一半时文件损坏。
+"""
+import bisect
+import os
+import shutil
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl
+    fcntl = None
+
+BOM = b"\xef\xbb\xbf"
+COMMENT_PREFIXES = (b";", b"#")
+
+
+class IniEntry:
+    """一个 key=value，start/end 是值在文件中的字节范围（不含行尾空白）"""
+
+    __slots__ = ("section", "key", "value", "start", "end", "line_end")
+
+    def __init__(self, section, key, value, start, end, line_end):
+        self.section = section
+        self.key = key
+        self.value = value
+        self.start = start
+        self.end = end
+        self.line_end = line_end  # 这一行（含换行符）结束的位置，新键插在它后面
+
+
+class IniDocument:
+    """保留原始布局的 INI 文件
+
+    entries 按在文件中的位置排列；同一小节中重复的键（如 Unreal 的数组项）都会保留，
+    get/set 作用于第一个。修改先记录在 changes 中，save 时一次性拼接写出。
+    """
+
+    def __init__(self, data=b"", path=None, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self.data = b""
+        self.entries = []
+        self.index = {}  # (小节, 键) -> IniEntry
+        self.sections = {}  # 小节 -> 小节最后一行结束的位置
+        self.changes = {}  # IniEntry -> 新值
+        self.additions = []  # 新增的 (小节, 键, 值)
+        self.newline = b"\n"
+        self.stamp = None  # 读取或保存时文件的 (修改时间, 大小)
+        self.parse(data)
+
+    @classmethod
+    def load(cls, path, encoding="utf-8"):
+        with open(path, "rb") as f:
+            document = cls(f.read(), path, encoding)
+        document.stamp = disk_stamp(path)
+        return document
+
+    def changed_on_disk(self):
+        """文件在读取之后是否被其他程序修改过（只比较状态相同时不读取内容）"""
+        if self.path is None or disk_stamp(self.path) == self.stamp:
+            return False
+        try:
+            with open(self.path, "rb") as f:
+                return f.read() != self.data
+        except OSError:
+            return True
+
+    def merge(self, data):
+        """把磁盘上的新内容合并进来，尚未保存的修改会重新应用
+
+        返回 (changed, conflicts)：changed 是外部改动过的 (小节, 键)，
+        conflicts 是其中本地也有未保存修改的键（本地的值优先，由调用方提示用户）。
+        """
+        if data == self.data:
+            self.stamp = disk_stamp(self.path) if self.path else None
+            return [], []
+        pending = [(entry.section, entry.key, value) for entry, value in self.changes.items()] + self.additions
+        old = self.first_values()
+        self.parse(data)
+        self.stamp = disk_stamp(self.path) if self.path else None
+        new = self.first_values()
+        changed = [key for key in list(old) + [key for key in new if key not in old] if old.get(key) != new.get(key)]
+        changed_set = set(changed)
+        conflicts = [(section, key) for section, key, _ in pending if (section, key) in changed_set]
+        for section, key, value in pending:
+            self.set(section, key, value)
+        return changed, conflicts
+
+    def first_values(self):
+        values = {}
+        for entry in self.entries:
+            values.setdefault((entry.section, entry.key), entry.value)
+        return values
+
+    def parse(self, data):
+        """线性扫描一遍，建立键到字节范围的索引"""
+        self.data = data
+        self.entries = []
+        self.index = {}
+        self.sections = {}
+        self.newline = b"\r\n" if b"\r\n" in data[:4096] else b"\n"
+        section = ""
+        pos = len(BOM) if data.startswith(BOM) else 0
+        size = len(data)
+        while pos < size:
+            line_end = data.find(b"\n", pos)
+            line_end = size if line_end < 0 else line_end + 1
+            line = data[pos:line_end].rstrip(b"\r\n")
+            stripped = line.strip()
+            if stripped.startswith(b"[") and stripped.endswith(b"]"):
+                section = stripped[1:-1].strip().decode(self.encoding, errors="replace")
+                self.sections[section] = line_end
+            elif stripped and not stripped.startswith(COMMENT_PREFIXES) and b"=" in line:
+                equals = line.index(b"=")
+                key = line[:equals].strip().decode(self.encoding, errors="replace")
+                start = pos + equals + 1
+                end = pos + len(line.rstrip())
+                while start < end and data[start:start + 1] in (b" ", b"\t"):
+                    start += 1
+                entry = IniEntry(section, key, data[start:end].decode(self.encoding, errors="replace"),
+                                 start, end, line_end)
+                self.entries.append(entry)
+                self.index.setdefault((section, key), entry)
+                self.sections[section] = line_end
+            pos = line_end
+        self.changes = {}
+        self.additions = []
+
+    def section_names(self):
+        return list(self.sections)
+
+    def items(self, section=None):
+        """返回 [(小节, 键, 当前值)]，包含尚未保存的修改"""
+        return [(entry.section, entry.key, self.changes.get(entry, entry.value))
+                for entry in self.entries if section is None or entry.section == section] + \
+               [item for item in self.additions if section is None or item[0] == section]
+
+    def get(self, section, key, fallback=None):
+        entry = self.index.get((section, key))
+        if entry is not None:
+            return self.changes.get(entry, entry.value)
+        for added_section, added_key, value in self.additions:
+            if (added_section, added_key) == (section, key):
+                return value
+        return fallback
+
+    def set(self, section, key, value):
+        """修改一个值，键不存在时在小节末尾（或文件末尾的新小节中）添加"""
+        entry = self.index.get((section, key))
+        if entry is None:
+            self.additions = [item for item in self.additions if item[:2] != (section, key)]
+            self.additions.append((section, key, value))
+        elif value == entry.value:
+            self.changes.pop(entry, None)
+        else:
+            self.changes[entry] = value
+
+    @property
+    def modified(self):
+        return bool(self.changes or self.additions)
+
+    def patches(self):
+        """返回按位置排序的 (起始, 结束, 新字节) 列表"""
+        patches = [(entry.start, entry.end, value.encode(self.encoding)) for entry, value in self.changes.items()]
+        new_sections = {}
+        for section, key, value in self.additions:
+            line = key.encode(self.encoding) + b"=" + value.encode(self.encoding) + self.newline
+            if section in self.sections:
+                at = self.sections[section]
+                prefix = b"" if self.data[:at].endswith(b"\n") or at == 0 else self.newline
+                patches.append((at, at, prefix + line))
+            else:
+                new_sections.setdefault(section, []).append(line)
+        if new_sections:
+            tail = b"" if not self.data or self.data.endswith(b"\n") else self.newline
+            for section, lines in new_sections.items():
+                tail += b"[" + section.encode(self.encoding) + b"]" + self.newline + b"".join(lines)
+            patches.append((len(self.data), len(self.data), tail))
+        patches.sort(key=lambda patch: (patch[0], patch[1]))
+        return patches
+
+    def render(self):
+        """拼接出包含所有修改的文件内容，未修改的部分直接从原始字节切片"""
+        pieces = []
+        pos = 0
+        for start, end, replacement in self.patches():
+            pieces.append(self.data[pos:start])
+            pieces.append(replacement)
+            pos = end
+        pieces.append(self.data[pos:])
+        return b"".join(pieces)
+
+    def save(self, path=None):
+        """原子地写入文件，返回写入的字节数；没有修改且目标是原文件时不写"""
+        path = path or self.path
+        if path is None:
+            raise Exception("没有指定配置文件路径")
+        if not self.modified and path == self.path and os.path.exists(path):
+            return 0
+        data = self.render()
+        write_atomic(path, data)
+        if self.additions:
+            self.parse(data)  # 新增键会改变小节结构，重新建立索引
+        else:
+            self.apply_changes(data)
+        self.path = path
+        self.stamp = disk_stamp(path)
+        return len(data)
+
+    def apply_changes(self, data):
+        """只修改了已有的值时，按累计偏移量平移各条目的位置，不必重新解析"""
+        changed = sorted(self.changes.items(), key=lambda item: item[0].start)
+        starts = [entry.start for entry, _ in changed]
+        shifts = []
+        delta = 0
+        for entry, value in changed:
+            delta += len(value.encode(self.encoding)) - (entry.end - entry.start)
+            shifts.append(delta)
+        for entry in self.entries:
+            i = bisect.bisect_left(starts, entry.start)
+            before = shifts[i - 1] if i else 0  # 位于它之前的修改造成的偏移
+            entry.start += before
+            if i < len(starts) and starts[i] == entry.start - before:
+                entry.value = changed[i][1]
+                entry.end = entry.start + len(entry.value.encode(self.encoding))
+                entry.line_end += shifts[i]
+            else:
+                entry.end += before
+                entry.line_end += before
+        for section, at in self.sections.items():
+            i = bisect.bisect_left(starts, at)
+            self.sections[section] = at + (shifts[i - 1] if i else 0)
+        self.data = data
+        self.changes = {}
+
+
+def disk_stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def write_atomic(path, data):
+    """先写同目录下的临时文件并刷到磁盘，再替换目标文件，保留原文件的权限"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class FileLock:
+    """进程间的排他锁（fcntl.flock），每次使用新建一个；Windows 上没有 fcntl，只靠进程内的锁"""
+
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+        self.file = None
+
+    def __enter__(self):
+        """blocking 为假且锁已被其他进程持有时抛出 BlockingIOError"""
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.file = open(self.path, "a+b")
+            try:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BaseException:
+                self.file.close()
+                self.file = None
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def release(self):
+        if self.file is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
@@ -0,0 +1,151 @@
+"""日志模型：带轮转的磁盘日志写入器和固定容量的日志环形缓冲区"""
+import collections
+import datetime
+import gzip
+import os
+import shutil
+import sys
+import threading
+import time
+
+
+def format_log_line(message):
+    """给消息加上时间戳"""
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return f"[{timestamp}] {message}"
+
+
+class LogSink:
+    """带缓冲和轮转的日志文件写入器，所有磁盘写入都在后台线程完成
+
+    日志按 flush_interval 秒批量写入；文件超过 max_bytes 或距上次轮转超过
+    rotate_interval 秒时轮转为 path.1、path.2 ...，compress 为真时轮转出的文件用 gzip 压缩。
+    """
+
+    def __init__(self, path="pltool.log", max_bytes=10 * 1024 * 1024, rotate_interval=None,
+                 backup_count=5, compress=True, flush_interval=1.0, max_pending=100000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.compress = compress
+        self.flush_interval = flush_interval
+        self.pending = collections.deque(maxlen=max_pending)  # 等待写入的行，磁盘过慢时丢弃最旧的
+        self.wakeup = threading.Event()
+        self.closed = False
+        self.file = None
+        self.next_rollover = None
+        self.writer = threading.Thread(target=self.run, name="LogSink", daemon=True)
+        self.writer.start()
+
+    def write(self, line):
+        """追加一行日志（不阻塞，可在任意线程调用）"""
+        self.pending.append(line)
+
+    def write_lines(self, lines):
+        self.pending.extend(lines)
+
+    def flush(self):
+        """唤醒后台线程立即写入"""
+        self.wakeup.set()
+
+    def close(self):
+        """写完剩余日志并停止后台线程"""
+        self.closed = True
+        self.wakeup.set()
+        self.writer.join(timeout=5)
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.write_pending()
+            except OSError as e:
+                print(f"写入日志文件失败: {e}", file=sys.stderr)
+            if self.closed:
+                break
+        try:
+            self.write_pending()  # 上一批取出后、close() 之前追加的行
+        except OSError as e:
+            print(f"写入日志文件失败: {e}", file=sys.stderr)
+        if self.file is not None:
+            self.file.close()
+
+    def write_pending(self):
+        if not self.pending:
+            return
+        batch = [self.pending.popleft() for _ in range(len(self.pending))]
+        if self.file is None:
+            self.open_file()
+        elif self.should_rollover():
+            self.rollover()
+        self.file.write("\n".join(batch) + "\n")
+        self.file.flush()
+
+    def open_file(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, "a", encoding="utf-8")
+        if self.rotate_interval:
+            self.next_rollover = time.time() + self.rotate_interval
+
+    def should_rollover(self):
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            return True
+        return self.next_rollover is not None and time.time() >= self.next_rollover
+
+    def rotated_name(self, index):
+        return f"{self.path}.{index}.gz" if self.compress else f"{self.path}.{index}"
+
+    def rollover(self):
+        """关闭当前文件，依次后移旧文件，再打开新文件"""
+        self.file.close()
+        self.file = None
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                src = self.rotated_name(index)
+                if os.path.exists(src):
+                    os.replace(src, self.rotated_name(index + 1))
+            if self.compress:
+                with open(self.path, "rb") as src, gzip.open(self.rotated_name(1), "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(self.path)
+            else:
+                os.replace(self.path, self.rotated_name(1))
+        else:
+            os.remove(self.path)
+        self.open_file()
+
+
+class LogBuffer:
+    """固定容量的日志环形缓冲区，完整历史交给 LogSink 写入磁盘"""
+
+    def __init__(self, capacity=20000, sink=None, sink_prefix=""):
+        self.lines = collections.deque(maxlen=capacity)
+        self.total = 0  # 累计写入的行数，用作行的绝对序号
+        self.sink = sink
+        self.sink_prefix = sink_prefix  # 多个实例共用一个日志文件时用于区分来源
+
+    @property
+    def first_seq(self):
+        """缓冲区中最旧一行的绝对序号"""
+        return self.total - len(self.lines)
+
+    def extend(self, lines):
+        self.lines.extend(lines)
+        self.total += len(lines)
+        if self.sink is not None:
+            if self.sink_prefix:
+                lines = [self.sink_prefix + line for line in lines]
+            self.sink.write_lines(lines)
+
+    def get_range(self, start, end):
+        """按绝对序号取出 [start, end) 之间仍在缓冲区中的行"""
+        start = max(start, self.first_seq)
+        end = min(end, self.total)
+        if start >= end:
+            return []
+        offset = self.first_seq
+        return [self.lines[i - offset] for i in range(start, end)]
@@ -0,0 +1,318 @@
+"""事件日志和运行指标
+
+EventJournal 把启动、停止、崩溃、重启和就绪等事件按 JSON Lines 追加到文件中（借用 LogSink 的
+后台写入和轮转）；MetricsRegistry 是进程内的计数器、仪表和直方图，按 Prometheus 文本格式导出，
+由控制接口的 GET /metrics 提供。Telemetry 把两者接到监控器的生命周期上。
+
+记录一次事件只是在锁内做几次加法和一次入队，不做任何 I/O。
+"""
+import bisect
+import collections
+import json
+import re
+import threading
+import time
+
+from pltool_logs import LogSink
+
+RESTART_LATENCY_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+READY_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600)
+RATE_WINDOW = 60  # 秒，计算每秒日志行数的窗口
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """一个指标族；labels 为标签名，每组标签值对应一个时间序列"""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}  # 标签值元组 -> 值
+        self.lock = threading.Lock()
+
+    def remove(self, *label_values):
+        with self.lock:
+            self.values.pop(label_values, None)
+
+    def samples(self):
+        """返回 [(名称后缀, 标签文本, 值)]"""
+        with self.lock:
+            return [("", format_labels(self.labels, key), value) for key, value in self.values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {format_number(value)}" for suffix, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+
+class Gauge(Metric):
+    """可以直接设置，也可以给出 collect() 在导出时计算 {标签值元组: 值}"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=(), collect=None):
+        super().__init__(name, help_text, labels)
+        self.collect = collect
+
+    def set(self, *label_values, value):
+        with self.lock:
+            self.values[label_values] = value
+
+    def samples(self):
+        if self.collect is None:
+            return super().samples()
+        return [("", format_labels(self.labels, key), value) for key, value in self.collect().items()]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *label_values, value):
+        with self.lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [[0] * len(self.buckets), 0.0, 0]  # 各桶计数、总和、次数
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self.values.items()]
+        result = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                result.append(("_bucket", format_labels(self.labels, key, f'le="{format_number(float(bound))}"'),
+                               cumulative))
+            result.append(("_bucket", format_labels(self.labels, key, 'le="+Inf"'), count))
+            result.append(("_sum", format_labels(self.labels, key), total))
+            result.append(("_count", format_labels(self.labels, key), count))
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}  # 名称 -> Metric，保持注册顺序
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"指标已存在: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=(), collect=None):
+        return self.register(Gauge(name, help_text, labels, collect))
+
+    def histogram(self, name, help_text, buckets, labels=()):
+        return self.register(Histogram(name, help_text, buckets, labels))
+
+    def render(self):
+        """Prometheus 文本格式 (text/plain; version=0.0.4)"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class EventJournal:
+    """只追加的事件日志，每行一个 JSON 对象: {"time", "instance", "event", ...}"""
+
+    def __init__(self, path="pltool_events.jsonl", max_bytes=10 * 1024 * 1024, backup_count=5, compress=True):
+        self.sink = LogSink(path, max_bytes=max_bytes, backup_count=backup_count, compress=compress)
+
+    def record(self, instance, event, fields=None):
+        entry = {"time": round(time.time(), 3), "instance": instance, "event": event}
+        if fields:
+            entry.update(fields)
+        self.sink.write(json.dumps(entry, ensure_ascii=False))
+
+    def close(self):
+        self.sink.close()
+
+
+class InstanceTelemetry:
+    def __init__(self):
+        self.started = None  # 当前进程启动时的 time.monotonic()，未运行时为 None
+        self.ready_pending = False
+        self.restart_requested = None  # 请求重启（或检测到崩溃）时的 time.monotonic()
+        self.rate = collections.deque()  # (整秒, 行数)，只保留 RATE_WINDOW 内的
+
+
+class Telemetry:
+    """接收 ServerSupervisor.record() 的生命周期事件，写入事件日志并更新指标
+
+    就绪时间：实例设置了 ready_pattern 时为启动后第一次出现匹配的输出行，否则为第一次 stdout 输出。
+    日志行数来自 ServerManager.publish_output，即前端实际显示的行。
+    """
+
+    def __init__(self, manager, journal=None, registry=None, clock=time.monotonic):
+        self.manager = manager
+        self.journal = journal
+        self.registry = registry or MetricsRegistry()
+        self.clock = clock
+        self.instances = {}  # 实例名 -> InstanceTelemetry
+        self.ready_patterns = {}  # 实例名 -> 编译后的正则
+        self.lock = threading.Lock()
+        labels = ("instance",)
+        registry = self.registry
+        self.up = registry.gauge("pltool_up", "服务器进程是否在运行", labels, self.collect_up)
+        self.uptime = registry.gauge("pltool_uptime_seconds", "当前进程已运行的秒数", labels, self.collect_uptime)
+        self.starts = registry.counter("pltool_starts_total", "启动次数", labels)
+        self.stops = registry.counter("pltool_stops_total", "主动停止次数", labels)
+        self.crashes = registry.counter("pltool_crashes_total", "崩溃（非主动停止的退出）次数", labels)
+        self.restarts = registry.counter("pltool_restarts_total", "按原因统计的重启次数", ("instance", "reason"))
+        self.last_crash = registry.gauge("pltool_last_crash_timestamp_seconds", "最近一次崩溃的 Unix 时间", labels)
+        self.restart_latency = registry.histogram(
+            "pltool_restart_latency_seconds", "从请求重启或检测到崩溃到新进程启动的秒数", RESTART_LATENCY_BUCKETS, labels)
+        self.time_to_ready = registry.histogram(
+            "pltool_time_to_ready_seconds", "从启动到服务器就绪的秒数", READY_BUCKETS, labels)
+        self.log_lines = registry.counter("pltool_log_lines_total", "显示的日志行数", labels)
+        self.log_rate = registry.gauge("pltool_log_lines_per_second", f"最近 {RATE_WINDOW} 秒平均每秒日志行数",
+                                       labels, self.collect_rate)
+        self.breaker = registry.gauge("pltool_crash_breaker_open", "崩溃自动重启是否已熔断", labels,
+                                      self.collect_breaker)
+
+    def attach(self):
+        self.manager.telemetry = self
+        for supervisor in self.manager.supervisors():
+            supervisor.telemetry = self
+        with self.manager.output_lock:
+            self.manager.output_listeners.append(self.on_output)
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def set_ready_pattern(self, name, pattern):
+        if pattern:
+            self.ready_patterns[name] = re.compile(pattern)
+        else:
+            self.ready_patterns.pop(name, None)
+
+    def state(self, name):
+        state = self.instances.get(name)
+        if state is None:
+            state = self.instances[name] = InstanceTelemetry()
+        return state
+
+    def record(self, name, event, fields):
+        """在调用者的线程中执行（事件循环、界面或控制接口线程）"""
+        now = self.clock()
+        with self.lock:
+            state = self.state(name)
+            if event == "start":
+                state.started = now
+                state.ready_pending = True
+                self.starts.inc(name)
+                if state.restart_requested is not None:
+                    latency = now - state.restart_requested
+                    state.restart_requested = None
+                    fields = dict(fields, restart_latency=round(latency, 3))
+                    self.restart_latency.observe(name, value=latency)
+            elif event == "stop":
+                fields = self.stop_running(state, now, fields)
+                self.stops.inc(name)
+            elif event == "crash":
+                fields = self.stop_running(state, now, fields)
+                state.restart_requested = now  # 自动重启时从检测到崩溃开始计算
+                self.crashes.inc(name)
+                self.last_crash.set(name, value=time.time())
+            elif event == "restart":
+                if state.restart_requested is None or fields.get("reason") != "crash":
+                    state.restart_requested = now
+                self.restarts.inc(name, fields.get("reason", "manual"))
+            elif event == "start_failed":
+                state.restart_requested = None
+        if self.journal is not None:
+            self.journal.record(name, event, fields)
+
+    @staticmethod
+    def stop_running(state, now, fields):
+        if state.started is not None:
+            fields = dict(fields, uptime=round(now - state.started, 3))
+        state.started = None
+        state.ready_pending = False
+        return fields
+
+    def on_output(self, name, lines):
+        now = self.clock()
+        second = int(now)
+        ready_after = None
+        with self.lock:
+            state = self.state(name)
+            self.log_lines.inc(name, amount=len(lines))
+            if state.rate and state.rate[-1][0] == second:
+                state.rate[-1] = (second, state.rate[-1][1] + len(lines))
+            else:
+                state.rate.append((second, len(lines)))
+            while state.rate and state.rate[0][0] <= second - RATE_WINDOW:
+                state.rate.popleft()
+            if state.ready_pending and name in self.manager.instances and self.is_ready(name, state, lines):
+                state.ready_pending = False
+                ready_after = now - state.started
+                self.time_to_ready.observe(name, value=ready_after)
+        if ready_after is not None and self.journal is not None:
+            self.journal.record(name, "ready", {"seconds": round(ready_after, 3)})
+
+    def is_ready(self, name, state, lines):
+        pattern = self.ready_patterns.get(name)
+        if pattern is not None:
+            return any(pattern.search(line) for line in lines)
+        last_stdout = self.manager.get(name).server.last_stdout
+        return last_stdout is not None and last_stdout >= state.started
+
+    def collect_up(self):
+        return {(s.name,): int(s.server.process is not None and s.status == "运行中") for s in self.manager.supervisors()}
+
+    def collect_breaker(self):
+        return {(s.name,): int(s.guard.tripped) for s in self.manager.supervisors()}
+
+    def collect_uptime(self):
+        now = self.clock()
+        with self.lock:
+            return {(name,): now - state.started if state.started is not None else 0
+                    for name, state in self.instances.items()}
+
+    def collect_rate(self):
+        limit = int(self.clock()) - RATE_WINDOW
+        with self.lock:
+            return {(name,): sum(count for second, count in state.rate if second > limit) / RATE_WINDOW
+                    for name, state in self.instances.items()}
@@ -0,0 +1,71 @@
+"""最小的 Source RCON 客户端，用于在停服前发送保存/广播等游戏内命令"""
+import socket
+import struct
+
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_EXECCOMMAND = 2
+
+
+class RconError(Exception):
+    pass
+
+
+class RconClient:
+    def __init__(self, host, port, password, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self.sock = None
+        self.next_id = 1
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        request_id = self.send_packet(SERVERDATA_AUTH, self.password)
+        while True:
+            response_id, packet_type, _ = self.read_packet()
+            if packet_type == SERVERDATA_AUTH_RESPONSE:
+                if response_id == -1 or response_id != request_id:
+                    raise RconError("RCON 密码错误")
+                return
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def command(self, command):
+        """执行一条命令并返回服务器的回复（只读取第一个回复包）"""
+        self.send_packet(SERVERDATA_EXECCOMMAND, command)
+        _, _, body = self.read_packet()
+        return body
+
+    def send_packet(self, packet_type, body):
+        request_id = self.next_id
+        self.next_id += 1
+        payload = struct.pack("<ii", request_id, packet_type) + body.encode("utf-8") + b"\0\0"
+        self.sock.sendall(struct.pack("<i", len(payload)) + payload)
+        return request_id
+
+    def read_exact(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise RconError("RCON 连接已关闭")
+            data += chunk
+        return data
+
+    def read_packet(self):
+        size, = struct.unpack("<i", self.read_exact(4))
+        data = self.read_exact(size)
+        request_id, packet_type = struct.unpack("<ii", data[:8])
+        return request_id, packet_type, data[8:-2].decode("utf-8", errors="replace")
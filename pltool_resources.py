@@ -0,0 +1,260 @@
+"""服务器进程资源监控：定时采样 CPU、内存、线程数和磁盘读写，保存在固定长度的时间序列中
+
+Linux 上直接读取 /proc/<pid>/stat、status 和 io，并统计整个子进程树
+（shell=True 时真正的服务器是 shell 的子进程）；其他平台在安装了 psutil 时使用 psutil。
+"""
+import collections
+import csv
+import os
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # psutil 是可选依赖，只在没有 /proc 的平台上需要
+    psutil = None
+
+PROC_ROOT = "/proc"
+
+ResourceSample = collections.namedtuple(
+    "ResourceSample", "time cpu_percent rss_bytes threads read_bytes write_bytes processes")
+
+
+def proc_available():
+    return os.path.isdir(os.path.join(PROC_ROOT, "self"))
+
+
+def read_stat(pid):
+    """返回 (ppid, utime + stime 时钟滴答数)"""
+    with open(os.path.join(PROC_ROOT, str(pid), "stat"), "rb") as f:
+        data = f.read()
+    fields = data[data.rindex(b")") + 2:].split()  # 进程名中可能有空格和括号
+    return int(fields[1]), int(fields[11]) + int(fields[12])
+
+
+def read_children_map():
+    """扫描一次 /proc，返回 父进程 -> [子进程] 映射"""
+    children = collections.defaultdict(list)
+    for entry in os.listdir(PROC_ROOT):
+        if not entry.isdigit():
+            continue
+        try:
+            ppid, _ = read_stat(entry)
+        except (OSError, ValueError, IndexError):
+            continue  # 进程已退出
+        children[ppid].append(int(entry))
+    return children
+
+
+def process_tree(root_pid, children):
+    pids = [root_pid]
+    for pid in pids:
+        pids.extend(children.get(pid, ()))
+    return pids
+
+
+def read_status(pid):
+    """返回 (RSS 字节数, 线程数)"""
+    rss = threads = 0
+    with open(os.path.join(PROC_ROOT, str(pid), "status"), "rb") as f:
+        for line in f:
+            if line.startswith(b"VmRSS:"):
+                rss = int(line.split()[1]) * 1024
+            elif line.startswith(b"Threads:"):
+                threads = int(line.split()[1])
+    return rss, threads
+
+
+def read_io(pid):
+    """返回 (read_bytes, write_bytes)，没有权限读取时返回 (0, 0)"""
+    read_bytes = write_bytes = 0
+    try:
+        with open(os.path.join(PROC_ROOT, str(pid), "io"), "rb") as f:
+            for line in f:
+                if line.startswith(b"read_bytes:"):
+                    read_bytes = int(line.split()[1])
+                elif line.startswith(b"write_bytes:"):
+                    write_bytes = int(line.split()[1])
+    except OSError:
+        pass
+    return read_bytes, write_bytes
+
+
+class ResourceSeries:
+    """一个实例的资源采样时间序列，超出容量时丢弃最旧的采样"""
+
+    CSV_HEADER = ("time", "cpu_percent", "rss_bytes", "threads", "read_bytes", "write_bytes", "processes")
+
+    def __init__(self, capacity=720):
+        self.samples = collections.deque(maxlen=capacity)
+        self.lock = threading.Lock()  # 事件循环线程追加，界面和控制接口线程读取
+        self.last_ticks = None  # 上一次采样时的 (CPU 时间(秒), 采样时刻)
+
+    def append(self, sample):
+        with self.lock:
+            self.samples.append(sample)
+
+    def snapshot(self):
+        """当前所有采样的副本，遍历它不会与追加冲突"""
+        with self.lock:
+            return list(self.samples)
+
+    def latest(self):
+        with self.lock:
+            return self.samples[-1] if self.samples else None
+
+    def values(self, field):
+        return [getattr(sample, field) for sample in self.snapshot()]
+
+    def rates(self, field):
+        """累计值（如 read_bytes）换算成每秒速率"""
+        samples = self.snapshot()
+        rates = []
+        for prev, cur in zip(samples, samples[1:]):
+            elapsed = cur.time - prev.time
+            rates.append(max(0, getattr(cur, field) - getattr(prev, field)) / elapsed if elapsed > 0 else 0)
+        return rates
+
+    def export_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.CSV_HEADER)
+            for sample in self.snapshot():
+                row = sample._replace(time=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(sample.time)))
+                writer.writerow(row._replace(cpu_percent=f"{sample.cpu_percent:.1f}"))
+
+
+class ResourceMonitor:
+    """在共用的事件循环中按固定间隔为所有运行中的实例采样
+
+    每次采样只扫描一次 /proc 建立进程树，再分别统计各实例的子进程树，
+    结果以 (实例名, "resources", ResourceSample) 事件发给界面。
+    """
+
+    def __init__(self, manager, interval=5.0, capacity=720):
+        self.manager = manager
+        self.interval = interval
+        self.capacity = capacity
+        self.series = {}  # 实例名 -> ResourceSeries
+        self.listeners = []  # 每次采样后在事件循环线程中调用 listener(实例名, 采样)
+        self.handle = None
+        self.clock_ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+        if proc_available():
+            self.backend = "proc"
+        elif psutil is not None:
+            self.backend = "psutil"
+        else:
+            self.backend = None
+
+    @property
+    def available(self):
+        return self.backend is not None
+
+    def start(self):
+        if self.available and self.handle is None:
+            self.handle = self.manager.loop.call_later(self.interval, self.tick)
+
+    def stop(self):
+        if self.handle is not None:
+            self.handle.cancel()
+            self.handle = None
+
+    def series_for(self, name):
+        if name not in self.series:
+            self.series[name] = ResourceSeries(self.capacity)
+        return self.series[name]
+
+    def latest(self, name):
+        series = self.series.get(name)
+        return series.latest() if series else None
+
+    def export_csv(self, name, path):
+        self.series_for(name).export_csv(path)
+
+    def tick(self):
+        self.handle = self.manager.loop.call_later(self.interval, self.tick)
+        running = [(s.name, s.server.pid) for s in self.manager.supervisors() if s.server.pid]
+        for name in list(self.series):
+            if name not in self.manager.instances:
+                del self.series[name]  # 实例已被删除
+        if not running:
+            return
+        children = read_children_map() if self.backend == "proc" else None
+        for name, pid in running:
+            sample = self.sample(self.series_for(name), pid, children)
+            if sample is not None:
+                self.series[name].append(sample)
+                self.manager.events.put((name, "resources", sample))
+                for listener in self.listeners:
+                    listener(name, sample)
+
+    def sample(self, series, root_pid, children):
+        """统计一个进程树，返回 ResourceSample；进程已退出时返回 None"""
+        now = time.time()
+        if self.backend == "proc":
+            totals = self.sample_proc(process_tree(root_pid, children))
+        else:
+            totals = self.sample_psutil(root_pid)
+        if totals is None:
+            return None
+        cpu_seconds, rss, threads, read_bytes, write_bytes, count = totals
+        cpu_percent = 0.0
+        if series.last_ticks is not None:
+            last_cpu, last_time = series.last_ticks
+            if now > last_time:
+                cpu_percent = max(0.0, cpu_seconds - last_cpu) / (now - last_time) * 100  # 已退出的子进程会让差值为负
+        series.last_ticks = (cpu_seconds, now)
+        return ResourceSample(now, cpu_percent, rss, threads, read_bytes, write_bytes, count)
+
+    def sample_proc(self, pids):
+        ticks = rss = threads = read_bytes = write_bytes = count = 0
+        for pid in pids:
+            try:
+                _, cpu = read_stat(pid)
+                proc_rss, proc_threads = read_status(pid)
+            except (OSError, ValueError, IndexError):
+                continue  # 采样期间退出的进程
+            proc_read, proc_write = read_io(pid)
+            ticks += cpu
+            rss += proc_rss
+            threads += proc_threads
+            read_bytes += proc_read
+            write_bytes += proc_write
+            count += 1
+        if not count:
+            return None
+        return ticks / self.clock_ticks, rss, threads, read_bytes, write_bytes, count
+
+    def sample_psutil(self, root_pid):
+        try:
+            root = psutil.Process(root_pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        cpu = rss = threads = read_bytes = write_bytes = count = 0
+        for process in processes:
+            try:
+                with process.oneshot():
+                    times = process.cpu_times()
+                    cpu += times.user + times.system
+                    rss += process.memory_info().rss
+                    threads += process.num_threads()
+                    try:
+                        io = process.io_counters()
+                        read_bytes += io.read_bytes
+                        write_bytes += io.write_bytes
+                    except (psutil.Error, AttributeError):
+                        pass  # macOS 不提供 io_counters
+                count += 1
+            except psutil.Error:
+                continue
+        if not count:
+            return None
+        return cpu, rss, threads, read_bytes, write_bytes, count
+
+
+def format_bytes(value):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(value) < 1024 or unit == "GB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
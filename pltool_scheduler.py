@@ -0,0 +1,384 @@
+"""定时任务：cron 表达式、每日时间窗口、固定间隔和一次性任务
+
+所有任务放在一个按下次执行时间排序的堆中，只在共用事件循环里挂一个定时器
+（指向最早的任务），不会为每个任务创建线程。任务保存在 JSON 文件中，程序重启后继续生效。
+多个进程（例如运行中的无界面进程和命令行 --add-job）可以同时修改任务文件，保存时在文件锁内合并。
+"""
+import datetime
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+
+from pltool_ini import FileLock, write_atomic
+
+TRIGGERS = ("cron", "daily", "interval", "once")
+ACTIONS = ("restart", "backup")
+ACTION_NAMES = {"restart": "重启", "backup": "备份存档"}
+MAX_TIMER_DELAY = 60  # 秒，定时器最长等待时间，用于应对系统时间被调整
+
+
+class CronExpression:
+    """标准 5 段 cron 表达式: 分 时 日 月 周（0 和 7 都表示周日）
+
+    每段支持 *、数字、a-b 范围、逗号列表和 /n 步长。
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, text):
+        self.text = text
+        parts = text.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron 表达式需要 5 段: {text}")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            self.parse_field(part, low, high) for part, (low, high) in zip(parts, self.FIELDS))
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = parts[2] == "*"
+        self.any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def parse_field(text, low, high):
+        values = set()
+        for item in text.split(","):
+            step = 1
+            if "/" in item:
+                item, step_text = item.split("/", 1)
+                step = int(step_text)
+                if step <= 0:
+                    raise ValueError(f"cron 步长必须大于 0: {text}")
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                start, end = (int(v) for v in item.split("-", 1))
+            else:
+                start = int(item)
+                end = high if step > 1 else start
+            if not low <= start <= end <= high:
+                raise ValueError(f"cron 字段超出范围 {low}-{high}: {text}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def day_matches(self, dt):
+        weekday = (dt.weekday() + 1) % 7  # cron 中 0 是周日
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return weekday in self.weekdays
+        if self.any_weekday:
+            return dt.day in self.days
+        return dt.day in self.days or weekday in self.weekdays  # 两者都限定时满足其一即可
+
+    def next_after(self, dt):
+        """返回严格晚于 dt 的下一个匹配时刻（本地时间，精确到分钟）"""
+        dt = dt.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = dt + datetime.timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1, hour=0, minute=0) + datetime.timedelta(days=32)).replace(day=1)
+                continue
+            if not self.day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+                continue
+            if dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + datetime.timedelta(hours=1)
+                continue
+            if dt.minute not in self.minutes:
+                dt += datetime.timedelta(minutes=1)
+                continue
+            return dt
+        raise ValueError(f"cron 表达式没有可执行的时间: {self.text}")
+
+
+def parse_clock(text):
+    hour, minute = (int(v) for v in text.strip().split(":"))
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError(f"无效的时间: {text}")
+    return datetime.time(hour, minute)
+
+
+class Job:
+    """一个定时任务
+
+    trigger 与 spec 的对应关系:
+        cron      "0 4 * * *"
+        daily     "04:00" 或时间窗口 "04:00-05:00"（错过开始时间时，只要还在窗口内就立即执行）
+        interval  间隔秒数，例如 "21600"
+        once      执行时刻的时间戳
+    """
+
+    def __init__(self, instance, trigger, spec, action="restart", job_id=None, next_run=None, last_run=None):
+        if trigger not in TRIGGERS:
+            raise ValueError(f"未知的触发方式: {trigger}")
+        if action not in ACTIONS:
+            raise ValueError(f"未知的任务类型: {action}")
+        self.id = job_id or uuid.uuid4().hex[:8]
+        self.instance = instance
+        self.trigger = trigger
+        self.spec = str(spec).strip()
+        self.action = action
+        self.next_run = next_run
+        self.last_run = last_run
+        self.cancelled = False
+        self.validate()
+
+    def validate(self):
+        if self.trigger == "cron":
+            self.cron = CronExpression(self.spec)
+        elif self.trigger == "daily":
+            start, _, end = self.spec.partition("-")
+            self.window = (parse_clock(start), parse_clock(end) if end else None)
+        elif self.trigger == "interval":
+            if float(self.spec) <= 0:
+                raise ValueError("间隔必须大于 0 秒")
+        else:
+            float(self.spec)
+
+    def compute_next(self, now):
+        """根据当前时间戳计算下一次执行时间，一次性任务执行过后返回 None"""
+        if self.trigger == "once":
+            return float(self.spec) if self.last_run is None else None
+        if self.trigger == "interval":
+            interval = float(self.spec)
+            if self.next_run is not None and self.next_run > now:
+                return self.next_run
+            base = self.last_run if self.last_run is not None else now
+            return max(base + interval, now) if self.last_run is not None else now + interval
+        current = datetime.datetime.fromtimestamp(now)
+        if self.trigger == "cron":
+            return self.cron.next_after(current).timestamp()
+        start, end = self.window
+        today = datetime.datetime.combine(current.date(), start)
+        if end:
+            for window_start in (today - datetime.timedelta(days=1), today):  # 跨过午夜的窗口可能始于昨天
+                window_end = datetime.datetime.combine(window_start.date(), end)
+                if window_end <= window_start:
+                    window_end += datetime.timedelta(days=1)
+                ran = self.last_run is not None and self.last_run >= window_start.timestamp()
+                if window_start.timestamp() <= now < window_end.timestamp() and not ran:
+                    return now  # 仍在窗口内且本窗口尚未执行
+        if now < today.timestamp():
+            return today.timestamp()
+        return (today + datetime.timedelta(days=1)).timestamp()
+
+    def describe(self):
+        names = {"cron": "cron", "daily": "每天", "interval": "每隔(秒)", "once": "一次"}
+        if self.trigger == "once":
+            text = f"一次 {format_time(float(self.spec))}"
+        else:
+            text = f"{names[self.trigger]} {self.spec}"
+        return text if self.action == "restart" else f"{text} {ACTION_NAMES[self.action]}"
+
+    def to_dict(self):
+        return {"id": self.id, "instance": self.instance, "trigger": self.trigger, "spec": self.spec,
+                "action": self.action, "next_run": self.next_run, "last_run": self.last_run}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["instance"], data["trigger"], data["spec"], data.get("action", "restart"),
+                   data.get("id"), data.get("next_run"), data.get("last_run"))
+
+
+def format_time(timestamp):
+    if timestamp is None:
+        return "-"
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Scheduler:
+    """所有实例共用的定时任务调度器，运行在 ServerManager 的事件循环中"""
+
+    def __init__(self, manager, path="pltool_jobs.json", clock=time.time):
+        self.manager = manager
+        self.path = path
+        self.clock = clock
+        self.jobs = {}  # id -> Job
+        self.heap = []  # (下次执行时间, 序号, Job)
+        self.sequence = itertools.count()
+        self.lock = threading.RLock()
+        self.handle = None
+        self.stopped = False
+        self.known = set()  # 上次与文件同步时文件中的任务 ID，用来区分其他进程的添加和取消
+
+    def read_file(self):
+        """返回 (原始内容, {id: Job})，文件不存在时返回 (None, {})；文件损坏时抛出异常"""
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None, {}
+        data = json.loads(raw.decode("utf-8"))
+        jobs = [Job.from_dict(item) for item in data.get("jobs", [])]
+        return raw, {job.id: job for job in jobs}
+
+    def load(self, arm=True):
+        """从 JSON 文件恢复任务；文件损坏时保留原文件并从空任务列表开始
+
+        arm 为 False 时只读取任务，不挂定时器（命令行只查看或修改任务文件时）。
+        """
+        if not self.path:
+            return
+        try:
+            _, jobs = self.read_file()
+        except (OSError, ValueError, KeyError) as e:
+            self.manager.events.put((None, "log", f"无法读取定时任务文件 {self.path}: {e}"))
+            return
+        with self.lock:
+            for job in jobs.values():
+                self.jobs[job.id] = job
+                self.push(job)
+            self.known = set(jobs)
+        if arm:
+            self.arm()
+
+    def stop(self):
+        """停止触发任务（任务仍保留在文件中，下次启动时恢复）"""
+        with self.lock:
+            self.stopped = True
+            if self.handle is not None:
+                self.handle.cancel()
+                self.handle = None
+
+    def save(self):
+        """在文件锁内先合并其他进程对任务文件的修改，再原子地写入（内容不变时不写）
+
+        也用于文件被外部修改后重新同步，见 watch()。
+        """
+        if not self.path:
+            return
+        with FileLock(self.path + ".lock"):
+            try:
+                raw, disk = self.read_file()
+            except (OSError, ValueError, KeyError):
+                raw, disk = None, None  # 损坏的文件直接覆盖
+            with self.lock:
+                changed = disk is not None and self.merge(disk)
+                data = {"jobs": [job.to_dict() for job in self.jobs.values()]}
+            text = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+            if text != raw:
+                write_atomic(self.path, text)
+        if changed:
+            self.arm()
+            self.manager.events.put((None, "jobs", None))
+
+    def merge(self, disk):
+        """合并文件中的任务，返回任务列表是否有变化（调用时持有 self.lock）
+
+        文件中有、上次同步后才出现的是其他进程添加的；上次同步时还在、现在文件中没有的是其他进程取消的。
+        两边都有的任务以本进程为准，只取较新的上次执行时间。
+        """
+        changed = False
+        for job_id, job in disk.items():
+            ours = self.jobs.get(job_id)
+            if ours is None:
+                if job_id not in self.known:
+                    self.jobs[job_id] = job
+                    self.push(job)
+                    changed = True
+            elif job.last_run is not None and (ours.last_run is None or job.last_run > ours.last_run):
+                ours.last_run = job.last_run
+        for job_id in [job_id for job_id in self.jobs if job_id in self.known and job_id not in disk]:
+            self.jobs.pop(job_id).cancelled = True  # 堆中的条目在弹出时丢弃
+            changed = True
+        self.known = set(self.jobs)
+        return changed
+
+    def watch(self, watcher):
+        """任务文件被其他进程修改后重新同步，运行中的进程因此不需要重启"""
+        if self.path:
+            watcher.watch(os.path.abspath(self.path), lambda path: self.save())
+
+    def push(self, job):
+        job.next_run = job.compute_next(self.clock())
+        if job.next_run is not None:
+            heapq.heappush(self.heap, (job.next_run, next(self.sequence), job))
+
+    def add(self, instance, trigger, spec, action="restart"):
+        job = Job(instance, trigger, spec, action)
+        with self.lock:
+            self.jobs[job.id] = job
+            self.push(job)
+        self.save()
+        self.arm()
+        self.notify(job.instance, f"已添加定时任务 {job.id}: {job.describe()}，下次执行 {format_time(job.next_run)}")
+        return job
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+            if job is None:
+                return False
+            job.cancelled = True  # 堆中的条目在弹出时丢弃
+        self.save()
+        self.arm()
+        self.notify(job.instance, f"已取消定时任务 {job.id}: {job.describe()}")
+        return True
+
+    def cancel_instance(self, instance):
+        for job in self.list_jobs(instance):
+            self.cancel(job.id)
+
+    def list_jobs(self, instance=None):
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if instance is None or job.instance == instance]
+        return sorted(jobs, key=lambda job: job.next_run or float("inf"))
+
+    def notify(self, instance, message):
+        self.manager.events.put((instance, "log", message))
+        self.manager.events.put((instance, "jobs", None))
+
+    def arm(self):
+        """只为最早的任务挂一个定时器（可在任意线程调用）"""
+        with self.lock:
+            if self.handle is not None:
+                self.handle.cancel()
+                self.handle = None
+            if self.stopped:
+                return
+            while self.heap and self.heap[0][2].cancelled:
+                heapq.heappop(self.heap)
+            if not self.heap:
+                return
+            delay = min(max(0, self.heap[0][0] - self.clock()), MAX_TIMER_DELAY)
+            self.handle = self.manager.loop.call_later(delay, self.run_due)
+
+    def run_due(self):
+        now = self.clock()
+        due = []
+        with self.lock:
+            self.handle = None
+            if self.stopped:
+                return
+            while self.heap and self.heap[0][0] <= now:
+                job = heapq.heappop(self.heap)[2]
+                if not job.cancelled:
+                    due.append(job)
+            for job in due:
+                job.last_run = now
+                self.push(job)
+                if job.next_run is None:
+                    del self.jobs[job.id]  # 一次性任务执行后删除
+        for job in due:
+            self.run_job(job)
+        if due:
+            self.save()
+        self.arm()
+
+    def run_job(self, job):
+        if job.instance not in self.manager.instances:
+            self.notify(None, f"定时任务 {job.id} 的实例 {job.instance} 不存在，已跳过")
+            return
+        supervisor = self.manager.get(job.instance)
+        if job.action == "restart":
+            supervisor.log(f"定时任务 {job.id} ({job.describe()}): 重启服务器。")
+            supervisor.restart("job")
+        elif job.action == "backup":
+            if self.manager.backups is None or job.instance not in self.manager.backups.policies:
+                supervisor.log(f"定时任务 {job.id}: 实例没有设置存档目录，跳过备份。")
+            else:
+                supervisor.log(f"定时任务 {job.id} ({job.describe()}): 备份存档。")
+                self.manager.backups.backup(job.instance, "job")
+        self.manager.events.put((job.instance, "jobs", None))
@@ -0,0 +1,296 @@
+"""服务器配置文件的声明式模式：类型、范围、可选值和默认值
+
+模式只在启动时加载一次，每个字段编译成一个校验函数，编辑时只调用被修改的键对应的函数。
+类型错误（服务器无法解析，通常会导致启动失败）是 error，会阻止保存；
+超出推荐范围只是 warning。可以用 JSON 文件按同样的结构补充或覆盖内置的 Palworld 模式。
+"""
+import json
+
+from pltool_tuple import FLOAT_PATTERN, INT_PATTERN, TupleValue, is_tuple_value, unquote
+
+PALWORLD_SECTION = "/Script/Pal.PalGameWorldSettings"
+
+
+def rate(default="1.000000", low=0.1, high=5.0):
+    return {"type": "float", "min": low, "max": high, "default": default}
+
+
+def flag(default):
+    return {"type": "bool", "default": "True" if default else "False"}
+
+
+def number(default, low, high):
+    return {"type": "int", "min": low, "max": high, "default": str(default)}
+
+
+def text(default=""):
+    return {"type": "string", "default": f'"{default}"'}
+
+
+PALWORLD_FIELDS = {
+    "Difficulty": {"type": "enum", "values": ["None", "Casual", "Normal", "Hard"], "default": "None"},
+    "DayTimeSpeedRate": rate(),
+    "NightTimeSpeedRate": rate(),
+    "ExpRate": rate(high=20.0),
+    "PalCaptureRate": rate(low=0.5, high=2.0),
+    "PalSpawnNumRate": rate(low=0.5, high=3.0),
+    "PalDamageRateAttack": rate(),
+    "PalDamageRateDefense": rate(),
+    "PlayerDamageRateAttack": rate(),
+    "PlayerDamageRateDefense": rate(),
+    "PlayerStomachDecreaceRate": rate(),
+    "PlayerStaminaDecreaceRate": rate(),
+    "PlayerAutoHPRegeneRate": rate(),
+    "PlayerAutoHpRegeneRateInSleep": rate(),
+    "PalStomachDecreaceRate": rate(),
+    "PalStaminaDecreaceRate": rate(),
+    "PalAutoHPRegeneRate": rate(),
+    "PalAutoHpRegeneRateInSleep": rate(),
+    "BuildObjectDamageRate": rate(low=0.5, high=3.0),
+    "BuildObjectDeteriorationDamageRate": rate(low=0.0, high=10.0),
+    "CollectionDropRate": rate(low=0.5, high=3.0),
+    "CollectionObjectHpRate": rate(low=0.5, high=3.0),
+    "CollectionObjectRespawnSpeedRate": rate(low=0.5, high=3.0),
+    "EnemyDropItemRate": rate(low=0.5, high=3.0),
+    "DeathPenalty": {"type": "enum", "values": ["None", "Item", "ItemAndEquipment", "All"], "default": "All"},
+    "bEnablePlayerToPlayerDamage": flag(False),
+    "bEnableFriendlyFire": flag(False),
+    "bEnableInvaderEnemy": flag(True),
+    "bActiveUNKO": flag(False),
+    "bEnableAimAssistPad": flag(True),
+    "bEnableAimAssistKeyboard": flag(False),
+    "DropItemMaxNum": number(3000, 0, 100000),
+    "DropItemMaxNum_UNKO": number(100, 0, 10000),
+    "BaseCampMaxNum": number(128, 1, 10000),
+    "BaseCampWorkerMaxNum": number(15, 1, 50),
+    "DropItemAliveMaxHours": rate(low=0.0, high=240.0),
+    "bAutoResetGuildNoOnlinePlayers": flag(False),
+    "AutoResetGuildTimeNoOnlinePlayers": rate("72.000000", 0.0, 10000.0),
+    "GuildPlayerMaxNum": number(20, 1, 100),
+    "PalEggDefaultHatchingTime": rate("72.000000", 0.0, 240.0),
+    "WorkSpeedRate": rate(),
+    "bIsMultiplay": flag(False),
+    "bIsPvP": flag(False),
+    "bCanPickupOtherGuildDeathPenaltyDrop": flag(False),
+    "bEnableNonLoginPenalty": flag(True),
+    "bEnableFastTravel": flag(True),
+    "bIsStartLocationSelectByMap": flag(True),
+    "bExistPlayerAfterLogout": flag(False),
+    "bEnableDefenseOtherGuildPlayer": flag(False),
+    "CoopPlayerMaxNum": number(4, 1, 32),
+    "ServerPlayerMaxNum": number(32, 1, 32),
+    "ServerName": text("Default Palworld Server"),
+    "ServerDescription": text(),
+    "AdminPassword": text(),
+    "ServerPassword": text(),
+    "PublicPort": {"type": "int", "min": 1, "max": 65535, "strict": True, "default": "8211"},
+    "PublicIP": text(),
+    "RCONEnabled": flag(False),
+    "RCONPort": {"type": "int", "min": 1, "max": 65535, "strict": True, "default": "25575"},
+    "Region": text(),
+    "bUseAuth": flag(True),
+    "BanListURL": text("https://api.palworldgame.com/api/banlist.txt"),
+    "RESTAPIEnabled": flag(False),
+    "RESTAPIPort": {"type": "int", "min": 1, "max": 65535, "strict": True, "default": "8212"},
+    "bShowPlayerList": flag(False),
+    "AllowConnectPlatform": {"type": "enum", "values": ["Steam", "Xbox"], "default": "Steam"},
+    "bIsUseBackupSaveData": flag(True),
+    "LogFormatType": {"type": "enum", "values": ["Text", "Json"], "default": "Text"},
+}
+
+PALWORLD_SCHEMA = {
+    PALWORLD_SECTION: {
+        "OptionSettings": {"type": "tuple", "fields": PALWORLD_FIELDS},
+    },
+}
+
+
+class SchemaIssue:
+    """一条校验结果；subkey 为元组中的字段名，severity 为 "error" 或 "warning" """
+
+    __slots__ = ("section", "key", "subkey", "severity", "message")
+
+    def __init__(self, section, key, subkey, severity, message):
+        self.section = section
+        self.key = key
+        self.subkey = subkey
+        self.severity = severity
+        self.message = message
+
+    @property
+    def name(self):
+        return f"{self.section}.{self.key}" + (f".{self.subkey}" if self.subkey else "")
+
+    def __str__(self):
+        return f"{self.name}: {self.message}"
+
+
+def compile_field(spec):
+    """把一个字段的声明编译成校验函数 check(原文) -> None 或 (severity, 消息)
+
+    原文是值在文件中的样子，字符串带引号。所有分支都在编译时确定，校验时不再查表。
+    """
+    kind = spec.get("type", "string")
+    low = spec.get("min")
+    high = spec.get("max")
+    range_severity = "error" if spec.get("strict") else "warning"
+    if low is not None and high is not None:
+        bounds = f"{low:g} ~ {high:g}"
+    elif low is not None:
+        bounds = f"≥ {low:g}"
+    else:
+        bounds = f"≤ {high:g}" if high is not None else ""
+
+    def check_range(value):
+        if (low is not None and value < low) or (high is not None and value > high):
+            return range_severity, f"{value:g} 超出范围 {bounds}"
+        return None
+
+    if kind == "float":
+        def check(raw):
+            if not (FLOAT_PATTERN.match(raw) or INT_PATTERN.match(raw)):
+                return "error", f"{raw} 不是有效的小数"
+            return check_range(float(raw))
+    elif kind == "int":
+        def check(raw):
+            if not INT_PATTERN.match(raw):
+                return "error", f"{raw} 不是有效的整数"
+            return check_range(int(raw))
+    elif kind == "bool":
+        def check(raw):
+            if raw.lower() not in ("true", "false"):
+                return "error", f"{raw} 不是 True 或 False"
+            return None
+    elif kind == "enum":
+        values = frozenset(spec["values"])
+        listed = "/".join(spec["values"])
+
+        def check(raw):
+            if raw not in values:
+                return "error", f"{raw} 不是可选值之一 ({listed})"
+            return None
+    elif kind == "string":
+        def check(raw):
+            if len(raw) < 2 or not (raw.startswith('"') and raw.endswith('"')):
+                return "error", f"{raw} 需要用双引号括起来"
+            return None
+    else:
+        raise ValueError(f"未知的字段类型: {kind}")
+    return check
+
+
+def normalize(raw, spec):
+    """用于和默认值比较：数字按数值比较，布尔值不区分大小写"""
+    kind = spec.get("type")
+    try:
+        if kind == "float":
+            return float(raw)
+        if kind == "int":
+            return int(raw)
+    except ValueError:
+        return raw
+    if kind == "bool":
+        return raw.lower()
+    return raw
+
+
+class Schema:
+    def __init__(self, spec=None):
+        self.spec = spec if spec is not None else PALWORLD_SCHEMA
+        self.validators = {}  # (小节, 键) 或 (小节, 键, 字段) -> 校验函数
+        self.tuples = set()  # 值为元组的 (小节, 键)
+        for section, keys in self.spec.items():
+            for key, key_spec in keys.items():
+                if key_spec.get("type") == "tuple":
+                    self.tuples.add((section, key))
+                    for field, field_spec in key_spec.get("fields", {}).items():
+                        self.validators[(section, key, field)] = compile_field(field_spec)
+                else:
+                    self.validators[(section, key)] = compile_field(key_spec)
+
+    @classmethod
+    def load(cls, path=None):
+        """内置模式，path 指向的 JSON 文件（结构相同）中的小节、键和字段会覆盖同名项"""
+        spec = json.loads(json.dumps(PALWORLD_SCHEMA))  # 深拷贝
+        if path:
+            with open(path, encoding="utf-8") as f:
+                extra = json.load(f)
+            for section, keys in extra.items():
+                for key, key_spec in keys.items():
+                    current = spec.setdefault(section, {}).get(key)
+                    if current and current.get("type") == "tuple" and key_spec.get("type", "tuple") == "tuple":
+                        current.setdefault("fields", {}).update(key_spec.get("fields", {}))
+                    else:
+                        spec[section][key] = key_spec
+        return cls(spec)
+
+    def covers(self, section, key):
+        return (section, key) in self.tuples or (section, key) in self.validators
+
+    def validate(self, section, key, value):
+        """校验一个键的值，返回 [SchemaIssue]；模式中没有的键不做检查"""
+        if (section, key) in self.tuples:
+            return self.validate_tuple(section, key, value)
+        check = self.validators.get((section, key))
+        if check is None:
+            return []
+        result = check(value)
+        return [SchemaIssue(section, key, None, *result)] if result else []
+
+    def validate_tuple(self, section, key, value):
+        if not is_tuple_value(value):
+            return [SchemaIssue(section, key, None, "error", "需要 (键=值,...) 形式的元组")]
+        try:
+            fields = TupleValue(value).fields
+        except ValueError as e:
+            return [SchemaIssue(section, key, None, "error", str(e))]
+        issues = []
+        for field in fields:
+            if field.key is None:
+                continue
+            check = self.validators.get((section, key, field.key))
+            if check is None:
+                issues.append(SchemaIssue(section, key, field.key, "warning", "模式中没有这个字段"))
+                continue
+            result = check(field.raw)
+            if result:
+                issues.append(SchemaIssue(section, key, field.key, *result))
+        return issues
+
+    def validate_document(self, document):
+        issues = []
+        seen = set()
+        for section, key, value in document.items():
+            if (section, key) not in seen:
+                seen.add((section, key))
+                issues.extend(self.validate(section, key, value))
+        return issues
+
+    def diff_defaults(self, document):
+        """返回与默认值不同的项 [(名称, 当前原文, 默认原文)]，模式中没有默认值的项不列出"""
+        rows = []
+        for section, keys in self.spec.items():
+            for key, key_spec in keys.items():
+                value = document.get(section, key)
+                if value is None:
+                    continue
+                if key_spec.get("type") != "tuple":
+                    if "default" in key_spec and normalize(value, key_spec) != normalize(key_spec["default"], key_spec):
+                        rows.append((f"{section}.{key}", value, key_spec["default"]))
+                    continue
+                try:
+                    fields = TupleValue(value).fields
+                except ValueError:
+                    continue
+                for field in fields:
+                    field_spec = key_spec.get("fields", {}).get(field.key)
+                    if field_spec is None or "default" not in field_spec:
+                        continue
+                    if normalize(field.raw, field_spec) != normalize(field_spec["default"], field_spec):
+                        rows.append((f"{section}.{key}.{field.key}", field.raw, field_spec["default"]))
+        return rows
+
+
+def display_raw(raw):
+    """在列表中显示原文时去掉字符串的引号"""
+    return unquote(raw) if raw.startswith('"') and raw.endswith('"') and len(raw) >= 2 else raw
@@ -0,0 +1,140 @@
+"""配置项搜索索引：小节、键、值以及元组值中的每个字段都是一条可搜索的记录
+
+普通搜索（不区分大小写的子串）先用三元组倒排索引筛出候选记录，再逐条确认；
+少于三个字符或正则搜索时直接扫描所有记录的小写文本。修改一个键时只替换它的记录。
+"""
+import re
+
+from pltool_tuple import TupleValue, is_tuple_value
+
+GRAM = 3
+
+
+class SearchRecord:
+    """一条记录；subkey 为元组中的字段名，普通的键为 None"""
+
+    __slots__ = ("section", "key", "subkey", "value", "text", "value_at", "rank")
+
+    def __init__(self, section, key, subkey, value, rank=(0, 0)):
+        self.section = section
+        self.key = key
+        self.subkey = subkey
+        self.value = value
+        name = f"{section}.{key}" if subkey is None else f"{section}.{key}.{subkey}"
+        self.text = f"{name}={value}"
+        self.value_at = len(name) + 1  # text 中值开始的位置
+        self.rank = rank  # (键在文件中的顺序, 字段顺序)，搜索结果按它排序
+
+
+class SearchMatch:
+    """一条命中的记录以及命中的位置，in_value 表示命中的是值而不是名称"""
+
+    __slots__ = ("record", "start", "end")
+
+    def __init__(self, record, start, end):
+        self.record = record
+        self.start = start
+        self.end = end
+
+    @property
+    def in_value(self):
+        return self.end > self.record.value_at
+
+
+def grams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+
+class ConfigIndex:
+    def __init__(self):
+        self.records = {}  # 记录编号 -> SearchRecord
+        self.lowered = {}  # 记录编号 -> 小写文本
+        self.by_key = {}  # (小节, 键) -> [记录编号]
+        self.order = {}  # (小节, 键) -> 首次索引时的顺序
+        self.postings = {}  # 三元组 -> {记录编号}
+        self.next_id = 0
+
+    @classmethod
+    def build(cls, document):
+        index = cls()
+        for section, key, value in document.items():
+            if (section, key) not in index.by_key:  # 重复的键只索引第一个，与列表一致
+                index.update(section, key, value)
+        return index
+
+    def update(self, section, key, value):
+        """替换一个键的所有记录（元组值会拆成每个字段一条记录）"""
+        self.remove(section, key)
+        order = self.order.setdefault((section, key), len(self.order))
+        records = [SearchRecord(section, key, None, value, (order, 0))]
+        if is_tuple_value(value):
+            try:
+                fields = TupleValue(value).fields
+            except ValueError:
+                fields = ()
+            records.extend(SearchRecord(section, key, field.key, field.display, (order, position))
+                           for position, field in enumerate(fields, 1) if field.key is not None)
+        self.by_key[(section, key)] = [self.add(record) for record in records]
+
+    def update_field(self, section, key, subkey, display, value):
+        """元组中一个字段被修改时，只替换整行记录和这个字段的记录，不重新切分元组"""
+        ids = self.by_key.get((section, key), [])
+        for position, record_id in enumerate(ids):
+            record = self.records[record_id]
+            if record.subkey is None or record.subkey == subkey:
+                self.drop(record_id)
+                new_value = value if record.subkey is None else display
+                ids[position] = self.add(SearchRecord(section, key, record.subkey, new_value, record.rank))
+
+    def add(self, record):
+        record_id = self.next_id
+        self.next_id += 1
+        lowered = record.text.lower()
+        self.records[record_id] = record
+        self.lowered[record_id] = lowered
+        for gram in grams(lowered):
+            self.postings.setdefault(gram, set()).add(record_id)
+        return record_id
+
+    def drop(self, record_id):
+        del self.records[record_id]
+        for gram in grams(self.lowered.pop(record_id)):
+            posting = self.postings[gram]
+            posting.discard(record_id)
+            if not posting:
+                del self.postings[gram]
+
+    def remove(self, section, key):
+        for record_id in self.by_key.pop((section, key), ()):
+            self.drop(record_id)
+
+    def rank(self, record_id):
+        return self.records[record_id].rank
+
+    def search(self, query, regex=False, limit=None):
+        """返回按记录顺序排列的 SearchMatch 列表；正则无效时抛出 re.error"""
+        if not query:
+            return []
+        matches = []
+        if regex:
+            pattern = re.compile(query, re.IGNORECASE)
+            for record_id in sorted(self.records, key=self.rank):
+                found = pattern.search(self.records[record_id].text)
+                if found and found.end() > found.start():
+                    matches.append(SearchMatch(self.records[record_id], found.start(), found.end()))
+                    if limit and len(matches) >= limit:
+                        break
+            return matches
+        query = query.lower()
+        if len(query) < GRAM:
+            candidates = self.lowered
+        else:
+            postings = sorted((self.postings.get(gram, set()) for gram in grams(query)), key=len)
+            candidates = set.intersection(*postings) if postings[0] else set()
+        for record_id in sorted(candidates, key=self.rank):
+            at = self.lowered[record_id].find(query)
+            if at >= 0:
+                matches.append(SearchMatch(self.records[record_id], at, at + len(query)))
+                if limit and len(matches) >= limit:
+                    break
+        return matches
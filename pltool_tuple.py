@@ -0,0 +1,200 @@
+"""Unreal 风格的元组值，例如 OptionSettings=(Difficulty=None,DayTimeSpeedRate=1.000000,ServerName="...")
+
+一次线性扫描把括号内顶层的逗号分隔项切开，识别键、带引号的字符串和嵌套元组；
+每一项保留值前后的原文，所以未修改时序列化结果与原文逐字节相同。
+切分结果按原文缓存，修改一个字段只替换该字段的文本，不会重新扫描整行。
+"""
+import functools
+import re
+
+INT_PATTERN = re.compile(r"[+-]?\d+\Z")
+FLOAT_PATTERN = re.compile(r"[+-]?(\d+\.\d*|\.\d+)([eE][+-]?\d+)?\Z")
+SPECIAL_PATTERN = re.compile(r'[(),="\\]')
+KINDS = {"bool": "布尔", "int": "整数", "float": "小数", "string": "字符串", "tuple": "元组", "name": "名称"}
+
+
+def is_tuple_value(value):
+    value = value.strip()
+    return value.startswith("(") and value.endswith(")")
+
+
+@functools.lru_cache(maxsize=64)
+def tokenize(text):
+    """切分 "(a=1,b=(x,y),c="s,t")"，返回 (开头, ((键, 值前原文, 值, 值后空白), ...), 结尾)
+
+    用正则只在特殊字符处停下，整行只扫描一遍；引号内的逗号、括号和反斜杠转义都不参与切分。
+    格式错误时抛出 ValueError。
+    """
+    open_at = text.find("(")
+    if open_at < 0 or text[:open_at].strip():
+        raise ValueError("元组值必须以 ( 开头")
+    items = []
+    depth = 0
+    quoted = False
+    segment_start = open_at + 1
+    equals_at = None
+    close_at = None
+    escaped_at = -1
+    for match in SPECIAL_PATTERN.finditer(text, open_at):  # 只在特殊字符处停下
+        i = match.start()
+        char = text[i]
+        if quoted:
+            if i == escaped_at:
+                continue
+            if char == "\\":
+                escaped_at = i + 1
+            elif char == '"':
+                quoted = False
+            continue
+        if char == '"':
+            quoted = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                close_at = i
+                break
+        elif depth == 1 and char == ",":
+            items.append(split_item(text, segment_start, i, equals_at))
+            segment_start = i + 1
+            equals_at = None
+        elif depth == 1 and char == "=" and equals_at is None:
+            equals_at = i
+    if close_at is None:
+        raise ValueError("元组值的括号或引号没有闭合")
+    if text[close_at + 1:].strip():
+        raise ValueError("元组值的 ) 后面还有多余的内容")
+    if items or text[segment_start:close_at].strip():
+        items.append(split_item(text, segment_start, close_at, equals_at))
+    return text[:open_at + 1], tuple(items), text[close_at:]
+
+
+def split_item(text, start, end, equals_at):
+    """把一项拆成 (键, 值前原文, 值, 值后空白)，没有键的项（如 (Steam,Xbox)）键为 None"""
+    key = None
+    value_start = start
+    if equals_at is not None:
+        key = text[start:equals_at].strip()
+        value_start = equals_at + 1
+    segment = text[value_start:end]
+    stripped = segment.strip()
+    if not stripped:
+        return key, text[start:end], "", ""
+    lead = len(segment) - len(segment.lstrip())
+    trail = len(segment) - len(segment.rstrip())
+    return key, text[start:value_start + lead], stripped, segment[len(segment) - trail:]
+
+
+def value_kind(raw):
+    if raw.startswith('"'):
+        return "string"
+    if raw.startswith("("):
+        return "tuple"
+    if raw in ("True", "False", "true", "false"):
+        return "bool"
+    if INT_PATTERN.match(raw):
+        return "int"
+    if FLOAT_PATTERN.match(raw):
+        return "float"
+    return "name"
+
+
+def unquote(raw):
+    return re.sub(r'\\(.)', r'\1', raw[1:-1])
+
+
+def quote(value):
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class TupleField:
+    """元组中的一项；before 是从分隔符到值之间的原文（包括键和等号），after 是值后的空白"""
+
+    __slots__ = ("key", "before", "raw", "after", "kind")
+
+    def __init__(self, key, before, raw, after):
+        self.key = key
+        self.before = before
+        self.raw = raw
+        self.after = after
+        self.kind = value_kind(raw)
+
+    @property
+    def value(self):
+        """按类型解码后的值：字符串去掉引号，嵌套元组返回 TupleValue"""
+        if self.kind == "string":
+            return unquote(self.raw)
+        if self.kind == "bool":
+            return self.raw.lower() == "true"
+        if self.kind == "int":
+            return int(self.raw)
+        if self.kind == "float":
+            return float(self.raw)
+        if self.kind == "tuple":
+            return TupleValue(self.raw)
+        return self.raw
+
+    @property
+    def display(self):
+        """表格中显示和编辑用的文本"""
+        return unquote(self.raw) if self.kind == "string" else self.raw
+
+    def encode(self, text):
+        """把用户输入的文本按本字段的类型转换成原文，类型不符时抛出 ValueError"""
+        text = text.strip() if self.kind != "string" else text
+        if self.kind == "string":
+            return quote(text)
+        if self.kind == "bool":
+            if text.lower() not in ("true", "false"):
+                raise ValueError(f"{self.key} 需要 True 或 False")
+            result = "True" if text.lower() == "true" else "False"
+            return result.lower() if self.raw.islower() else result  # 保持原来的大小写风格
+        if self.kind == "int":
+            if not INT_PATTERN.match(text):
+                raise ValueError(f"{self.key} 需要整数")
+            return text
+        if self.kind == "float":
+            try:
+                number = float(text)
+            except ValueError:
+                raise ValueError(f"{self.key} 需要数字")
+            decimals = len(self.raw.split(".", 1)[1]) if "." in self.raw and "e" not in self.raw.lower() else None
+            return f"{number:.{decimals}f}" if decimals is not None else repr(number)
+        if self.kind == "tuple":
+            tokenize(text)
+            return text
+        if not text or any(char in text for char in ',()"='):
+            raise ValueError(f"{self.key} 的值不能为空，也不能包含 , ( ) \" =")
+        return text
+
+
+class TupleValue:
+    """一个元组值的字段模型，serialize() 在没有修改时返回与原文完全相同的文本"""
+
+    def __init__(self, text):
+        self.head, items, self.tail = tokenize(text)
+        self.fields = [TupleField(*item) for item in items]
+        self.index = {field.key: field for field in self.fields if field.key is not None}
+        self.original = text
+
+    def __len__(self):
+        return len(self.fields)
+
+    def get(self, key, fallback=None):
+        field = self.index.get(key)
+        return field.value if field is not None else fallback
+
+    def set(self, key, text):
+        """用用户输入的文本修改一个字段，只替换这一项的原文"""
+        field = self.index[key]
+        raw = field.encode(text)
+        if raw != field.raw:
+            field.raw = raw
+
+    @property
+    def modified(self):
+        return self.serialize() != self.original
+
+    def serialize(self):
+        return self.head + ",".join(field.before + field.raw + field.after for field in self.fields) + self.tail
@@ -0,0 +1,218 @@
+"""文件监视：Linux 上使用 inotify（通过 ctypes 调用 libc），其他平台退回定时比较文件状态
+
+监视的是文件所在的目录，所以编辑器或其他工具用"写临时文件再改名"的方式保存时也能收到通知。
+inotify 的描述符注册在共用的事件循环中，回调都在事件循环线程中执行，不会为监视额外创建线程。
+"""
+import ctypes
+import ctypes.util
+import os
+import struct
+import threading
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct("iIII")
+
+SETTLE_DELAY = 0.05  # 秒，同一文件的连续事件合并为一次回调
+POLL_INTERVAL = 1.0  # 秒，没有 inotify 时检查文件状态的间隔
+
+
+def load_inotify():
+    """返回 libc（提供 inotify 函数时），否则返回 None"""
+    if not os.path.isdir("/proc/self"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1  # 访问不存在的函数会抛出 AttributeError
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def file_stamp(path):
+    """用于轮询比较的文件状态，文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class WatchHandle:
+    def __init__(self, path, callback):
+        self.path = os.path.abspath(path)
+        self.callback = callback  # 文件变化后在事件循环线程中调用 callback(path)
+        self.stamp = file_stamp(self.path)
+        self.pending = None  # 等待合并的 TimerHandle
+        self.cancelled = False
+
+
+class FileWatcher:
+    """监视任意多个文件，共用一个 inotify 描述符或一个轮询定时器"""
+
+    def __init__(self, loop, use_inotify=True):
+        self.loop = loop
+        self.handles = []
+        self.lock = threading.Lock()  # watch/unwatch 可以在任意线程调用
+        self.dirs = {}  # 目录 -> inotify 监视描述符
+        self.wds = {}  # 监视描述符 -> 目录
+        self.fd = None
+        self.poll_handle = None
+        libc = load_inotify() if use_inotify else None
+        if libc is not None:
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self.libc = libc
+                self.fd = fd
+                self.loop.add_reader(fd, self.on_readable)
+
+    @property
+    def backend(self):
+        return "inotify" if self.fd is not None else "poll"
+
+    def watch(self, path, callback):
+        handle = WatchHandle(path, callback)
+        directory = os.path.dirname(handle.path)
+        with self.lock:
+            self.handles.append(handle)
+            if self.fd is not None and directory not in self.dirs:
+                wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+                if wd >= 0:
+                    self.dirs[directory] = wd
+                    self.wds[wd] = directory
+            polled = self.fd is None or directory not in self.dirs
+        if polled:
+            self.loop.call_soon(self.start_polling)  # 目录不存在或没有 inotify 时轮询
+        return handle
+
+    def unwatch(self, handle):
+        handle.cancelled = True
+        if handle.pending is not None:
+            handle.pending.cancel()
+        directory = os.path.dirname(handle.path)
+        with self.lock:
+            if handle in self.handles:
+                self.handles.remove(handle)
+            if directory in self.dirs and not any(os.path.dirname(h.path) == directory for h in self.handles):
+                wd = self.dirs.pop(directory)
+                del self.wds[wd]
+                self.libc.inotify_rm_watch(self.fd, wd)
+
+    def close(self):
+        with self.lock:
+            handles = list(self.handles)
+        for handle in handles:
+            self.unwatch(handle)
+        if self.poll_handle is not None:
+            self.poll_handle.cancel()
+            self.poll_handle = None
+        if self.fd is not None:
+            fd, self.fd = self.fd, None
+            self.loop.call_soon(self.close_fd, fd)  # 在事件循环线程中注销后再关闭
+
+    def close_fd(self, fd):
+        self.loop.remove_reader(fd)
+        os.close(fd)
+
+    def on_readable(self):
+        if self.fd is None:
+            return
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return
+        changed = set()
+        overflow = False
+        offset = 0
+        with self.lock:
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True  # 事件队列溢出，无法知道哪些文件变了
+                elif wd in self.wds and name:
+                    changed.add(os.path.join(self.wds[wd], os.fsdecode(name)))
+            handles = list(self.handles)
+        for handle in handles:
+            if handle.path in changed or (overflow and file_stamp(handle.path) != handle.stamp):
+                self.settle(handle)
+
+    def settle(self, handle):
+        """一次保存往往产生多个事件，稍等片刻后只回调一次"""
+        if handle.pending is not None:
+            handle.pending.cancel()
+        handle.pending = self.loop.call_later(SETTLE_DELAY, self.fire, handle)
+
+    def fire(self, handle):
+        handle.pending = None
+        if handle.cancelled:
+            return
+        handle.stamp = file_stamp(handle.path)
+        handle.callback(handle.path)
+
+    def start_polling(self):
+        if self.poll_handle is None:
+            self.poll_handle = self.loop.call_later(POLL_INTERVAL, self.poll)
+
+    def poll(self):
+        self.poll_handle = self.loop.call_later(POLL_INTERVAL, self.poll)
+        with self.lock:
+            handles = [handle for handle in self.handles
+                       if self.fd is None or os.path.dirname(handle.path) not in self.dirs]  # 其余由 inotify 负责
+        for handle in handles:
+            stamp = file_stamp(handle.path)
+            if stamp != handle.stamp and not handle.cancelled:
+                handle.stamp = stamp
+                handle.callback(handle.path)
+
+
+class LogTailer:
+    """跟踪服务器自己写的日志文件，把新增的行放入该实例的输出队列
+
+    只读取上次位置之后追加的内容；文件变小或被替换（日志轮转）时从头开始读。
+    """
+
+    def __init__(self, server, path, watcher, prefix="[log] "):
+        self.server = server
+        self.path = path
+        self.prefix = prefix
+        self.partial = b""
+        stamp = file_stamp(path)
+        self.inode = stamp[2] if stamp else None
+        self.offset = stamp[1] if stamp else 0  # 启动前已有的内容不重复显示
+        self.handle = watcher.watch(path, self.on_change)
+        self.watcher = watcher
+
+    def close(self):
+        self.watcher.unwatch(self.handle)
+
+    def on_change(self, path):
+        stamp = file_stamp(path)
+        if stamp is None:
+            return
+        size, inode = stamp[1], stamp[2]
+        if inode != self.inode or size < self.offset:
+            self.inode = inode
+            self.offset = 0
+            self.partial = b""
+        if size == self.offset:
+            return
+        try:
+            with open(path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read(size - self.offset)
+        except OSError:
+            return
+        self.offset += len(data)
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+        for line in lines:
+            self.server.output.put(self.prefix + line.rstrip(b"\r").decode("utf-8", errors="replace"))
@@ -0,0 +1,100 @@
+"""BackupStore 的恢复往返、去重、保留策略和清理"""
+import datetime
+import os
+import tempfile
+import unittest
+
+from pltool_backup import BackupPolicy, BackupStore
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class BackupStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.save = self.path("save")
+        write(os.path.join(self.save, "Level.sav"), os.urandom(300 * 1024))
+        write(os.path.join(self.save, "Players", "a.sav"), b"player a")
+        self.store = self.open_store()
+
+    def path(self, *parts):
+        return os.path.join(self.tmp.name, *parts)
+
+    def open_store(self):
+        store = BackupStore(self.path("repo"), workers=2, chunk_size=64 * 1024)
+        self.addCleanup(store.close)
+        return store
+
+    def objects(self):
+        return sum(len(names) for _, _, names in os.walk(self.path("repo", "objects")))
+
+    def test_restore_round_trip(self):
+        snapshot = self.store.snapshot("a", self.save)
+        os.utime(os.path.join(self.save, "Players", "a.sav"), ns=(1, 1))
+        write(os.path.join(self.save, "Level.sav"), b"corrupted")
+        kept = self.store.restore(snapshot.id, self.save)
+        self.assertEqual(read(os.path.join(kept, "Level.sav")), b"corrupted")
+        for relative, entry in snapshot.files.items():
+            path = os.path.join(self.save, *relative.split("/"))
+            self.assertEqual(os.path.getsize(path), entry["size"])
+            self.assertEqual(os.stat(path).st_mtime_ns, entry["mtime_ns"])
+        self.assertEqual(read(os.path.join(self.save, "Players", "a.sav")), b"player a")
+
+    def test_unchanged_files_are_not_stored_again(self):
+        first = self.store.snapshot("a", self.save)
+        count = self.objects()
+        second = self.store.snapshot("a", self.save)
+        self.assertEqual(second.stats["changed"], 0)
+        self.assertEqual(second.stats["written_bytes"], 0)
+        self.assertEqual(second.files, first.files)
+        self.assertEqual(self.objects(), count)
+
+    def test_identical_chunks_are_shared(self):
+        data = os.urandom(64 * 1024)
+        write(os.path.join(self.save, "copy1.bin"), data * 3)
+        write(os.path.join(self.save, "copy2.bin"), data)
+        snapshot = self.store.snapshot("a", self.save)
+        chunks = snapshot.files["copy1.bin"]["chunks"]
+        self.assertEqual(len(set(chunks)), 1)
+        self.assertEqual(snapshot.files["copy2.bin"]["chunks"], chunks[:1])
+
+    def test_prune_keeps_policy_snapshots_and_their_chunks(self):
+        noon = datetime.datetime(2026, 1, 14, 12, 0)
+        ages = (datetime.timedelta(0), datetime.timedelta(hours=1), datetime.timedelta(days=1),
+                datetime.timedelta(days=2))
+        snapshots = []
+        for index, age in enumerate(ages):
+            write(os.path.join(self.save, "Level.sav"), os.urandom(1024) + bytes([index]))
+            snapshot = self.store.snapshot("a", self.save)
+            snapshot.created = (noon - age).timestamp()
+            snapshots.append(snapshot)
+        removed = self.store.prune("a", BackupPolicy(self.save, keep_last=1, keep_daily=2, keep_weekly=0))
+        self.assertEqual(sorted(removed), sorted([snapshots[1].id, snapshots[3].id]))
+        self.assertEqual({s.id for s in self.store.list("a")}, {snapshots[0].id, snapshots[2].id})
+        self.store.restore(snapshots[2].id, self.path("restored"))  # 保留下来的快照的数据块都还在
+        self.assertFalse(os.path.exists(self.store.path("snapshots", snapshots[1].id + ".json")))
+
+    def test_prune_keeps_chunks_of_snapshots_from_another_store(self):
+        self.store.snapshot("a", self.save)
+        self.store.snapshot("a", self.save)
+        self.store.list()  # 先读入清单，之后另一个进程再创建快照
+        other_save = self.path("other")
+        write(os.path.join(other_save, "World.sav"), os.urandom(4096))
+        other = self.open_store().snapshot("b", other_save)
+        self.store.prune("a", BackupPolicy(self.save, keep_last=1, keep_daily=0, keep_weekly=0))
+        self.store.restore(other.id, self.path("restored"))
+        self.assertEqual(read(self.path("restored", "World.sav")), read(os.path.join(other_save, "World.sav")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""CrashLoopGuard 的退避、抖动、时间窗口、稳定运行清零和熔断"""
+import unittest
+
+from pltool_core import CrashLoopGuard, RestartPolicy
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_guard(random=lambda: 0.5, **options):
+    options.setdefault("jitter", 0)
+    clock = FakeClock()
+    return CrashLoopGuard(RestartPolicy(**options), clock=clock, random=random), clock
+
+
+class CrashLoopGuardTest(unittest.TestCase):
+    def test_backoff_grows_and_is_capped(self):
+        guard, clock = make_guard(backoff=2, multiplier=2, backoff_max=10, max_restarts=10)
+        delays = []
+        for _ in range(5):
+            delays.append(guard.on_crash())
+            clock.now += 1
+        self.assertEqual(delays, [2, 4, 8, 10, 10])
+        self.assertEqual(guard.attempts, 5)
+        self.assertEqual(guard.state, "backoff")
+
+    def test_jitter_stays_within_bounds(self):
+        low, _ = make_guard(random=lambda: 0.0, backoff=10, jitter=0.2)
+        high, _ = make_guard(random=lambda: 0.999999, backoff=10, jitter=0.2)
+        self.assertAlmostEqual(low.on_crash(), 8.0)
+        delay = high.on_crash()
+        self.assertLessEqual(delay, 12.0)
+        self.assertGreater(delay, 11.99)
+
+    def test_trips_after_max_restarts_in_window(self):
+        guard, clock = make_guard(max_restarts=2, window=60)
+        self.assertIsNotNone(guard.on_crash())
+        clock.now += 1
+        self.assertIsNotNone(guard.on_crash())
+        clock.now += 1
+        self.assertIsNone(guard.on_crash())
+        self.assertTrue(guard.tripped)
+        self.assertEqual(guard.state, "open")
+        clock.now += 3600
+        self.assertIsNone(guard.on_crash())  # 熔断后不会因为时间过去而自动恢复
+
+    def test_restarts_outside_window_are_forgotten(self):
+        guard, clock = make_guard(max_restarts=2, window=60)
+        guard.on_crash()
+        clock.now += 1
+        guard.on_crash()
+        clock.now += 60
+        self.assertIsNotNone(guard.on_crash())
+        self.assertEqual(len(guard.history), 1)
+
+    def test_stable_uptime_starts_a_new_round(self):
+        guard, clock = make_guard(backoff=2, multiplier=2, max_restarts=3, stable_uptime=300)
+        guard.on_crash()
+        guard.on_crash()
+        guard.on_start()
+        clock.now += 299
+        self.assertEqual(guard.on_crash(), 8)  # 运行时间不够，继续退避
+        guard.on_start()
+        clock.now += 300
+        self.assertEqual(guard.on_crash(), 2)
+        self.assertEqual(guard.attempts, 1)
+        self.assertEqual(len(guard.history), 1)
+
+    def test_reset_closes_the_breaker(self):
+        guard, _ = make_guard(max_restarts=1)
+        guard.on_crash()
+        self.assertIsNone(guard.on_crash())
+        guard.reset()
+        self.assertEqual(guard.state, "closed")
+        self.assertIsNotNone(guard.on_crash())
+
+
+if __name__ == "__main__":
+    unittest.main()